@@ -1,4 +1,101 @@
+import os
+
 from flask import Flask
 
 app = Flask(__name__)
 from app import routes
+from forecast.WeatherGovSource import WeatherGovSource
+
+
+# the NDFD endpoint to fetch from, e.g., a StubWeatherGovServer's url() for load testing without weather.gov
+if os.environ.get('PEEPWEATHER_UPSTREAM_URL'):
+    WeatherGovSource.baseUrl = os.environ['PEEPWEATHER_UPSTREAM_URL']
+
+
+# the XML parser for weather.gov's DWML: 'lxml' or 'stdlib'. defaults to lxml if it's installed
+if os.environ.get('PEEPWEATHER_XML_PARSER'):
+    from forecast.DwmlDocument import DwmlDocument
+    from forecast.XmlParserBackend import XmlParserBackend
+
+    DwmlDocument.parserBackend = XmlParserBackend.forName(os.environ['PEEPWEATHER_XML_PARSER'])
+
+
+# how long past expiry a cached forecast may be served while it's refreshed in the background. 0 disables
+if os.environ.get('PEEPWEATHER_STALE_SECONDS'):
+    WeatherGovSource.forecastCache.staleSeconds = int(os.environ['PEEPWEATHER_STALE_SECONDS'])
+
+
+# the most time one weather.gov request may take, from sending it to reading the last byte of the response
+if os.environ.get('PEEPWEATHER_LATENCY_BUDGET_SECONDS'):
+    WeatherGovSource.latencyBudgetSeconds = float(os.environ['PEEPWEATHER_LATENCY_BUDGET_SECONDS'])
+
+
+# optional cache of parsed forecasts shared by all worker processes on this host. the value is a SQLite database path
+if os.environ.get('PEEPWEATHER_SHARED_CACHE'):
+    from forecast.SharedForecastCache import SharedForecastCache
+
+    WeatherGovSource.sharedCache = SharedForecastCache(os.environ['PEEPWEATHER_SHARED_CACHE'])
+
+
+# set for web workers that leave weather.gov to the fetcher process (see fetcher.py) and only read forecasts from
+# PEEPWEATHER_SHARED_CACHE. they fetch for themselves if the fetcher isn't running
+if os.environ.get('PEEPWEATHER_READER'):
+    if not WeatherGovSource.sharedCache:
+        raise ValueError("PEEPWEATHER_READER requires PEEPWEATHER_SHARED_CACHE")
+
+    WeatherGovSource.isReader = True
+
+
+# optional on-disk store of fetched DWML documents, shared by all workers so that new ones start warm
+if os.environ.get('PEEPWEATHER_DWML_DIR'):
+    from forecast.DwmlStore import DwmlStore
+
+    WeatherGovSource.dwmlStore = DwmlStore(os.environ['PEEPWEATHER_DWML_DIR'],
+                                           int(os.environ.get('PEEPWEATHER_DWML_MAX_MB', 64)) * 1024 * 1024)
+
+
+# optional limit on this process's upstream requests per second. page loads are served before background work
+if os.environ.get('PEEPWEATHER_UPSTREAM_RATE'):
+    from forecast.RateLimiter import RateLimiter
+
+    WeatherGovSource.rateLimiter = RateLimiter(float(os.environ['PEEPWEATHER_UPSTREAM_RATE']),
+                                               float(os.environ.get('PEEPWEATHER_UPSTREAM_BURST', 0)) or None)
+
+
+# optional hedging: a second request goes out when the first is slower than the recent p95, to PEEPWEATHER_HEDGE_URL
+# (a mirror of the upstream endpoint) if set, and to the same endpoint otherwise. hedges count against the rate limit
+if os.environ.get('PEEPWEATHER_HEDGE'):
+    from forecast.HedgedFetcher import HedgedFetcher
+
+    WeatherGovSource.fetcher = HedgedFetcher(WeatherGovSource.fetcher, WeatherGovSource.baseUrl,
+                                             os.environ.get('PEEPWEATHER_HEDGE_URL'),
+                                             rateLimiter=WeatherGovSource.rateLimiter)
+
+
+# optional multi-point batching of upstream fetches. the value is the batching window in milliseconds
+if os.environ.get('PEEPWEATHER_BATCH_WINDOW_MS'):
+    from forecast.BatchFetcher import BatchFetcher
+
+    WeatherGovSource.batchFetcher = BatchFetcher(int(os.environ['PEEPWEATHER_BATCH_WINDOW_MS']) / 1000)
+
+
+# optional spreading of forecasts across app nodes: each location is cached and fetched by one owner node, and the
+# other nodes ask it. PEEPWEATHER_NODE_URL is this node's base URL as the others reach it, and PEEPWEATHER_NODE_URLS is
+# every node's, comma-separated. all nodes must have the same PEEPWEATHER_NODE_URLS
+if os.environ.get('PEEPWEATHER_NODE_URLS'):
+    from forecast.PeerRouter import PeerRouter
+
+    WeatherGovSource.peerRouter = PeerRouter.fromConfigString(os.environ['PEEPWEATHER_NODE_URL'],
+                                                              os.environ['PEEPWEATHER_NODE_URLS'])
+
+
+# optional background prefetching of hot locations. PEEPWEATHER_PREFETCH is in PrefetchScheduler.fromConfigString()
+# format, e.g., '01002,42.375370|-72.519249' . an empty string prefetches only learned (recently used) locations. with
+# PEEPWEATHER_SHARED_CACHE only one process on the host prefetches at a time (see PrefetchScheduler.isLeader())
+if os.environ.get('PEEPWEATHER_PREFETCH') is not None and not WeatherGovSource.isReader:
+    from forecast.PrefetchScheduler import PrefetchScheduler
+
+    PrefetchScheduler.fromConfigString(os.environ['PEEPWEATHER_PREFETCH'],
+                                       batchFetcher=WeatherGovSource.batchFetcher,
+                                       popularityTracker=WeatherGovSource.popularityTracker,
+                                       sharedCache=WeatherGovSource.sharedCache).start()
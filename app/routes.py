@@ -6,10 +6,15 @@ from io import BytesIO
 import re
 from flask import render_template, request, redirect, url_for, make_response, flash
 
+from forecast.AsyncForecastService import sharedService
 from forecast.Location import Location
 from forecast.ZipCodeUtil import searchZipcodes
 from forecast.Forecast import Forecast
+from forecast.ForecastCache import CacheEntry
+from forecast.PeerRouter import PeerRouter
 from forecast.Sticker import Sticker
+from forecast.UpstreamError import UpstreamError
+from forecast.WeatherGovSource import WeatherGovSource
 from app import app
 
 
@@ -32,10 +37,12 @@ def index():
 
 
 @app.route('/forecast/<zipOrLatLon>')
-def showForecast(zipOrLatLon):
+@app.route('/async/forecast/<zipOrLatLon>', endpoint='showForecastAsync', defaults={'isAsync': True})
+def showForecast(zipOrLatLon, isAsync=False):
     """
     :param zipOrLatLon: location to get the forecast for. either a zip code string or a comma-separated list of
     latitude and longitude strings. ex: '01002' or '42.375370,-72.519249'.
+    :param isAsync: True if the forecast should be made by the shared AsyncForecastService (the /async/ variant)
     
     URL query parameters:
     o list=true: shows list format for debugging
@@ -51,8 +58,7 @@ def showForecast(zipOrLatLon):
         rangeDict = rangeDictFromQuery or rangeDictFromCookie or Forecast.PARAM_RANGE_STEPS_DEFAULT
 
         # make the Forecast
-        zipOrLatLonList = zipOrLatLon.split('|') if '|' in zipOrLatLon else zipOrLatLon
-        forecast = Forecast(Location(zipOrLatLonList), rangeDict)
+        forecast = forecastForZipOrLatLon(zipOrLatLon, rangeDict, isAsync)
 
         # render the forecast
         hideIcons = request.cookies.get(HIDE_ICONS_COOKIE_NAME)
@@ -68,10 +74,13 @@ def showForecast(zipOrLatLon):
 
 
 @app.route('/embed/<zipOrLatLon>')
-def embedForecast(zipOrLatLon):
+@app.route('/async/embed/<zipOrLatLon>', endpoint='embedForecastAsync', defaults={'isAsync': True})
+def embedForecast(zipOrLatLon, isAsync=False):
     """
     :param zipOrLatLon:
-    URL query parameters: same as showForecast(), but not list
+    :param isAsync: same as showForecast()
+    URL query parameters: same as showForecast(), but not list. also:
+    o days=N: show only the first N days of the forecast, e.g., 3. only those days are fetched from weather.gov
     """
     try:
         # make the rangeDict
@@ -80,8 +89,7 @@ def embedForecast(zipOrLatLon):
         rangeDict = rangeDictFromQuery or Forecast.PARAM_RANGE_STEPS_DEFAULT
 
         # make the Forecast
-        zipOrLatLonList = zipOrLatLon.split('|') if '|' in zipOrLatLon else zipOrLatLon
-        forecast = Forecast(Location(zipOrLatLonList), rangeDict)
+        forecast = forecastForZipOrLatLon(zipOrLatLon, rangeDict, isAsync, numDaysFromRequestArgs(request.args))
 
         # render the forecast
         queryParamsDict = queryParamsDictFromRangeDict(rangeDict)
@@ -106,8 +114,7 @@ def showStickersEditor(zipOrLatLon):
         rangeDict = rangeDictFromQuery or rangeDictFromCookie or Forecast.PARAM_RANGE_STEPS_DEFAULT
 
         # make the Forecast
-        zipOrLatLonList = zipOrLatLon.split('|') if '|' in zipOrLatLon else zipOrLatLon
-        forecast = Forecast(Location(zipOrLatLonList), rangeDict)
+        forecast = forecastForZipOrLatLon(zipOrLatLon, rangeDict)
 
         # construct the sticker image
         queryParamsDict = queryParamsDictFromRangeDict(rangeDict)
@@ -129,21 +136,28 @@ def showStickersEditor(zipOrLatLon):
 
 
 @app.route('/forecaststicker/<zipOrLatLon>')
-def generateStickerImage(zipOrLatLon):
+@app.route('/async/forecaststicker/<zipOrLatLon>', endpoint='generateStickerImageAsync', defaults={'isAsync': True})
+def generateStickerImage(zipOrLatLon, isAsync=False):
     """
     :param zipOrLatLon:
-    URL query parameters: same as showForecast(), but not list
+    :param isAsync: same as showForecast()
+    URL query parameters: same as embedForecast()
     """
-    # make the rangeDict
-    rangesDictJson = request.cookies.get(RANGES_COOKIE_NAME)
-    rangeDictFromCookie = json.loads(rangesDictJson) if rangesDictJson else None
-    rangeDictFromQuery = rangesDictFromRequestArgs(request.args) if request.args.get(
-        'p') else None  # check for at least one
-    rangeDict = rangeDictFromQuery or rangeDictFromCookie or Forecast.PARAM_RANGE_STEPS_DEFAULT
+    try:
+        # make the rangeDict
+        rangesDictJson = request.cookies.get(RANGES_COOKIE_NAME)
+        rangeDictFromCookie = json.loads(rangesDictJson) if rangesDictJson else None
+        rangeDictFromQuery = rangesDictFromRequestArgs(request.args) if request.args.get(
+            'p') else None  # check for at least one
+        rangeDict = rangeDictFromQuery or rangeDictFromCookie or Forecast.PARAM_RANGE_STEPS_DEFAULT
+        numDays = numDaysFromRequestArgs(request.args)
+    except ValueError as ex:  # NB: json.JSONDecodeError is a ValueError, too
+        response = make_response(ex.args[0], 400)
+        response.mimetype = 'text/plain'
+        return response
 
-    # make the Forecast
-    zipOrLatLonList = zipOrLatLon.split('|') if '|' in zipOrLatLon else zipOrLatLon
-    forecast = Forecast(Location(zipOrLatLonList), rangeDict)
+    # make the Forecast. upstream failures are server errors, not bad requests, so they go to Flask's usual 500
+    forecast = forecastForZipOrLatLon(zipOrLatLon, rangeDict, isAsync, numDays)
 
     # construct the sticker image and return it as a png
     image = Sticker(forecast).image
@@ -188,6 +202,43 @@ def showHowItWorks():
     return render_template("how-it-works.html")
 
 
+# ==== Forecast utils ====
+
+def forecastForZipOrLatLon(zipOrLatLon, rangeDict, isAsync=False, numDays=None):
+    """
+    :param zipOrLatLon: as passed to showForecast()
+    :param isAsync: True to make the Forecast on the shared AsyncForecastService event loop, which multiplexes the
+        upstream request with those of other request threads, rather than fetching in this thread
+    :param numDays: optional number of days to limit the Forecast to
+    :return: a Forecast for zipOrLatLon
+    """
+    zipOrLatLonList = zipOrLatLon.split('|') if '|' in zipOrLatLon else zipOrLatLon
+    location = Location(zipOrLatLonList)
+    WeatherGovSource.popularityTracker.record(location.key())
+    if not isAsync:
+        return Forecast(location, rangeDict, numDays)
+
+    asyncForecastService, eventLoopThread = sharedService()
+    return eventLoopThread.run(asyncForecastService.forecast(location, rangeDict, numDays))
+
+
+def numDaysFromRequestArgs(args):
+    """
+    :return: the days query parameter as an int, or None if it wasn't passed. raises ValueError if it's not an int
+        from 1 to Forecast.NUM_DAYS_MAX
+    """
+    if not args.get('days'):
+        return None
+
+    try:
+        numDays = int(args['days'])
+    except ValueError:
+        raise ValueError("days was not an int: {}".format(args['days']))
+
+    Forecast.checkNumDays(numDays)
+    return numDays
+
+
 # ==== URL utils ====
 
 def fullUrlForEndpoint(endpoint, zipOrLatLon, queryParamsDict):
@@ -215,6 +266,78 @@ def searchLocationsJson(query):
     return response
 
 
+@app.route('/status/upstream')
+def showUpstreamStatusJson():
+    """
+    Returns a JSON dict of this process's weather.gov fetching statistics: cache, negative cache, fetcher, circuit
+    breaker, and (if configured) rate limiter queue depths and wait times, peer routing counts, and shared cache
+    counters (which include the fetcher's pending requests)
+    """
+    statusDict = {'forecastCache': WeatherGovSource.forecastCache.stats(),
+                  'negativeCache': WeatherGovSource.negativeCache.stats(),
+                  'fetcher': WeatherGovSource.fetcher.stats.asDict(),
+                  'circuitBreaker': WeatherGovSource.circuitBreaker.stats(),
+                  'rateLimiter': WeatherGovSource.rateLimiter.stats() if WeatherGovSource.rateLimiter else None,
+                  'peerRouter': WeatherGovSource.peerRouter.stats() if WeatherGovSource.peerRouter else None,
+                  'sharedCache': WeatherGovSource.sharedCache.stats() if WeatherGovSource.sharedCache else None}
+    response = make_response(json.dumps(statusDict))
+    response.mimetype = 'application/json'
+    return response
+
+
+@app.route('/status/popular')
+def showPopularLocationsJson():
+    """
+    Returns a JSON dict of this process's most requested locations, most popular first, with their decayed request
+    counts and rates.
+
+    URL query parameters:
+    o k=N: how many locations to return. defaults to 20. a 400 with a JSON error message if it's not a positive int
+    """
+    try:
+        k = int(request.args.get('k', 20))
+        if k < 1:
+            raise ValueError
+    except ValueError:
+        response = make_response(json.dumps({'error': "k was not a positive int: {}".format(request.args['k'])}), 400)
+        response.mimetype = 'application/json'
+        return response
+
+    popularityTracker = WeatherGovSource.popularityTracker
+    locationDicts = [{'latitude': key[0], 'longitude': key[1], 'count': count, 'ratePerSecond': ratePerSecond}
+                     for key, count, ratePerSecond in popularityTracker.topK(k)]
+    statusDict = {'locations': locationDicts, 'tracker': popularityTracker.stats()}
+    response = make_response(json.dumps(statusDict))
+    response.mimetype = 'application/json'
+    return response
+
+
+@app.route(PeerRouter.PEER_PATH + '<latLon>')
+def showPeerCacheEntryJson(latLon):
+    """
+    Called by other app nodes' PeerRouters for a location that this node owns. Returns the forecast as JSON, or a JSON
+    error message: with a 422 if the location is bad (a ValueError), or a 503 if weather.gov can't be used right now (an
+    UpstreamError), in which case the asking node falls back to making the forecast itself.
+
+    :param latLon: pipe-separated latitude and longitude, e.g., '42.375370|-72.519249'
+    URL query parameters:
+    o days=N: as in embedForecast()
+    """
+    try:
+        location = Location(latLon.split('|'))
+        numDays = numDaysFromRequestArgs(request.args)
+        WeatherGovSource.popularityTracker.record(location.key())  # so that my PrefetchScheduler learns it
+        source = WeatherGovSource(location, None, numDays=numDays, usePeers=False)
+        cacheEntry = CacheEntry(source.hours, source.creationDate, source.refreshSeconds, source.fetchedAt)
+        response = make_response(PeerRouter.cacheEntryToJson(cacheEntry, source.isStale))
+    except ValueError as ex:
+        response = make_response(json.dumps({'error': ex.args[0]}), 422)
+    except UpstreamError as ex:
+        response = make_response(json.dumps({'error': ex.args[0]}), 503)
+    response.mimetype = 'application/json'
+    return response
+
+
 # ==== form handling ====
 
 @app.route('/location_submit', methods=['POST'])
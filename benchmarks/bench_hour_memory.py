@@ -0,0 +1,98 @@
+"""
+Reports per-forecast memory and Hour allocation counts on the recorded DWML files: the bytes that a cached forecast
+keeps as a list of __dict__-based Hours (how Hour was), as a list of slotted Hours, and as the HourSeries that
+WeatherGovSource makes now, and how many Hours are made to parse a forecast and to lay out its calendar. Run from the
+repository root:
+
+    python -m benchmarks.bench_hour_memory
+"""
+import argparse
+import datetime
+import glob
+import tracemalloc
+
+from forecast.DwmlDocument import DwmlDocument
+from forecast.Forecast import Forecast
+from forecast.Hour import Hour
+from forecast.HourSeries import HourSeries
+from forecast.Location import Location
+from forecast.WeatherGovSource import WeatherGovSource
+
+
+class DictHour(object):
+    # the original Hour's layout: a per-instance __dict__ holding the same five attributes
+
+    def __init__(self, datetime, precip=None, temp=None, wind=None, clouds=None):
+        self.datetime = datetime
+        self.precip = precip
+        self.temp = temp
+        self.wind = wind
+        self.clouds = clouds
+
+
+def retainedBytes(makeHours):
+    """
+    :return: bytes still allocated after calling makeHours(), i.e., what its result keeps
+    """
+    tracemalloc.start()
+    hours = makeHours()
+    numBytes = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    del hours
+    return numBytes
+
+
+def hourCount(function):
+    """
+    :return: 2-tuple: (number of Hours made by calling function, its result)
+    """
+    numHours = [0]
+    hourInit = Hour.__init__
+
+    def countingInit(*args, **kwargs):
+        numHours[0] += 1
+        hourInit(*args, **kwargs)
+
+    Hour.__init__ = countingInit
+    try:
+        result = function()
+    finally:
+        Hour.__init__ = hourInit
+    return numHours[0], result
+
+
+def main():
+    argParser = argparse.ArgumentParser(description="Report per-forecast Hour memory and allocation counts.")
+    argParser.add_argument('--fixtures', default='test', help="directory of recorded DWML files")
+    args = argParser.parse_args()
+
+    location = Location('01002')
+    print('{:45} {:>6} {:>10} {:>10} {:>10} {:>8} {:>8} {:>8}'.format(
+        'file', 'hours', 'dict B', 'slots B', 'series B', 'parse #', 'cal #', 'cal2 #'))
+    for xmlFileName in sorted(glob.glob('{}/*.xml'.format(args.fixtures))):
+        dwmlDocument = DwmlDocument.fromFile(xmlFileName)
+        if dwmlDocument.errorString is not None:
+            continue
+
+        source = WeatherGovSource(location, None, dwmlDocument=dwmlDocument)
+        valueTuples = [(hour.precip, hour.temp, hour.wind, hour.clouds) for hour in source.hours]
+        startDatetime = source.hours[0].datetime
+        oneHour = datetime.timedelta(hours=1)
+        numBytes = [retainedBytes(lambda: [hourClass(startDatetime + (oneHour * index), *values)
+                                           for index, values in enumerate(valueTuples)])
+                    for hourClass in (DictHour, Hour)]
+        numBytes.append(retainedBytes(lambda: HourSeries.fromValues(startDatetime, *zip(*valueTuples))))
+
+        numParseHours, _ = hourCount(lambda: source.hoursFromDocument(dwmlDocument, None))
+        forecast = Forecast.__new__(Forecast)  # i.e., without fetching
+        forecast.rangeDict = Forecast.PARAM_RANGE_STEPS_DEFAULT
+        forecast.source = source
+        Hour._missingHour.cache_clear()
+        numCalendarHours, _ = hourCount(forecast.hoursAsCalendarRows)
+        numCalendarHours2, _ = hourCount(forecast.hoursAsCalendarRows)  # missing hours are shared by now
+        print('{:45} {:6} {:10} {:10} {:10} {:8} {:8} {:8}'.format(
+            xmlFileName, len(source.hours), *numBytes, numParseHours, numCalendarHours, numCalendarHours2))
+
+
+if __name__ == '__main__':
+    main()
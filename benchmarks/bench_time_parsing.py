@@ -0,0 +1,57 @@
+"""
+Compares WeatherGovSource.parseStartValidTime() with the strptime() parsing it replaced, on the recorded DWML files.
+Run from the repository root:
+
+    python -m benchmarks.bench_time_parsing
+"""
+import argparse
+import datetime
+import glob
+import pickle
+import timeit
+
+from forecast.DwmlDocument import DwmlDocument
+from forecast.WeatherGovSource import WeatherGovSource
+
+
+def parseStartValidTimeStrptime(startValidTimeText):
+    # the original parser: removes the offset's ':', which older strptime()s' %z didn't accept, then calls strptime()
+    startValidTimeText = startValidTimeText[:-3] + startValidTimeText[-2:]
+    return datetime.datetime.strptime(startValidTimeText, '%Y-%m-%dT%H:%M:%S%z')
+
+
+def parseStartValidTimeCold(startValidTimeText):
+    WeatherGovSource.parseStartValidTime.cache_clear()  # i.e., every document is the first with its times
+    return WeatherGovSource.parseStartValidTime(startValidTimeText)
+
+
+def main():
+    argParser = argparse.ArgumentParser(description="Benchmark DWML <start-valid-time> parsing.")
+    argParser.add_argument('--fixtures', default='test', help="directory of recorded DWML files")
+    argParser.add_argument('--repeat', type=int, default=200, help="times to parse each file's times")
+    args = argParser.parse_args()
+
+    print('{:45} {:>6} {:>12} {:>12} {:>12} {:>9} {:>9}'.format(
+        'file', 'times', 'strptime us', 'cold us', 'memo us', 'tzinfos', 'pickle %'))
+    for xmlFileName in sorted(glob.glob('{}/*.xml'.format(args.fixtures))):
+        dwmlDocument = DwmlDocument.fromFile(xmlFileName)
+        startValidTimeTexts = [startValidTimeText for startValidTimeTexts in dwmlDocument.timeLayoutDict.values()
+                               for startValidTimeText in startValidTimeTexts]
+        if not startValidTimeTexts:  # e.g., the <error> document
+            continue
+
+        microseconds = []
+        for parse in [parseStartValidTimeStrptime, parseStartValidTimeCold, WeatherGovSource.parseStartValidTime]:
+            seconds = timeit.timeit(lambda: [parse(text) for text in startValidTimeTexts], number=args.repeat)
+            microseconds.append(seconds / args.repeat * 1e6)
+        oldDatetimes = [parseStartValidTimeStrptime(text) for text in startValidTimeTexts]
+        newDatetimes = [WeatherGovSource.parseStartValidTime(text) for text in startValidTimeTexts]
+        assert oldDatetimes == newDatetimes
+        print('{:45} {:6} {:12.1f} {:12.1f} {:12.1f} {:4}->{:<4} {:9.0f}'.format(
+            xmlFileName, len(startValidTimeTexts), *microseconds,
+            len({id(dt.tzinfo) for dt in oldDatetimes}), len({id(dt.tzinfo) for dt in newDatetimes}),
+            100 * len(pickle.dumps(newDatetimes)) / len(pickle.dumps(oldDatetimes))))
+
+
+if __name__ == '__main__':
+    main()
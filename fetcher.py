@@ -0,0 +1,15 @@
+"""
+Runs a FetcherDaemon: the process that does this host's weather.gov traffic for web workers started with
+PEEPWEATHER_READER. It's configured by the same PEEPWEATHER_* environment variables as the app (at least
+PEEPWEATHER_SHARED_CACHE, which must be the web workers' path) plus PEEPWEATHER_FETCHER_CONCURRENCY, the most fetches
+to make at once (default: 8). See README.md .
+"""
+import logging
+import os
+
+from app import app  # NB: configures WeatherGovSource from the environment
+from forecast.FetcherDaemon import FetcherDaemon
+
+
+logging.basicConfig(level=logging.INFO)
+FetcherDaemon(int(os.environ.get('PEEPWEATHER_FETCHER_CONCURRENCY', 8))).run()
@@ -0,0 +1,204 @@
+import asyncio
+import concurrent.futures
+import functools
+import logging
+import threading
+import time
+
+from forecast.CircuitBreaker import CircuitOpenError
+from forecast.Forecast import Forecast
+from forecast.HttpFetcher import AsyncHttpFetcher
+from forecast.Location import Location
+from forecast.RateLimiter import RateLimiter, RateLimitedError
+from forecast.UpstreamError import UpstreamError
+from forecast.WeatherGovSource import WeatherGovSource
+
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncForecastService(object):
+    """
+    An asyncio pipeline that makes Forecasts without blocking a thread on weather.gov: the fetch is awaited on the
+    event loop (at most maxInFlight at once, with concurrent requests for the same location sharing one fetch), and
+    the CPU-bound DWML parse and the Forecast construction run in an executor. Results go into the same
+    WeatherGovSource.forecastCache as the synchronous path, so the two paths share cached data.
+    """
+
+    MAX_IN_FLIGHT_DEFAULT = 200
+
+
+    def __init__(self, fetcher=None, executor=None, maxInFlight=MAX_IN_FLIGHT_DEFAULT, sourceClass=WeatherGovSource):
+        """
+        :param fetcher: an AsyncHttpFetcher or compatible object. defaults to a new AsyncHttpFetcher
+        :param executor: a concurrent.futures.Executor for parsing. defaults to a small ThreadPoolExecutor
+        :param maxInFlight: maximum number of concurrent upstream requests
+        :param sourceClass: WeatherGovSource or a compatible class
+        """
+        self.fetcher = fetcher or AsyncHttpFetcher()
+        self.executor = executor or concurrent.futures.ThreadPoolExecutor(max_workers=4)
+        self.maxInFlight = maxInFlight
+        self.sourceClass = sourceClass
+        self._semaphore = None  # created lazily on the event loop
+        self._inFlight = {}  # WeatherGovSource.cacheKey() -> asyncio.Future for the CacheEntry
+
+
+    def __repr__(self):
+        return '{cls}({numInFlight} in flight)'.format(cls=self.__class__.__name__, numInFlight=len(self._inFlight))
+
+
+    async def forecast(self, location, rangeDict=None, numDays=None):
+        """
+        :return: a Forecast for location, as if from Forecast(location, rangeDict, numDays)
+        """
+        Forecast.checkNumDays(numDays)  # before fetching anything
+        # otherwise the Forecast gets it from the owner node or the FetcherDaemon
+        cacheEntry = None
+        peerRouter = self.sourceClass.peerRouter
+        if (not peerRouter or peerRouter.isOwner(location)) and not self.sourceClass.isFetcherDaemonRunning():
+            cacheEntry = await self.cacheEntry(location, rangeDict, numDays)
+        # NB: the Forecast is made from cacheEntry rather than looking it up again, which would block on a sync fetch
+        # if cacheEntry is an expired last good forecast
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self.executor, functools.partial(Forecast, location, rangeDict, numDays,
+                                                                           cacheEntry=cacheEntry))
+
+
+    async def cacheEntry(self, location, rangeDict=None, numDays=None):
+        """
+        Makes sure that forecastCache has a servable (fresh or stale) entry for location, fetching one if necessary.
+
+        :param numDays: as passed to WeatherGovSource()
+        :return: location's CacheEntry
+        """
+        if not isinstance(location, Location):
+            raise ValueError("location is not a Location instance: {}".format(location))
+
+        forecastCache = self.sourceClass.forecastCache
+        key = self.sourceClass.cacheKey(location, numDays)
+        cacheEntry = forecastCache.peek(key)
+        if cacheEntry and forecastCache.isServable(cacheEntry):
+            return cacheEntry
+
+        if numDays:  # a fresh whole forecast has every window in it, as in WeatherGovSource.makeHours()
+            wholeEntry = forecastCache.peek(location.key())
+            if wholeEntry and not forecastCache.isExpired(wholeEntry):
+                return wholeEntry
+
+        errorMessage = self.sourceClass.negativeCache.get(location.key())
+        if errorMessage:
+            raise ValueError(errorMessage)
+
+        inFlightFuture = self._inFlight.get(key)
+        if inFlightFuture:
+            return await asyncio.shield(inFlightFuture)
+
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._inFlight[key] = future
+        try:
+            cacheEntry = await self.fetchCacheEntry(location, rangeDict, cacheEntry, numDays)
+            future.set_result(cacheEntry)
+            return cacheEntry
+        except (CircuitOpenError, RateLimitedError, UpstreamError, OSError, asyncio.TimeoutError) as ex:
+            lastGoodEntry = forecastCache.peek(key)  # might have come from dwmlStore
+            if not lastGoodEntry:
+                future.set_exception(ex)
+                future.exception()  # mark retrieved in case there were no other waiters
+                raise
+
+            # weather.gov is down, failing, or too slow. fall back to the last good forecast, as WeatherGovSource.makeHours() does
+            future.set_result(lastGoodEntry)
+            return lastGoodEntry
+        except Exception as ex:
+            future.set_exception(ex)
+            future.exception()  # mark retrieved in case there were no other waiters
+            raise
+        finally:
+            del self._inFlight[key]
+
+
+    async def fetchCacheEntry(self, location, rangeDict, staleEntry, numDays=None):
+        loop = asyncio.get_running_loop()
+        key = self.sourceClass.cacheKey(location, numDays)
+        sharedCache = self.sourceClass.sharedCache
+        if sharedCache:  # another worker may have fetched it. SQLite blocks, so use the executor
+            sharedEntry = await loop.run_in_executor(self.executor, sharedCache.get, key)
+            if sharedEntry:
+                self.sourceClass.forecastCache.put(key, sharedEntry)
+                return sharedEntry
+
+        # file reading and parsing both block, so use the executor. dwmlStore has only whole forecasts
+        if not staleEntry and self.sourceClass.dwmlStore and not numDays:
+            staleEntry = await loop.run_in_executor(self.executor, self.sourceClass.cacheEntryFromDwmlStore,
+                                                    location, rangeDict)
+            if staleEntry and not self.sourceClass.forecastCache.isExpired(staleEntry):
+                return staleEntry
+
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.maxInFlight)
+        validatorHeaders = staleEntry.validatorHeaders() if staleEntry else {}
+        url = self.sourceClass.weatherDotGovUrlForLocation(location, numDays)
+        rateLimiter = self.sourceClass.rateLimiter
+        if rateLimiter:  # waits on the event loop, in line with threads waiting in acquire()
+            isAcquired = await rateLimiter.acquireAsync(RateLimiter.INTERACTIVE, self.sourceClass.latencyBudgetSeconds)
+            if not isAcquired:
+                raise RateLimitedError("Too many requests to weather.gov right now. Please try again in a few minutes")
+
+        circuitBreaker = self.sourceClass.circuitBreaker
+        async with self._semaphore:  # same circuitBreaker and latency budget as WeatherGovSource.fetchUrl()
+            circuitBreaker.beforeCall()
+            startTime = time.monotonic()
+            try:
+                fetchResponse = await self.fetcher.fetch(url, headers=validatorHeaders,
+                                                         timeout=self.sourceClass.latencyBudgetSeconds)
+            except Exception:
+                circuitBreaker.recordCall(False, time.monotonic() - startTime)
+                raise
+
+            circuitBreaker.recordCall(fetchResponse.status < 500, time.monotonic() - startTime)
+        logger.info('Forecast({}) async -> {}: {}'.format(location, url, fetchResponse))
+        return await loop.run_in_executor(self.executor, self.sourceClass.cacheEntryForFetchResponse,
+                                          location, rangeDict, fetchResponse, staleEntry, numDays)
+
+
+class EventLoopThread(object):
+    """
+    Runs an asyncio event loop in a daemon thread so that synchronous code (e.g., Flask views under gunicorn) can
+    submit coroutines to it and wait for their results. All callers share the one loop, so their upstream requests are
+    multiplexed on it rather than each occupying a thread.
+    """
+
+
+    def __init__(self):
+        self.loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(target=self.loop.run_forever, name='EventLoopThread', daemon=True)
+        self._thread.start()
+
+
+    def run(self, coroutine, timeout=None):
+        """
+        :return: coroutine's result, blocking the calling thread until it's done. raises its exception
+        """
+        return asyncio.run_coroutine_threadsafe(coroutine, self.loop).result(timeout)
+
+
+    def stop(self):
+        self.loop.call_soon_threadsafe(self.loop.stop)
+
+
+_sharedServiceLock = threading.Lock()
+_sharedService = None
+_sharedEventLoopThread = None
+
+
+def sharedService():
+    """
+    :return: 2-tuple: (AsyncForecastService, EventLoopThread) shared by the whole process, created on first use
+    """
+    global _sharedService, _sharedEventLoopThread
+    with _sharedServiceLock:
+        if _sharedService is None:
+            _sharedEventLoopThread = EventLoopThread()
+            _sharedService = AsyncForecastService()
+        return _sharedService, _sharedEventLoopThread
@@ -0,0 +1,182 @@
+import concurrent.futures
+import logging
+import threading
+import xml.etree.ElementTree as ET
+
+from forecast.DwmlDocument import DwmlDocument
+from forecast.RateLimiter import RateLimiter
+from forecast.UpstreamError import UpstreamError
+from forecast.WeatherGovSource import WeatherGovSource
+
+
+logger = logging.getLogger(__name__)
+
+
+class BatchFetcher(object):
+    """
+    Collects locations that need fetching over a short window and then gets all of them from weather.gov with one
+    multi-point NDFD request, splitting the DWML back into per-location CacheEntries. A batch goes out when the window
+    closes or when it reaches maxBatchSize, whichever comes first. Callers block until their location's batch is done.
+
+    NDFD answers a batch with one bad location (e.g., outside its coverage) with an error for the whole batch, so such a
+    batch is split in half and each half is fetched again, until the bad locations are alone. Only they fail, and only
+    they go in WeatherGovSource.negativeCache.
+    """
+
+    WINDOW_SECONDS_DEFAULT = 0.05
+    MAX_BATCH_SIZE_DEFAULT = 50  # keeps URLs well under typical server limits
+
+
+    def __init__(self, windowSeconds=WINDOW_SECONDS_DEFAULT, maxBatchSize=MAX_BATCH_SIZE_DEFAULT,
+                 sourceClass=WeatherGovSource):
+        """
+        :param windowSeconds: how long to wait for more locations after the first one arrives
+        :param maxBatchSize: maximum number of locations per request
+        :param sourceClass: WeatherGovSource or a compatible class. its fetchUrl() is used for requests
+        """
+        self.windowSeconds = windowSeconds
+        self.maxBatchSize = maxBatchSize
+        self.sourceClass = sourceClass
+        self.batchCount = 0
+        self.locationCount = 0
+        self._pending = {}  # Location.key() -> (Location, rangeDict, concurrent.futures.Future, priority)
+        self._timer = None
+        self._lock = threading.Lock()
+
+
+    def __repr__(self):
+        return '{cls}({windowSeconds}s, {maxBatchSize})'.format(
+            cls=self.__class__.__name__, windowSeconds=self.windowSeconds, maxBatchSize=self.maxBatchSize)
+
+
+    def cacheEntry(self, location, rangeDict=None, timeout=None, priority=RateLimiter.INTERACTIVE):
+        """
+        :return: location's new CacheEntry once its batch has been fetched. raises the batch's exception, or a
+        ValueError if weather.gov returned no data for location
+        """
+        return self.submit(location, rangeDict, priority).result(timeout)
+
+
+    def cacheEntries(self, locations, rangeDict=None, priority=RateLimiter.INTERACTIVE):
+        """
+        Submits all of locations and waits for them.
+
+        :return: dict: {Location.key() -> CacheEntry or Exception}
+        """
+        futures = {location.key(): self.submit(location, rangeDict, priority) for location in locations}
+        results = {}
+        for key, future in futures.items():
+            try:
+                results[key] = future.result()
+            except Exception as ex:
+                results[key] = ex
+        return results
+
+
+    def submit(self, location, rangeDict=None, priority=RateLimiter.INTERACTIVE):
+        """
+        :param priority: location's WeatherGovSource.rateLimiter priority. a batch goes out with its most urgent one
+        :return: a concurrent.futures.Future for location's CacheEntry
+        """
+        batchToSend = None
+        with self._lock:
+            pending = self._pending.get(location.key())
+            if pending:
+                if priority < pending[3]:  # e.g., a page load for a location that's being prefetched
+                    self._pending[location.key()] = pending[:3] + (priority,)
+                return pending[2]
+
+            future = concurrent.futures.Future()
+            self._pending[location.key()] = (location, rangeDict, future, priority)
+            if len(self._pending) >= self.maxBatchSize:
+                batchToSend = self.takePending()
+            elif not self._timer:
+                self._timer = threading.Timer(self.windowSeconds, self.flush)
+                self._timer.daemon = True
+                self._timer.start()
+        if batchToSend:
+            self.fetchBatch(batchToSend)
+        return future
+
+
+    def flush(self):
+        """
+        Sends any pending locations now.
+        """
+        with self._lock:
+            batch = self.takePending()
+        if batch:
+            self.fetchBatch(batch)
+
+
+    def takePending(self):
+        # NB: caller must hold _lock
+        if self._timer:
+            self._timer.cancel()
+            self._timer = None
+        batch = list(self._pending.values())
+        self._pending = {}
+        return batch
+
+
+    def fetchBatch(self, batch):
+        """
+        :param batch: list of (Location, rangeDict, Future, priority) tuples
+        """
+        self.batchCount += 1
+        self.locationCount += len(batch)
+        try:
+            url = self.sourceClass.weatherDotGovUrlForLocations([location for location, _, _, _ in batch])
+            fetchResponse = self.sourceClass.fetchUrl(url, priority=min(priority for _, _, _, priority in batch))
+            logger.info('batch of {} -> {}'.format(len(batch), fetchResponse))
+            if fetchResponse.status >= 500:
+                raise UpstreamError("weather.gov returned HTTP status {} for a batch of {} locations".format(
+                    fetchResponse.status, len(batch)))
+
+            if fetchResponse.status != 200:
+                raise ValueError("weather.gov returned HTTP status {} for a batch of {} locations".format(
+                    fetchResponse.status, len(batch)))
+
+            dwmlDocument = DwmlDocument.fromBytes(fetchResponse.body)
+            isSplitting = dwmlDocument.errorString is not None and len(batch) > 1
+            if isSplitting:
+                logger.info('batch of {} failed as a whole. splitting it: {}'.format(len(batch),
+                                                                                    dwmlDocument.errorString))
+            elif dwmlDocument.errorString is not None:  # let WeatherGovSource format the error the usual way
+                pointDocuments = {'point1': dwmlDocument}
+            else:
+                pointDocuments = dwmlDocument.documentsForPoints()
+            # dwmlStore wants each point's own document, which takes a full tree to make
+            pointElementTrees = self.sourceClass.elementTreesForPoints(ET.fromstring(fetchResponse.body)) \
+                if self.sourceClass.dwmlStore and dwmlDocument.errorString is None else {}
+        except Exception as ex:
+            for _, _, future, _ in batch:
+                future.set_exception(ex)
+            return
+
+        if isSplitting:
+            half = len(batch) // 2
+            self.fetchBatch(batch[:half])
+            self.fetchBatch(batch[half:])
+            return
+
+        for index, (location, rangeDict, future, _) in enumerate(batch):
+            pointKey = 'point{}'.format(index + 1)
+            pointDocument = pointDocuments.get(pointKey)
+            try:
+                if pointDocument is None:
+                    raise ValueError("weather.gov returned no data for {}".format(location))
+
+                try:
+                    cacheEntry = self.sourceClass.cacheEntryForDocument(location, rangeDict, pointDocument)
+                except ValueError as ex:
+                    if pointDocument.errorString is not None:  # as in WeatherGovSource.cacheEntryForFetchResponse()
+                        self.sourceClass.negativeCache.put(location.key(), ex.args[0])
+                    raise
+
+                if pointKey in pointElementTrees:
+                    self.sourceClass.dwmlStore.put(location.key(), ET.tostring(pointElementTrees[pointKey].getroot()),
+                                                   cacheEntry.fetchedAt)
+                future.set_result(cacheEntry)
+            except Exception as ex:
+                future.set_exception(ex)
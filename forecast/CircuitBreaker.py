@@ -0,0 +1,170 @@
+import collections
+import logging
+import threading
+import time
+
+from forecast.UpstreamError import UpstreamError
+
+
+logger = logging.getLogger(__name__)
+
+
+class CircuitOpenError(UpstreamError):
+    """
+    Raised instead of calling a dependency whose CircuitBreaker is open.
+    """
+
+
+class CircuitBreaker(object):
+    """
+    Protects callers from a failing or slow dependency, e.g., weather.gov. While CLOSED, calls go through and their
+    outcomes are kept in a rolling window. When enough of the window failed, or took longer than slowCallSeconds, the
+    breaker trips to OPEN and calls fail immediately with CircuitOpenError rather than tying up a worker. After
+    openSeconds it goes HALF_OPEN and lets at most halfOpenMaxCalls probe calls through: a good probe closes it again,
+    and a bad one re-opens it.
+
+    Use either call(), or beforeCall() and recordCall() around code whose success isn't just "didn't raise".
+    """
+
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+
+    def __init__(self, name='weather.gov', windowSize=20, minCalls=5, failureRateThreshold=0.5, slowCallSeconds=5,
+                 openSeconds=30, halfOpenMaxCalls=1, clock=time.monotonic):
+        """
+        :param name: the dependency's name, for error messages and logging
+        :param windowSize: number of most recent calls whose outcomes are considered
+        :param minCalls: minimum number of calls in the window before the breaker can trip
+        :param failureRateThreshold: fraction of failed calls, or of slow calls, in the window that trips the breaker
+        :param slowCallSeconds: calls that take at least this long count against the breaker even if they succeed
+        :param openSeconds: how long to fail fast before letting probe calls through
+        :param halfOpenMaxCalls: maximum number of simultaneous probe calls while HALF_OPEN
+        :param clock: function returning the current time in seconds. for testing
+        """
+        self.name = name
+        self.windowSize = windowSize
+        self.minCalls = minCalls
+        self.failureRateThreshold = failureRateThreshold
+        self.slowCallSeconds = slowCallSeconds
+        self.openSeconds = openSeconds
+        self.halfOpenMaxCalls = halfOpenMaxCalls
+        self.clock = clock
+        self.rejectedCount = 0
+        self.tripCount = 0
+        self._state = CircuitBreaker.CLOSED
+        self._openedAt = None
+        self._probesInFlight = 0
+        self._outcomes = collections.deque(maxlen=windowSize)  # (isFailure, isSlow) tuples, oldest first
+        self._lock = threading.Lock()
+
+
+    def __repr__(self):
+        return '{cls}({name}, {state})'.format(cls=self.__class__.__name__, name=self.name, state=self.state())
+
+
+    def state(self):
+        """
+        :return: CLOSED, OPEN, or HALF_OPEN
+        """
+        with self._lock:
+            self.halfOpenIfTimeIsUp()
+            return self._state
+
+
+    def stats(self):
+        with self._lock:
+            self.halfOpenIfTimeIsUp()
+            return {'state': self._state,
+                    'failureRate': self.failureRate(),
+                    'slowRate': self.slowRate(),
+                    'calls': len(self._outcomes),
+                    'rejected': self.rejectedCount,
+                    'trips': self.tripCount}
+
+
+    # ==== calling ====
+
+    def call(self, function, *args, **kwargs):
+        """
+        :return: function(*args, **kwargs), recording it as a failure if it raises. raises CircuitOpenError without
+        calling function if the breaker is open
+        """
+        self.beforeCall()
+        startTime = time.monotonic()
+        try:
+            result = function(*args, **kwargs)
+        except Exception:
+            self.recordCall(False, time.monotonic() - startTime)
+            raise
+
+        self.recordCall(True, time.monotonic() - startTime)
+        return result
+
+
+    def beforeCall(self):
+        """
+        Raises CircuitOpenError if a call should not be made now. Otherwise the caller must follow up with recordCall().
+        """
+        with self._lock:
+            self.halfOpenIfTimeIsUp()
+            if self._state == CircuitBreaker.CLOSED:
+                return
+
+            if self._state == CircuitBreaker.HALF_OPEN and self._probesInFlight < self.halfOpenMaxCalls:
+                self._probesInFlight += 1
+                return
+
+            self.rejectedCount += 1
+        raise CircuitOpenError("{} is not responding right now. Please try again in a few minutes".format(self.name))
+
+
+    def recordCall(self, isSuccess, elapsedSeconds):
+        """
+        Records the outcome of a call that beforeCall() allowed.
+        """
+        isSlow = elapsedSeconds >= self.slowCallSeconds
+        with self._lock:
+            if self._state == CircuitBreaker.HALF_OPEN:
+                self._probesInFlight = max(0, self._probesInFlight - 1)
+                if isSuccess and not isSlow:
+                    logger.info('{} closing after a good probe'.format(self.name))
+                    self._state = CircuitBreaker.CLOSED
+                    self._outcomes.clear()
+                else:
+                    self.trip()
+                return
+
+            if self._state == CircuitBreaker.OPEN:  # a call that started before we tripped. nothing to learn
+                return
+
+            self._outcomes.append((not isSuccess, isSlow))
+            if len(self._outcomes) >= self.minCalls and \
+                    (self.failureRate() >= self.failureRateThreshold or self.slowRate() >= self.failureRateThreshold):
+                self.trip()
+
+
+    # ==== state transitions. NB: callers must hold _lock ====
+
+    def trip(self):
+        logger.warning('{} circuit opening: failureRate={:.2f}, slowRate={:.2f}'.format(
+            self.name, self.failureRate(), self.slowRate()))
+        self._state = CircuitBreaker.OPEN
+        self._openedAt = self.clock()
+        self._probesInFlight = 0
+        self.tripCount += 1
+
+
+    def halfOpenIfTimeIsUp(self):
+        if self._state == CircuitBreaker.OPEN and self.clock() - self._openedAt >= self.openSeconds:
+            self._state = CircuitBreaker.HALF_OPEN
+            self._probesInFlight = 0
+
+
+    def failureRate(self):
+        return sum(isFailure for isFailure, _ in self._outcomes) / len(self._outcomes) if self._outcomes else 0
+
+
+    def slowRate(self):
+        return sum(isSlow for _, isSlow in self._outcomes) / len(self._outcomes) if self._outcomes else 0
@@ -0,0 +1,111 @@
+import io
+import xml.etree.ElementTree as ET
+
+from forecast.XmlParserBackend import XmlParserBackend
+
+
+class DwmlDocument(object):
+    """
+    The parts of a DWML document (or of weather.gov's <error> document) that WeatherGovSource uses, read in one
+    streaming pass with iterparse(). Each <time-layout> and <parameters> element is cleared once it's been read, so
+    memory stays small even for long or multi-point documents, and nothing has to be searched for afterward. Values are
+    kept as weather.gov sent them (e.g., <start-valid-time> text) for WeatherGovSource to interpret, except that
+    parameter values are ints.
+
+    The parsing is done by parserBackend, an XmlParserBackend: lxml's if it's installed, else the stdlib's.
+    """
+
+    parserBackend = XmlParserBackend.forName(None)  # shared by all documents. set to choose another backend
+
+    PARSED_TAGS = ('time-layout', 'parameters', 'location', 'creation-date', 'error')  # the elements fromFile() reads
+
+
+    def __init__(self):
+        self.errorString = None  # for an <error> document: its <pre> element as XML
+        self.creationDateText = None  # e.g., '2015-01-13T23:44:00Z'
+        self.refreshFrequencyText = None  # e.g., 'PT1H'
+        self.timeLayoutDict = {}  # {<layout-key> -> [<start-valid-time> text]}
+        self.pointParameterDicts = {}  # {<applicable-location> -> {<name> -> (<time-layout>, [int values])}}
+
+
+    def __repr__(self):
+        return '{cls}({numLayouts} layouts, {numPoints} points{error})'.format(
+            cls=self.__class__.__name__, numLayouts=len(self.timeLayoutDict), numPoints=len(self.pointParameterDicts),
+            error=', error' if self.errorString is not None else '')
+
+
+    @classmethod
+    def fromBytes(cls, dwmlBytes, parserBackend=None):
+        return cls.fromFile(io.BytesIO(dwmlBytes), parserBackend)
+
+
+    @classmethod
+    def fromElement(cls, dwmlElement):
+        """
+        For documents that are already parsed, e.g., in tests. dwmlElement isn't changed.
+        """
+        return cls.fromBytes(ET.tostring(dwmlElement))
+
+
+    @classmethod
+    def fromFile(cls, dwmlFile, parserBackend=None):
+        """
+        :param dwmlFile: a binary file object or file name
+        :param parserBackend: the XmlParserBackend to parse with. defaults to my parserBackend
+        """
+        parserBackend = parserBackend or cls.parserBackend
+        document = cls()
+        for _, element in parserBackend.iterparse(dwmlFile, DwmlDocument.PARSED_TAGS):  # i.e., each complete element
+            tag = element.tag
+            if tag == 'time-layout':
+                document.timeLayoutDict[element.findtext('layout-key')] = \
+                    [startValidTimeEle.text for startValidTimeEle in element.iterfind('start-valid-time')]
+                parserBackend.release(element)
+            elif tag == 'parameters':
+                parameterDict = document.pointParameterDicts.setdefault(element.get('applicable-location'), {})
+                for paramEle in element:
+                    if not isinstance(paramEle.tag, str):  # e.g., an lxml comment
+                        continue
+
+                    parameterDict[paramEle.tag] = (paramEle.get('time-layout'),
+                                                   [int(valueEle.text) for valueEle in paramEle.iterfind('value')])
+                parserBackend.release(element)
+            elif tag == 'location':
+                parserBackend.release(element)
+            elif tag == 'creation-date':
+                document.creationDateText = element.text.strip() if element.text else None
+                document.refreshFrequencyText = element.get('refresh-frequency')
+            elif tag == 'error':  # the root of an error document
+                document.errorString = parserBackend.tostring(element.find('pre'))
+        return document
+
+
+    def parameterDict(self, pointKey=None):
+        """
+        :param pointKey: an <applicable-location>, e.g., 'point2'. defaults to the first point's
+        :return: {<name> -> (<time-layout>, [int values])} for pointKey, or None if there's no such point
+        """
+        if pointKey is None:
+            return next(iter(self.pointParameterDicts.values()), None)
+
+        return self.pointParameterDicts.get(pointKey)
+
+
+    def documentsForPoints(self):
+        """
+        Splits a multi-point document into single-point ones.
+
+        :return: dict: {<applicable-location> -> DwmlDocument}, e.g., {'point1': ..., 'point2': ...}. each has my
+        creation date and the time layouts its parameters refer to
+        """
+        pointDocuments = {}
+        for pointKey, parameterDict in self.pointParameterDicts.items():
+            pointDocument = DwmlDocument()
+            pointDocument.creationDateText = self.creationDateText
+            pointDocument.refreshFrequencyText = self.refreshFrequencyText
+            pointDocument.timeLayoutDict = {layoutKey: self.timeLayoutDict[layoutKey]
+                                            for layoutKey, _ in parameterDict.values()
+                                            if layoutKey in self.timeLayoutDict}
+            pointDocument.pointParameterDicts = {pointKey: parameterDict}
+            pointDocuments[pointKey] = pointDocument
+        return pointDocuments
@@ -0,0 +1,179 @@
+import gzip
+import logging
+import os
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class DwmlStore(object):
+    """
+    An on-disk store of raw DWML documents, gzipped, one file per location whose modification time is the document's
+    fetch time. Unlike ForecastCache it survives restarts and can be shared by all worker processes on a host (or by
+    hosts via a shared volume), so new workers start warm instead of all fetching from weather.gov at once. A
+    location's file name comes from its key, so reads and writes never list the directory. The oldest documents are
+    deleted when the files' total size exceeds maxBytes.
+
+    Writes go to a temporary file that's renamed into place, so readers in other processes never see partial files.
+    Each process keeps a running total of the files' sizes, which includes only its own writes. When that goes over
+    maxBytes the directory is listed to get the real total, and eviction goes down to EVICT_TO_FRACTION of maxBytes so
+    that listings are rare.
+    """
+
+    MAX_BYTES_DEFAULT = 64 * 1024 * 1024
+    SUFFIX = '.xml.gz'
+    EVICT_TO_FRACTION = 0.9
+
+
+    def __init__(self, directory, maxBytes=MAX_BYTES_DEFAULT):
+        """
+        :param directory: where to keep the files. created if necessary
+        :param maxBytes: maximum total size of the (compressed) files
+        """
+        self.directory = directory
+        self.maxBytes = maxBytes
+        self.hitCount = 0
+        self.missCount = 0
+        self.evictionCount = 0
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+        self._fileSizes = {path: size for _, size, path in self.listFiles()}  # path -> bytes, as far as I know
+        self._totalBytes = sum(self._fileSizes.values())
+
+
+    def __repr__(self):
+        return '{cls}({directory!r}, {maxBytes})'.format(cls=self.__class__.__name__, directory=self.directory,
+                                                         maxBytes=self.maxBytes)
+
+
+    # ==== file names. NB: keys are Location.key() tuples: (latitude, longitude) strings ====
+
+    @classmethod
+    def fileNameForKey(cls, key):
+        """
+        :return: key's file name, or None if key isn't a pair of numbers (and so can't be stored)
+        """
+        try:
+            return '{:.6f}_{:.6f}{}'.format(float(key[0]), float(key[1]), cls.SUFFIX)
+        except (ValueError, TypeError):
+            return None
+
+
+    def pathForKey(self, key):
+        fileName = self.fileNameForKey(key)
+        return os.path.join(self.directory, fileName) if fileName else None
+
+
+    def listFiles(self):
+        """
+        :return: list of (fetchedAt, size, path) for all of my directory's documents, including other processes'
+        """
+        files = []
+        for dirEntry in os.scandir(self.directory):
+            if dirEntry.name.endswith(self.SUFFIX):  # NB: includes files from before names were per-key, to evict them
+                try:
+                    stat = dirEntry.stat()
+                    files.append((stat.st_mtime, stat.st_size, dirEntry.path))
+                except OSError:  # deleted by another process
+                    pass
+        return files
+
+
+    # ==== reading and writing ====
+
+    def latest(self, key):
+        """
+        :return: 2-tuple: (fetchedAt, dwmlBytes) for key's newest document, or None if there isn't one
+        """
+        path = self.pathForKey(key)
+        if path:
+            try:
+                with open(path, 'rb') as gzippedFile:  # NB: stat the open file in case it's replaced meanwhile
+                    fetchedAt = os.fstat(gzippedFile.fileno()).st_mtime
+                    dwmlBytes = gzip.GzipFile(fileobj=gzippedFile).read()
+                self.hitCount += 1
+                return fetchedAt, dwmlBytes
+            except FileNotFoundError:
+                pass
+            except (OSError, EOFError) as ex:
+                logger.warning('could not read {}: {!r}'.format(path, ex))
+        self.missCount += 1
+        return None
+
+
+    def put(self, key, dwmlBytes, fetchedAt=None):
+        """
+        Saves dwmlBytes as key's newest document, replacing key's older one, and evicts as needed.
+        """
+        path = self.pathForKey(key)
+        if not path:
+            logger.warning('not storing DWML for non-numeric key {!r}'.format(key))
+            return
+
+        fetchedAt = fetchedAt if fetchedAt is not None else time.time()
+        tempPath = '{}.{}.{}.tmp'.format(path, os.getpid(), threading.get_ident())
+        try:
+            with gzip.open(tempPath, 'wb') as gzipFile:
+                gzipFile.write(dwmlBytes)
+            os.utime(tempPath, (fetchedAt, fetchedAt))
+            size = os.path.getsize(tempPath)
+            os.replace(tempPath, path)
+        finally:
+            self.removeFile(tempPath)  # if writing or renaming failed
+
+        with self._lock:
+            self._totalBytes += size - self._fileSizes.get(path, 0)
+            self._fileSizes[path] = size
+        self.evictAsNeeded()
+
+
+    def clear(self):
+        for _, _, path in self.listFiles():
+            self.removeFile(path)
+        with self._lock:
+            self._fileSizes.clear()
+            self._totalBytes = 0
+
+
+    def evictAsNeeded(self):
+        """
+        If my running total is over maxBytes then deletes the oldest documents until their actual total size is within
+        EVICT_TO_FRACTION of maxBytes.
+        """
+        with self._lock:
+            if self._totalBytes <= self.maxBytes:
+                return
+
+            files = sorted(self.listFiles())  # oldest first
+            totalBytes = sum(size for _, size, _ in files)
+            numEvicted = 0
+            for _, size, path in files:
+                if totalBytes <= self.maxBytes * self.EVICT_TO_FRACTION:
+                    break
+
+                self.removeFile(path)
+                numEvicted += 1
+                totalBytes -= size
+            self.evictionCount += numEvicted
+            self._fileSizes = {path: size for _, size, path in files[numEvicted:]}
+            self._totalBytes = totalBytes
+
+
+    def removeFile(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:  # another process beat us to it
+            pass
+
+
+    def stats(self):
+        """
+        :return: dict of counts. 'files' and 'bytes' are as far as I know, i.e., as of my last listing plus my writes
+        """
+        return {'files': len(self._fileSizes),
+                'bytes': self._totalBytes,
+                'hits': self.hitCount,
+                'misses': self.missCount,
+                'evictions': self.evictionCount}
@@ -0,0 +1,192 @@
+import concurrent.futures
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from forecast.Location import Location
+from forecast.RateLimiter import RateLimiter
+from forecast.UpstreamError import UpstreamError
+from forecast.WeatherGovSource import WeatherGovSource
+
+
+logger = logging.getLogger(__name__)
+
+
+class FetcherDaemon(object):
+    """
+    A long-running process that does all of a host's weather.gov traffic, so that web workers (with
+    WeatherGovSource.isReader set) only read parsed forecasts from the SharedForecastCache and never block on the
+    network or parse XML. It does two things, at most maxConcurrency at a time:
+
+    o fetches the keys that readers have asked for via SharedForecastCache.requestFetch(), and
+    o refreshes entries that readers have used recently before they expire, so that readers rarely miss.
+
+    Fetching goes through the normal WeatherGovSource path, so the daemon's rate limiter, circuit breaker, DWML store,
+    batching, etc. apply to the whole host's traffic, and results reach the readers via WeatherGovSource.sharedCache.
+    Readers are waiting for requested keys, so those go first: ahead of queued refreshes for the next free thread, and
+    at INTERACTIVE priority (refreshes are BACKGROUND) for the rate limiter.
+    """
+
+    POLL_SECONDS_DEFAULT = 0.05
+    HEARTBEAT_SECONDS_DEFAULT = 1  # well under WeatherGovSource.READER_HEARTBEAT_SECONDS, which readers go by
+
+
+    def __init__(self, maxConcurrency=8, pollSeconds=POLL_SECONDS_DEFAULT, heartbeatSeconds=HEARTBEAT_SECONDS_DEFAULT,
+                 refreshAheadSeconds=5 * 60, refreshCheckSeconds=30, accessedWithinSeconds=6 * 60 * 60,
+                 sourceClass=WeatherGovSource, clock=time.time):
+        """
+        :param maxConcurrency: maximum number of simultaneous fetches
+        :param pollSeconds: how often to check for readers' requests
+        :param heartbeatSeconds: how often to record a heartbeat. each is a database write, so not every poll
+        :param refreshAheadSeconds: how long before an entry expires to refresh it
+        :param refreshCheckSeconds: how often to look for entries to refresh
+        :param accessedWithinSeconds: entries that readers haven't used for this long are left to expire
+        :param sourceClass: WeatherGovSource or a compatible class. its sharedCache is the one readers use
+        :param clock: function returning the current time in seconds. for testing
+        """
+        if not sourceClass.sharedCache:
+            raise ValueError("FetcherDaemon requires a sharedCache")
+
+        if sourceClass.isReader:
+            raise ValueError("FetcherDaemon can't run in a reader process")
+
+        self.maxConcurrency = maxConcurrency
+        self.pollSeconds = pollSeconds
+        self.heartbeatSeconds = heartbeatSeconds
+        self.refreshAheadSeconds = refreshAheadSeconds
+        self.refreshCheckSeconds = refreshCheckSeconds
+        self.accessedWithinSeconds = accessedWithinSeconds
+        self.sourceClass = sourceClass
+        self.clock = clock
+        self.fetchCount = 0
+        self.refreshCount = 0
+        self.errorCount = 0
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=maxConcurrency,
+                                                               thread_name_prefix='FetcherDaemon')
+        self._inFlightKeys = set()  # queued or being fetched
+        self._queuedKeys = {}  # key -> isRequested, for keys not being fetched yet
+        self._queue = []  # heap of (RateLimiter priority, sequence number, key). may have stale entries for a key
+        self._sequence = itertools.count()
+        self._lock = threading.Lock()
+        self._lastRefreshCheck = None
+        self._lastHeartbeat = None
+        self._stopEvent = threading.Event()
+
+
+    def __repr__(self):
+        return '{cls}({sharedCache}, {maxConcurrency})'.format(
+            cls=self.__class__.__name__, sharedCache=self.sourceClass.sharedCache, maxConcurrency=self.maxConcurrency)
+
+
+    # ==== running ====
+
+    def run(self):
+        logger.info('{} starting'.format(self))
+        while not self._stopEvent.is_set():
+            try:
+                self.runOnce()
+            except Exception as ex:  # e.g., the database is briefly locked. keep going
+                logger.warning('{} error: {!r}'.format(self, ex))
+            self._stopEvent.wait(self.pollSeconds)
+        self._executor.shutdown(wait=True)
+
+
+    def stop(self):
+        self._stopEvent.set()
+
+
+    def runOnce(self):
+        """
+        Records a heartbeat every heartbeatSeconds, and starts fetches for readers' pending requests and, every
+        refreshCheckSeconds, refreshes for entries about to expire. Doesn't wait for them to finish.
+        """
+        sharedCache = self.sourceClass.sharedCache
+        now = self.clock()
+        if self._lastHeartbeat is None or now - self._lastHeartbeat >= self.heartbeatSeconds:
+            self._lastHeartbeat = now
+            sharedCache.recordHeartbeat()
+        for key in sharedCache.pendingFetchRequests(self.maxConcurrency * 4):
+            self.submit(key, True)
+
+        if self._lastRefreshCheck is None or now - self._lastRefreshCheck >= self.refreshCheckSeconds:
+            self._lastRefreshCheck = now
+            for key in sharedCache.keysExpiringBefore(now + self.refreshAheadSeconds, now - self.accessedWithinSeconds):
+                self.submit(key, False)
+
+
+    def submit(self, key, isRequested):
+        """
+        Queues key to be fetched, unless it's already being fetched. A queued refresh that a reader then requests is
+        promoted.
+
+        :return: a Future for fetching the most important queued key, or None if key was already queued or in flight
+        """
+        priority = RateLimiter.INTERACTIVE if isRequested else RateLimiter.BACKGROUND
+        with self._lock:
+            if key in self._inFlightKeys and not (isRequested and self._queuedKeys.get(key) is False):
+                return None
+
+            self._inFlightKeys.add(key)
+            self._queuedKeys[key] = isRequested
+            heapq.heappush(self._queue, (priority, next(self._sequence), key))
+        return self._executor.submit(self.fetchNextKey)
+
+
+    def fetchNextKey(self):
+        """
+        Run by each of my executor's tasks: fetches the queued key with the highest priority, if any.
+        """
+        with self._lock:
+            while self._queue:
+                _, _, key = heapq.heappop(self._queue)
+                if key in self._queuedKeys:  # otherwise it's a promoted refresh's old entry
+                    isRequested = self._queuedKeys.pop(key)
+                    break
+            else:
+                return
+
+        self.fetchKey(key, isRequested)
+
+
+    def fetchKey(self, key, isRequested):
+        """
+        Gets key's forecast into sharedCache via the normal WeatherGovSource path and completes its fetch request,
+        recording the error if it failed. Always a refresh: that skips the daemon's own caches, which might have key
+        when sharedCache doesn't, and saves the result (even a 304's) in sharedCache. Requested keys are fetched at
+        INTERACTIVE priority, though, since a reader is waiting.
+
+        :param key: a WeatherGovSource.cacheKey()
+        :param isRequested: True if a reader asked for key, False if it's being refreshed ahead of expiry
+        """
+        sharedCache = self.sourceClass.sharedCache
+        try:
+            location = Location(list(key[:2]))
+            self.sourceClass(location, None, refresh=True, numDays=key[2] if len(key) > 2 else None,
+                             priority=RateLimiter.INTERACTIVE if isRequested else RateLimiter.BACKGROUND)
+            sharedCache.completeFetchRequest(key)
+            if isRequested:
+                self.fetchCount += 1
+            else:
+                self.refreshCount += 1
+        except Exception as ex:
+            self.errorCount += 1
+            logger.warning('fetch failed for {}: {!r}'.format(key, ex))
+            if isRequested:  # a failed refresh leaves the entry to expire. readers will ask for it then
+                errorMessage = ex.args[0] if isinstance(ex, (ValueError, UpstreamError)) and ex.args \
+                    else "Couldn't get the forecast from weather.gov: {!r}".format(ex)
+                sharedCache.completeFetchRequest(key, str(errorMessage))
+        finally:
+            with self._lock:
+                self._inFlightKeys.discard(key)
+
+
+    def stats(self):
+        """
+        :return: a dict of counters, suitable for logging or JSON
+        """
+        with self._lock:
+            numInFlight = len(self._inFlightKeys)
+        return {'inFlight': numInFlight, 'fetchCount': self.fetchCount, 'refreshCount': self.refreshCount,
+                'errorCount': self.errorCount}
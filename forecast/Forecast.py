@@ -1,5 +1,6 @@
 import datetime
 import logging
+import time
 
 from forecast.WeatherGovSource import WeatherGovSource
 
@@ -20,10 +21,17 @@ class Forecast:
     }
 
 
-    def __init__(self, location, rangeDict=None):
+    # the most calendar days a forecast can be limited to. NDFD forecasts are seven days long
+    NUM_DAYS_MAX = 7
+
+
+    def __init__(self, location, rangeDict=None, numDays=None, cacheEntry=None):
         """
         :param location: Location to get the forecast for
         :param rangeDict: optional as in PARAM_RANGE_STEPS_DEFAULT. uses that default if not passed
+        :param numDays: optional number of calendar days to limit the forecast to, starting today, e.g., for embeds.
+            only that window is fetched from weather.gov. defaults to the whole forecast
+        :param cacheEntry: optional CacheEntry to use instead of getting one, as passed to WeatherGovSource()
         :return:
         """
         # check rangeDict
@@ -54,7 +62,17 @@ class Forecast:
         else:
             self.rangeDict = Forecast.PARAM_RANGE_STEPS_DEFAULT
 
-        self.source = WeatherGovSource(location, rangeDict)
+        Forecast.checkNumDays(numDays)
+        self.source = WeatherGovSource(location, rangeDict, numDays=numDays, cacheEntry=cacheEntry)
+
+
+    @classmethod
+    def checkNumDays(cls, numDays):
+        """
+        Raises ValueError if numDays isn't None or an int from 1 to NUM_DAYS_MAX.
+        """
+        if numDays is not None and (not isinstance(numDays, int) or not 1 <= numDays <= Forecast.NUM_DAYS_MAX):
+            raise ValueError("numDays was not an int from 1 to {}: {}".format(Forecast.NUM_DAYS_MAX, numDays))
 
 
     def __repr__(self):
@@ -70,6 +88,20 @@ class Forecast:
         return self.source.location
 
 
+    def dataAgeMinutes(self):
+        """
+        :return: how many whole minutes ago my forecast data was fetched (or last revalidated) from weather.gov
+        """
+        return int((time.time() - self.source.fetchedAt) // 60)
+
+
+    def isStale(self):
+        """
+        :return: True if my forecast data had expired and is being refreshed in the background
+        """
+        return self.source.isStale
+
+
     # ==== calendar layout methods ====
 
     def calendarHeaderRow(self):
@@ -110,40 +142,37 @@ class Forecast:
         """
         # since we have my hours, which have no gaps, we need to: 1) create missing Hours from hour 0 of the
         # first day to the first sampled hour - call those the head missing hours, and 2) create missing Hours from the
-        # last sampled hour to hour 23 of that last day - call those the tail missing hours
+        # last sampled hour to hour 23 of that last day - call those the tail missing hours. both are just offsets from
+        # the first Hour, so calendarOffsetRows() does the layout and we make Hours only for the cells we return
         from forecast.Hour import Hour
+        hours = self.source.hours
+        firstDatetime = hours[0].datetime
         oneHour = datetime.timedelta(hours=1)
+        return [[hours[offset] if 0 <= offset < len(hours) else Hour.missingHour(firstDatetime + (oneHour * offset))
+                 for offset in offsetRow]
+                for offsetRow in self.calendarOffsetRows()]
 
-        # create headMissingHours by working backward from the closest hour until the date goes to the previous day
-        closestHour = self.source.hours[0]
-        headMissingHours = []
-        closestDay = closestHour.datetime.day
-        currDatetime = closestHour.datetime - oneHour
-        while currDatetime.day == closestDay:
-            headMissingHours.append(Hour(currDatetime))
-            currDatetime -= oneHour
-        headMissingHours.sort()
-
-        # create tailMissingHours by working forward from the farthest hour until the date goes to the next day
-        tailMissingHours = []
-        farthestHour = self.source.hours[-1]
-        farthestDay = farthestHour.datetime.day
-        currDatetime = farthestHour.datetime + oneHour
-        while currDatetime.day == farthestDay:
-            tailMissingHours.append(Hour(currDatetime))
-            currDatetime += oneHour
-        tailMissingHours.sort()
-
-        # rows
-        allHours = headMissingHours + self.source.hours + tailMissingHours
-        numDays = 1 + (farthestHour.datetime - closestHour.datetime).days
-        calendarRows = []
-        for hourNum in range(24):  # calendar row
-            hourRow = []
-            for dayNum in range(numDays):  # calendar column
-                hour = allHours[hourNum + (24 * dayNum)]
-                hourRow.append(hour)
-            calendarRows.append(hourRow)
-        return calendarRows
+
+    def cssClassesAsCalendarRows(self):
+        """
+        :return: the css classes of hoursAsCalendarRows()'s Hours (as returned by Hour.cssClassForDesirability()) in
+        the same layout. rates all of my hours at once via HourSeries.cssClasses(), which is much faster than asking
+        each Hour
+        """
+        from forecast.HourSeries import HourSeries
+        cssClasses = HourSeries.fromHours(self.source.hours).cssClasses(self.rangeDict)
+        return [[cssClasses[offset] if 0 <= offset < len(cssClasses) else 'Missing' for offset in offsetRow]
+                for offsetRow in self.calendarOffsetRows()]
 
 
+    def calendarOffsetRows(self):
+        """
+        :return: hoursAsCalendarRows()'s layout as offsets: each cell is the number of hours from my first Hour to the
+        cell's, which is negative for head missing hours and >= len(hours) for tail missing ones
+        """
+        hours = self.source.hours
+        firstDatetime = hours[0].datetime
+        numDays = 1 + (hours[-1].datetime - firstDatetime).days
+        headCount = firstDatetime.hour  # hours earlier on the first day
+        return [[hourNum + (24 * dayNum) - headCount for dayNum in range(numDays)]  # calendar columns
+                for hourNum in range(24)]  # calendar rows
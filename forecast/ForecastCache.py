@@ -0,0 +1,233 @@
+import collections
+import logging
+import sys
+import threading
+import time
+
+
+logger = logging.getLogger(__name__)
+
+
+class CacheEntry(object):
+    """
+    One cached forecast: the normalized Hours for a location along with the information ForecastCache needs to decide
+    when they go stale.
+    """
+
+
+    def __init__(self, hours, creationDate=None, refreshSeconds=None, fetchedAt=None, etag=None, lastModified=None):
+        """
+        :param hours: the HourSeries (or list of Hours) returned by WeatherGovSource.makeHours()
+        :param creationDate: aware datetime from the DWML <creation-date> element, or None if not known
+        :param refreshSeconds: the <creation-date> refresh-frequency in seconds, or None if not known
+        :param fetchedAt: time.time() when hours were fetched (or last revalidated). defaults to now
+        :param etag: the response's ETag header, or None. used to revalidate with If-None-Match
+        :param lastModified: the response's Last-Modified header, or None. used to revalidate with If-Modified-Since
+        """
+        self.hours = hours
+        self.creationDate = creationDate
+        self.refreshSeconds = refreshSeconds
+        self.fetchedAt = fetchedAt if fetchedAt is not None else time.time()
+        self.etag = etag
+        self.lastModified = lastModified
+        self.expiresAt = None  # set by ForecastCache.put()
+        self.size = estimatedSizeOfHours(hours)
+
+
+    def __repr__(self):
+        return '{cls}({numHours} hours, {creationDate}, {fetchedAt})'.format(
+            cls=self.__class__.__name__, numHours=len(self.hours), creationDate=self.creationDate,
+            fetchedAt=self.fetchedAt)
+
+
+    def validatorHeaders(self):
+        """
+        :return: a dict of conditional request headers that let the server answer 304 Not Modified if my data is
+        still current. empty if the server didn't send any validators
+        """
+        headers = {}
+        if self.etag:
+            headers['If-None-Match'] = self.etag
+        if self.lastModified:
+            headers['If-Modified-Since'] = self.lastModified
+        return headers
+
+
+class ForecastCache(object):
+    """
+    A bounded, thread-safe in-process cache of forecast Hours keyed by Location.key(). Entries are evicted least
+    recently used first when either maxEntries or maxBytes is exceeded. An entry is fresh until the earlier of 1) its
+    fetch time plus ttlSeconds, and 2) the next NDFD issuance as advertised by its DWML <creation-date> and
+    refresh-frequency. Expired entries can still be served for staleSeconds afterward via getStale(), which supports
+    stale-while-revalidate.
+    """
+
+    MAX_ENTRIES_DEFAULT = 500
+    TTL_SECONDS_DEFAULT = 60 * 60
+    MAX_BYTES_DEFAULT = 32 * 1024 * 1024
+    STALE_SECONDS_DEFAULT = 3 * 60 * 60
+
+
+    def __init__(self, maxEntries=MAX_ENTRIES_DEFAULT, ttlSeconds=TTL_SECONDS_DEFAULT, maxBytes=MAX_BYTES_DEFAULT,
+                 staleSeconds=STALE_SECONDS_DEFAULT, clock=time.time):
+        """
+        :param maxEntries: maximum number of locations to keep
+        :param ttlSeconds: maximum age of a fresh entry
+        :param maxBytes: approximate memory budget for all entries, as computed by estimatedSizeOfHours()
+        :param staleSeconds: how long after expiring an entry may still be returned by getStale(). 0 disables
+        :param clock: function returning the current time in seconds. for testing
+        """
+        self.maxEntries = maxEntries
+        self.ttlSeconds = ttlSeconds
+        self.maxBytes = maxBytes
+        self.staleSeconds = staleSeconds
+        self.clock = clock
+        self.numBytes = 0
+        self.hits = 0
+        self.staleHits = 0
+        self.misses = 0
+        self.evictions = 0
+        self._entries = collections.OrderedDict()  # key -> CacheEntry, least recently used first
+        self._lock = threading.RLock()
+
+
+    def __repr__(self):
+        return '{cls}({numEntries} entries, {numBytes} bytes)'.format(
+            cls=self.__class__.__name__, numEntries=len(self), numBytes=self.numBytes)
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+    def __contains__(self, key):
+        return key in self._entries
+
+
+    def get(self, key):
+        """
+        :return: the fresh CacheEntry for key, or None if there is none or it has expired. expired entries are kept
+        (see peek()) until they are evicted or replaced
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or self.isExpired(entry):
+                self.misses += 1
+                return None
+
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry
+
+
+    def getStale(self, key):
+        """
+        :return: the CacheEntry for key if it has expired but is still within the stale window, or None otherwise.
+        callers should serve it and then refresh it in the background
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or not self.isExpired(entry) or self.clock() >= entry.expiresAt + self.staleSeconds:
+                return None
+
+            self._entries.move_to_end(key)
+            self.staleHits += 1
+            return entry
+
+
+    def peek(self, key):
+        """
+        :return: the CacheEntry for key whether or not it has expired, or None if there is none. does not affect LRU
+        order or hit counts
+        """
+        with self._lock:
+            return self._entries.get(key)
+
+
+    def recentKeys(self, count):
+        """
+        :return: up to count keys, most recently used first
+        """
+        with self._lock:
+            keys = list(self._entries.keys())
+        return list(reversed(keys[-count:])) if count > 0 else []
+
+
+    def put(self, key, entry):
+        """
+        Adds or replaces the entry for key, and then evicts entries as needed to get back under budget.
+        """
+        with self._lock:
+            entry.expiresAt = self.expiresAtForEntry(entry)
+            self.invalidate(key)
+            self._entries[key] = entry
+            self.numBytes += entry.size
+            self.evictAsNeeded()
+
+
+    def invalidate(self, key):
+        with self._lock:
+            entry = self._entries.pop(key, None)
+            if entry is not None:
+                self.numBytes -= entry.size
+
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.numBytes = 0
+
+
+    def isExpired(self, entry):
+        return self.clock() >= entry.expiresAt
+
+
+    def isServable(self, entry):
+        """
+        :return: True if entry is fresh or within the stale window, i.e., if get() or getStale() would return it
+        """
+        return self.clock() < entry.expiresAt + self.staleSeconds
+
+
+    def expiresAtForEntry(self, entry):
+        expiresAt = entry.fetchedAt + self.ttlSeconds
+        if entry.creationDate and entry.refreshSeconds:
+            nextIssuance = entry.creationDate.timestamp() + entry.refreshSeconds
+            if entry.fetchedAt < nextIssuance < expiresAt:
+                expiresAt = nextIssuance
+        return expiresAt
+
+
+    def evictAsNeeded(self):
+        # never evict the most recently added entry, even if it alone is over budget
+        while len(self._entries) > 1 and (len(self._entries) > self.maxEntries or self.numBytes > self.maxBytes):
+            key, entry = self._entries.popitem(last=False)
+            self.numBytes -= entry.size
+            self.evictions += 1
+            logger.debug('evicted {}: {}'.format(key, entry))
+
+
+    def stats(self):
+        """
+        :return: a dict of counters suitable for logging or JSON
+        """
+        with self._lock:
+            return {'entries': len(self._entries),
+                    'bytes': self.numBytes,
+                    'hits': self.hits,
+                    'staleHits': self.staleHits,
+                    'misses': self.misses,
+                    'evictions': self.evictions}
+
+
+def estimatedSizeOfHours(hours):
+    """
+    :return: approximate number of bytes used by hours, an HourSeries or a list of Hour instances. for a list, assumes
+    every Hour is about the size of the first one, which holds for the Hours that WeatherGovSource creates
+    """
+    if not hours or not isinstance(hours, list):  # an HourSeries knows its size
+        return sys.getsizeof(hours)
+
+    hour = hours[0]
+    hourSize = sys.getsizeof(hour) + sys.getsizeof(hour.datetime)  # NB: Hours are slotted, so have no __dict__
+    return sys.getsizeof(hours) + (len(hours) * hourSize)
@@ -0,0 +1,96 @@
+import bisect
+import hashlib
+import threading
+
+
+class HashRing(object):
+    """
+    A consistent-hash ring that maps keys (e.g., Location.key()s) to nodes (e.g., app node URLs). Each node is hashed
+    to virtualNodes points on the ring, and a key belongs to the node whose point comes first at or after the key's
+    hash. Adding or removing a node moves only the keys between it and its neighbors - about 1/N of them - rather than
+    reshuffling everything, and the virtual nodes spread each node's share evenly. Every process that's given the same
+    nodes computes the same owners. Thread-safe.
+    """
+
+    VIRTUAL_NODES_DEFAULT = 100
+
+
+    def __init__(self, nodes=(), virtualNodes=VIRTUAL_NODES_DEFAULT):
+        """
+        :param nodes: initial node names, e.g., 'http://10.0.0.1:8000'
+        :param virtualNodes: points per node on the ring
+        """
+        self.virtualNodes = virtualNodes
+        self._nodes = set()
+        self._hashes = []  # sorted ring points
+        self._hashToNode = {}
+        self._lock = threading.Lock()
+        for node in nodes:
+            self.addNode(node)
+
+
+    def __repr__(self):
+        return '{cls}({nodes})'.format(cls=self.__class__.__name__, nodes=sorted(self._nodes))
+
+
+    def __len__(self):
+        return len(self._nodes)
+
+
+    @classmethod
+    def hashForString(cls, string):
+        return int.from_bytes(hashlib.blake2b(string.encode(), digest_size=8).digest(), 'big')
+
+
+    @property
+    def nodes(self):
+        with self._lock:
+            return sorted(self._nodes)
+
+
+    def addNode(self, node):
+        with self._lock:
+            if node in self._nodes:
+                return
+
+            self._nodes.add(node)
+            for replica in range(self.virtualNodes):
+                pointHash = self.hashForString('{}#{}'.format(node, replica))
+                if pointHash not in self._hashToNode:  # a collision is vanishingly unlikely. first node keeps it
+                    bisect.insort(self._hashes, pointHash)
+                    self._hashToNode[pointHash] = node
+
+
+    def removeNode(self, node):
+        with self._lock:
+            if node not in self._nodes:
+                return
+
+            self._nodes.remove(node)
+            self._hashes = [pointHash for pointHash in self._hashes if self._hashToNode[pointHash] != node]
+            self._hashToNode = {pointHash: self._hashToNode[pointHash] for pointHash in self._hashes}
+
+
+    def setNodes(self, nodes):
+        """
+        Adds and removes nodes so that mine are exactly nodes, e.g., after a membership change.
+        """
+        nodes = set(nodes)
+        for node in set(self.nodes) - nodes:
+            self.removeNode(node)
+        for node in nodes:
+            self.addNode(node)
+
+
+    def nodeForKey(self, key):
+        """
+        :param key: a string, or a tuple of strings like Location.key()
+        :return: the node that owns key, or None if I have no nodes
+        """
+        keyHash = self.hashForString(key if isinstance(key, str) else '|'.join(map(str, key)))
+        with self._lock:
+            if not self._hashes:
+                return None
+
+            index = bisect.bisect_left(self._hashes, keyHash)
+            return self._hashToNode[self._hashes[index % len(self._hashes)]]
@@ -0,0 +1,231 @@
+import concurrent.futures
+import heapq
+import itertools
+import logging
+import threading
+import time
+
+from forecast.RateLimiter import RateLimiter
+
+
+logger = logging.getLogger(__name__)
+
+
+class HedgedFetcher(object):
+    """
+    Wraps an HttpFetcher to cut tail latency: if a request hasn't finished within hedgeDelaySeconds() - the fetcher's
+    recent p95 latency, by default - a second, "hedge" request for the same data goes out, to an alternate endpoint if
+    there is one, and whichever response arrives first is used. Only about 5% of requests are hedged, so upstream load
+    goes up by about that much. Has the same fetch() and stats as the wrapped fetcher, so it can be used as
+    WeatherGovSource.fetcher.
+
+    The primary request runs on the calling thread, and hedges on a small pool of threads. One scheduler thread starts
+    each hedge once its delay is up, unless its primary is done by then. If a hedge wins, the primary is stopped with
+    the wrapped fetcher's abort(), if it has one (HttpFetcher does). Otherwise the caller gets the hedge's response
+    once the primary is done. Hedges take a rateLimiter token, if there's a rateLimiter, and are skipped if none is
+    available right away.
+    """
+
+    HEDGE_PERCENTILE_DEFAULT = 95
+    MIN_SAMPLES = 20  # too few latencies make for a noisy percentile, so use initialDelaySeconds until we have these
+
+
+    def __init__(self, fetcher, primaryBaseUrl=None, alternateBaseUrl=None, hedgePercentile=HEDGE_PERCENTILE_DEFAULT,
+                 initialDelaySeconds=1, minDelaySeconds=0.05, maxWorkers=32, rateLimiter=None):
+        """
+        :param fetcher: an HttpFetcher or compatible object, with a FetchStats named stats
+        :param primaryBaseUrl: the start of URLs that can be hedged to alternateBaseUrl, e.g., WeatherGovSource.baseUrl
+        :param alternateBaseUrl: a mirror of primaryBaseUrl for hedge requests. if None then hedges go to the same URL,
+            which still helps when the slowness is in one connection or server rather than the whole service
+        :param hedgePercentile: the percentile of recent latencies to wait before hedging
+        :param initialDelaySeconds: how long to wait before hedging until there are MIN_SAMPLES recent latencies
+        :param minDelaySeconds: the shortest delay before hedging, so that a fast service isn't hedged on every blip
+        :param maxWorkers: maximum number of hedge requests in flight at once
+        :param rateLimiter: optional RateLimiter to charge hedge requests to, e.g., WeatherGovSource.rateLimiter. NB:
+            primary requests are charged by the caller
+        """
+        self.fetcher = fetcher
+        self.primaryBaseUrl = primaryBaseUrl
+        self.alternateBaseUrl = alternateBaseUrl
+        self.hedgePercentile = hedgePercentile
+        self.initialDelaySeconds = initialDelaySeconds
+        self.minDelaySeconds = minDelaySeconds
+        self.rateLimiter = rateLimiter
+        self.hedgeCount = 0
+        self.hedgeWinCount = 0
+        self.hedgeRateLimitedCount = 0
+        self._executor = concurrent.futures.ThreadPoolExecutor(max_workers=maxWorkers,
+                                                               thread_name_prefix='HedgedFetcher')
+        self._lock = threading.Lock()
+        self._scheduled = []  # heap of (startAt, sequence, _Hedge), startAt being a time.monotonic() value
+        self._sequence = itertools.count()  # breaks startAt ties, so _Hedges are never compared
+        self._schedulerCondition = threading.Condition()
+        self._schedulerThread = None  # started by the first fetch()
+        self._isClosed = False
+
+
+    def __repr__(self):
+        return '{cls}({fetcher}, {alternateBaseUrl!r})'.format(cls=self.__class__.__name__, fetcher=self.fetcher,
+                                                               alternateBaseUrl=self.alternateBaseUrl)
+
+
+    @property
+    def stats(self):
+        return self.fetcher.stats
+
+
+    def hedgeDelaySeconds(self):
+        if len(self.fetcher.stats.recentLatencies) < HedgedFetcher.MIN_SAMPLES:
+            return self.initialDelaySeconds
+
+        return max(self.minDelaySeconds, self.fetcher.stats.percentile(self.hedgePercentile))
+
+
+    def hedgeUrl(self, url):
+        if self.primaryBaseUrl and self.alternateBaseUrl and url.startswith(self.primaryBaseUrl):
+            return self.alternateBaseUrl + url[len(self.primaryBaseUrl):]
+
+        return url
+
+
+    def fetch(self, url, headers=None, timeout=None):
+        """
+        Same arguments and return value as HttpFetcher.fetch(). Raises the primary request's exception if both
+        requests fail.
+        """
+        hedge = _Hedge(self, url, headers, timeout, self.hedgeDelaySeconds())
+        self.schedule(hedge)
+        try:
+            response = self.fetcher.fetch(url, headers=headers, timeout=timeout)
+        except Exception:
+            hedgeResponse = hedge.finishPrimary(isWaiting=True)  # the primary failed. the hedge might not
+            if hedgeResponse:
+                return hedgeResponse
+
+            raise
+
+        return hedge.finishPrimary(isWaiting=False) or response
+
+
+    def close(self):
+        with self._schedulerCondition:
+            self._isClosed = True
+            self._schedulerCondition.notify()
+        self._executor.shutdown(wait=False)
+        self.fetcher.close()
+
+
+    # ==== scheduling ====
+
+    def schedule(self, hedge):
+        """
+        Has the scheduler thread start hedge after its delaySeconds.
+        """
+        with self._schedulerCondition:
+            if not self._schedulerThread:
+                self._schedulerThread = threading.Thread(target=self.runScheduler, name='HedgedFetcher scheduler',
+                                                         daemon=True)
+                self._schedulerThread.start()
+            heapq.heappush(self._scheduled, (time.monotonic() + hedge.delaySeconds, next(self._sequence), hedge))
+            self._schedulerCondition.notify()
+
+
+    def runScheduler(self):
+        """
+        The scheduler thread's loop: starts each scheduled hedge when its time comes, until close(). Hedges whose
+        primary finished in time stay in the heap until then, when start() skips them.
+        """
+        while True:
+            with self._schedulerCondition:
+                while not self._isClosed and (not self._scheduled or self._scheduled[0][0] > time.monotonic()):
+                    self._schedulerCondition.wait(self._scheduled[0][0] - time.monotonic() if self._scheduled
+                                                  else None)
+                if self._isClosed:
+                    return
+
+                _, _, hedge = heapq.heappop(self._scheduled)
+            try:
+                hedge.start()  # doesn't block: it only takes a token if one's available and submits to the executor
+            except Exception as ex:
+                logger.warning('could not start hedge for {}: {!r}'.format(hedge.url, ex))
+
+
+class _Hedge(object):
+    """
+    One HedgedFetcher.fetch() call's hedge request, started by the scheduler thread if the primary request is still
+    going.
+    """
+
+
+    def __init__(self, hedgedFetcher, url, headers, timeout, delaySeconds):
+        self.hedgedFetcher = hedgedFetcher
+        self.url = url
+        self.headers = headers
+        self.timeout = timeout
+        self.delaySeconds = delaySeconds
+        self.primaryThreadIdent = threading.get_ident()
+        self.response = None  # the hedge's response if it won
+        self.future = None  # the hedge request's Future, once it's started
+        self.isPrimaryDone = False
+        self._lock = threading.Lock()
+
+
+    def start(self):
+        hedgedFetcher = self.hedgedFetcher
+        rateLimiter = hedgedFetcher.rateLimiter
+        with self._lock:
+            if self.isPrimaryDone:
+                return
+
+            if rateLimiter and not rateLimiter.acquire(RateLimiter.INTERACTIVE, timeout=0):
+                with hedgedFetcher._lock:
+                    hedgedFetcher.hedgeRateLimitedCount += 1
+                return
+
+            logger.info('hedging {} after {:.3f}s'.format(self.url, self.delaySeconds))
+            with hedgedFetcher._lock:
+                hedgedFetcher.hedgeCount += 1
+            self.future = hedgedFetcher._executor.submit(self.fetch)
+
+
+    def fetch(self):
+        hedgedFetcher = self.hedgedFetcher
+        response = hedgedFetcher.fetcher.fetch(hedgedFetcher.hedgeUrl(self.url), headers=self.headers,
+                                               timeout=self.timeout)
+        with self._lock:
+            if self.isPrimaryDone:  # too late, unless the primary failed. see finishPrimary()
+                return response
+
+            self.response = response
+            # abort() goes by thread, so it has to be called before the primary's thread can move on to another fetch,
+            # which it can't do until finishPrimary() gets this lock. if our primary's fetch just ended, this is a no-op
+            abort = getattr(hedgedFetcher.fetcher, 'abort', None)
+            if abort:
+                abort(self.primaryThreadIdent)
+        self.countWin()
+        return response
+
+
+    def countWin(self):
+        with self.hedgedFetcher._lock:
+            self.hedgedFetcher.hedgeWinCount += 1
+
+
+    def finishPrimary(self, isWaiting):
+        """
+        Called by the primary's thread once the primary request is done.
+
+        :param isWaiting: True if the primary failed, so the caller should wait for the hedge, if one is in flight
+        :return: the hedge's response if it won (or, if isWaiting, succeeded), else None
+        """
+        with self._lock:
+            self.isPrimaryDone = True
+            future = self.future
+            response = self.response
+        if isWaiting and future and not response:
+            try:
+                response = future.result()
+                self.countWin()
+            except Exception:  # the caller raises the primary's exception instead
+                pass
+        return response
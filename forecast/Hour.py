@@ -1,27 +1,79 @@
 import ephem
 from numbers import Number
 
-from functools import total_ordering
+from functools import lru_cache, total_ordering
 
 
 @total_ordering
 class Hour():
+    """
+    An immutable value: a datetime and its weather. Slotted so that it has no per-instance __dict__, which matters
+    because a forecast has hundreds of them. Since Hours can't change, they can be shared, e.g., missingHour()'s.
+    """
+
+    __slots__ = ('datetime', 'precip', 'temp', 'wind', 'clouds')
+
+    VALUE_ATTRIBUTES = ('precip', 'temp', 'wind', 'clouds')  # the weather parameters, in __init__() order
+
+    # how many missingHour()s to keep. a calendar needs under 24 per forecast, and neighbors' forecasts share theirs
+    MISSING_HOURS_MAX = 4096
+
     # desirability rating for the three individual parameters
     P_DES_LOW, P_DES_MED, P_DES_HIGH = ['P_DES_LOW', 'P_DES_MED', 'P_DES_HIGH']
 
     # overall desirability rating for an hour, based on above parameter desirabilities:
     H_DES_LOW, H_DES_MED_LOW, H_DES_MED_HIGH, H_DES_HIGH = 'H_DES_LOW', 'H_DES_MED_LOW', 'H_DES_MED_HIGH', 'H_DES_HIGH'
+    H_DES_ORDER = (H_DES_LOW, H_DES_MED_LOW, H_DES_MED_HIGH, H_DES_HIGH)  # worst to best
+
+    # css classes from /static/hour-colors.css for the above
+    H_DES_TO_CSS_CLASS = {H_DES_LOW: 'Poor', H_DES_MED_LOW: 'Fair', H_DES_MED_HIGH: 'Okay', H_DES_HIGH: 'Great'}
 
 
     def __init__(self, datetime, precip=None, temp=None, wind=None, clouds=None):
         """
         Pass None for the weather parameters to represent missing data, i.e., a 'missing' hour.
         """
-        self.datetime = datetime  # time of forecast. always on the hour, i.e., only the day and hour matter. minutes, etc. are ignored
-        self.precip = precip  # probability of precipitation percent: integers range(101). todo couldn't find docs about range end
-        self.temp = temp  # degrees Fahrenheit: integers (negative and possitive)
-        self.wind = wind  # MPH: whole numbers (integers from 0 up)
-        self.clouds = clouds  # cloud cover percentage
+        # NB: object.__setattr__() because my __setattr__() refuses. the attributes:
+        # - datetime: time of forecast. always on the hour, i.e., only the day and hour matter. minutes, etc. ignored
+        # - precip: probability of precipitation percent: integers range(101). todo couldn't find docs about range end
+        # - temp: degrees Fahrenheit: integers (negative and possitive)
+        # - wind: MPH: whole numbers (integers from 0 up)
+        # - clouds: cloud cover percentage
+        object.__setattr__(self, 'datetime', datetime)
+        object.__setattr__(self, 'precip', precip)
+        object.__setattr__(self, 'temp', temp)
+        object.__setattr__(self, 'wind', wind)
+        object.__setattr__(self, 'clouds', clouds)
+
+
+    def __setattr__(self, name, value):
+        raise AttributeError("Hour is immutable. make a new one: {}".format(name))
+
+
+    def __delattr__(self, name):
+        raise AttributeError("Hour is immutable: {}".format(name))
+
+
+    def __reduce__(self):
+        # for pickle and copy, which would otherwise set my slots via __setattr__()
+        return self.__class__, (self.datetime, self.precip, self.temp, self.wind, self.clouds)
+
+
+    @classmethod
+    def missingHour(cls, datetime):
+        """
+        :return: a missing Hour for datetime, shared with every other caller asking for the same datetime (and UTC
+        offset), e.g., Forecast.hoursAsCalendarRows()'s placeholders
+        """
+        return Hour._missingHour(datetime.replace(tzinfo=None), datetime.tzinfo)
+
+
+    @staticmethod
+    @lru_cache(maxsize=MISSING_HOURS_MAX)
+    def _missingHour(naiveDatetime, tzinfo):
+        # NB: keyed by wall time and tzinfo rather than by datetime, which would match the same instant in another time
+        # zone, e.g., another forecast's
+        return Hour(naiveDatetime.replace(tzinfo=tzinfo))
 
 
     def key(self):
@@ -133,11 +185,7 @@ class Hour():
         if self.isMissingHour():
             return 'Missing'
 
-        hourDesirabilityToClass = {Hour.H_DES_LOW: 'Poor',
-                                   Hour.H_DES_MED_LOW: 'Fair',
-                                   Hour.H_DES_MED_HIGH: 'Okay',
-                                   Hour.H_DES_HIGH: 'Great'}
-        return hourDesirabilityToClass[self.desirability(rangeDict)]
+        return Hour.H_DES_TO_CSS_CLASS[self.desirability(rangeDict)]
 
 
     def charIconsForParams(self, rangeDict):
@@ -0,0 +1,269 @@
+import array
+import datetime
+import itertools
+import sys
+
+from forecast.Hour import Hour
+
+try:
+    import numpy
+except ImportError:  # optional. without it the columns are array.arrays and rating loops in Python
+    numpy = None
+
+
+class HourSeries(object):
+    """
+    A forecast's Hours stored by column: the first Hour's datetime plus one small-int array per parameter (int8 for the
+    percentages, int16 for temp and wind), where each array type's minimum value means missing data. Hours have no
+    gaps, so Hour i's datetime is the first's plus i hours. That's six bytes per hour instead of an Hour object and a
+    datetime, and it pickles (e.g., for SharedForecastCache) as a few byte strings.
+
+    It's a read-only sequence of Hours for code and templates that want them: indexing makes an Hour on the fly, and
+    slicing makes another HourSeries. cssClasses() rates every hour at once, vectorized with NumPy if it's installed.
+    """
+
+    COLUMNS = (('precip', 'b'), ('temp', 'h'), ('wind', 'h'), ('clouds', 'b'))  # (Hour attribute, array typecode)
+    MISSING = {'b': -2 ** 7, 'h': -2 ** 15}  # typecode -> its missing-data value
+    NUMPY_DTYPES = {'b': 'int8', 'h': 'int16'}
+    ONE_HOUR = datetime.timedelta(hours=1)
+
+    # Hour.paramDesirabilityForValue() results as ints, so that they can be counted column-wise
+    P_DES_LOW, P_DES_MED, P_DES_HIGH = 0, 1, 2
+
+
+    def __init__(self, startDatetime, columns, useNumpy=None):
+        """
+        Use fromValues() or fromHours() rather than calling this directly.
+
+        :param startDatetime: the first Hour's aware datetime. None if there are no hours
+        :param columns: dict: {<Hour attribute> -> array.array or numpy array} for each of COLUMNS, all the same length
+        :param useNumpy: True to keep the columns as numpy arrays. defaults to True if numpy is installed
+        """
+        useNumpy = numpy is not None if useNumpy is None else useNumpy
+        if useNumpy and numpy is None:
+            raise ValueError("numpy isn't installed")
+
+        self.startDatetime = startDatetime
+        self.useNumpy = useNumpy
+        self.columns = {name: (numpy.asarray(columns[name], dtype=HourSeries.NUMPY_DTYPES[typecode]) if useNumpy
+                               else columns[name])
+                        for name, typecode in HourSeries.COLUMNS}
+
+
+    @classmethod
+    def fromValues(cls, startDatetime, precips, temps, winds, clouds, useNumpy=None):
+        """
+        :param startDatetime: the first hour's aware datetime
+        :param precips, temps, winds, clouds: each hour's values, in order. None means missing
+        """
+        columns = {}
+        for (name, typecode), values in zip(HourSeries.COLUMNS, (precips, temps, winds, clouds)):
+            missing = HourSeries.MISSING[typecode]
+            try:
+                columns[name] = array.array(typecode, [missing if value is None else value for value in values])
+            except OverflowError as ex:
+                raise ValueError("{} value out of range for HourSeries: {}".format(name, ex))
+
+        if len({len(column) for column in columns.values()}) > 1:
+            raise ValueError("columns have different lengths: {}".format({name: len(column)
+                                                                          for name, column in columns.items()}))
+
+        return cls(startDatetime, columns, useNumpy)
+
+
+    @classmethod
+    def fromHours(cls, hours, useNumpy=None):
+        """
+        :param hours: a sequence of Hours with no gaps, e.g., as returned by WeatherSource.makeHours()
+        """
+        if isinstance(hours, HourSeries):
+            return hours
+
+        hours = list(hours)
+        startDatetime = hours[0].datetime if hours else None
+        for index, hour in enumerate(hours):
+            if hour.datetime != startDatetime + (HourSeries.ONE_HOUR * index):
+                raise ValueError("hours have a gap or are out of order at {}: {}".format(index, hour))
+
+        return cls.fromValues(startDatetime, *[[getattr(hour, name) for hour in hours]
+                                               for name, _ in HourSeries.COLUMNS], useNumpy=useNumpy)
+
+
+    @classmethod
+    def fromHoursWithGaps(cls, hoursWithGaps, useNumpy=None):
+        """
+        Fills hoursWithGaps' gaps by repeating the most recent Hour's values, without making an Hour for each hour.
+
+        This also normalizes the hours' time zones b/c weather service sometimes changes tz *within* one <time-layout>
+        - go figure - and this causes problems: see testHoursAsCalendarRowsIndexOutOfBounds(). we normalize by 1)
+        adopting the first/closest Hour's TZ as the standard for the calendar, and 2) counting every later hour as an
+        offset from it, which is all I store.
+
+        :param hoursWithGaps: sorted Hours, e.g., from WeatherGovSource.hoursWithGapsFromDocument()
+        """
+        if not hoursWithGaps:
+            return cls.fromValues(None, [], [], [], [], useNumpy=useNumpy)
+
+        startDatetime = hoursWithGaps[0].datetime
+        valueLists = ([], [], [], [])
+        prevHour = None
+        for hour in hoursWithGaps:
+            offsetHours, remainder = divmod(hour.datetime - startDatetime, HourSeries.ONE_HOUR)
+            if remainder:  # not on one of my hours, so its values are never used
+                continue
+
+            numFillHours = offsetHours - len(valueLists[0])
+            for valueList, name in zip(valueLists, Hour.VALUE_ATTRIBUTES):
+                if numFillHours:
+                    valueList.extend(itertools.repeat(getattr(prevHour, name), numFillHours))
+                valueList.append(getattr(hour, name))
+            prevHour = hour
+        return cls.fromValues(startDatetime, *valueLists, useNumpy=useNumpy)
+
+
+    def __repr__(self):
+        return '{cls}({startDatetime}, {numHours} hours)'.format(cls=self.__class__.__name__,
+                                                                 startDatetime=self.startDatetime, numHours=len(self))
+
+
+    def __len__(self):
+        return len(self.columns['temp'])
+
+
+    def __getitem__(self, index):
+        """
+        :return: an Hour for an int index, or an HourSeries for a slice (a list of Hours if it has a step)
+        """
+        if isinstance(index, slice):
+            start, stop, step = index.indices(len(self))
+            if step != 1:
+                return [self[index] for index in range(start, stop, step)]
+
+            startDatetime = self.startDatetime + (HourSeries.ONE_HOUR * start) if self.startDatetime else None
+            return HourSeries(startDatetime, {name: column[start:stop] for name, column in self.columns.items()},
+                              self.useNumpy)
+
+        if index < 0:
+            index += len(self)
+        if not 0 <= index < len(self):
+            raise IndexError("HourSeries index out of range: {}".format(index))
+
+        return self.hourForValues(self.startDatetime + (HourSeries.ONE_HOUR * index),
+                                  [self.valueOrNone(self.columns[name][index], typecode)
+                                   for name, typecode in HourSeries.COLUMNS])
+
+
+    def __iter__(self):
+        valueLists = [[self.valueOrNone(value, typecode) for value in self.columns[name].tolist()]
+                      for name, typecode in HourSeries.COLUMNS]
+        for index, values in enumerate(zip(*valueLists)):
+            yield self.hourForValues(self.startDatetime + (HourSeries.ONE_HOUR * index), values)
+
+
+    def __eq__(self, other):
+        # equal to any sequence of equal Hours, e.g., a list
+        if not isinstance(other, (HourSeries, list, tuple)):
+            return NotImplemented
+
+        return len(self) == len(other) and all(hour == otherHour for hour, otherHour in zip(self, other))
+
+
+    __hash__ = None
+
+
+    def __sizeof__(self):
+        return object.__sizeof__(self) + sys.getsizeof(self.__dict__) + sys.getsizeof(self.startDatetime) + \
+            sum(sys.getsizeof(column) for column in self.columns.values())
+
+
+    @classmethod
+    def hourForValues(cls, hourDatetime, values):
+        """
+        :param values: (precip, temp, wind, clouds)
+        :return: an Hour. the shared Hour.missingHour() if it has no data
+        """
+        if values[0] is None and values[1] is None and values[2] is None and values[3] is None:
+            return Hour.missingHour(hourDatetime)
+
+        return Hour(hourDatetime, *values)
+
+
+    @classmethod
+    def valueOrNone(cls, value, typecode):
+        value = int(value)  # NB: numpy ints aren't JSON serializable
+        return None if value == HourSeries.MISSING[typecode] else value
+
+
+    # ==== rating ====
+
+    def cssClasses(self, rangeDict):
+        """
+        :return: list of each hour's Hour.cssClassForDesirability(rangeDict), computed a column at a time
+        """
+        cssClassForIndex = ['Missing'] + [Hour.H_DES_TO_CSS_CLASS[hDes] for hDes in Hour.H_DES_ORDER]
+        return [cssClassForIndex[classIndex] for classIndex in self.desirabilityIndexes(rangeDict)]
+
+
+    def desirabilities(self, rangeDict):
+        """
+        :return: list of each hour's Hour.desirability(rangeDict): H_DES_LOW, etc., or None for a missing hour
+        """
+        hDesForIndex = [None] + list(Hour.H_DES_ORDER)
+        return [hDesForIndex[classIndex] for classIndex in self.desirabilityIndexes(rangeDict)]
+
+
+    def desirabilityIndexes(self, rangeDict):
+        """
+        :return: list of ints, one per hour: 0 for a missing hour, otherwise 1 + the index of its desirability in
+        Hour.H_DES_ORDER. uses Hour.hourDesirabilityForParamDesCounts()'s rules: any low -> low, three highs -> high,
+        two highs (and a medium) -> medium-high, and medium-low otherwise
+        """
+        codeColumns = [self.paramDesirabilityCodes(name, rangeDict[name]) for name in ('precip', 'temp', 'wind')]
+        if self.useNumpy:
+            isMissing = numpy.zeros(len(self), dtype=bool)
+            for name, typecode in HourSeries.COLUMNS:
+                isMissing |= self.columns[name] == HourSeries.MISSING[typecode]
+            lowCounts = sum((codes == HourSeries.P_DES_LOW).astype('int8') for codes in codeColumns)
+            highCounts = sum((codes == HourSeries.P_DES_HIGH).astype('int8') for codes in codeColumns)
+            return numpy.select([isMissing, lowCounts > 0, highCounts == 3, highCounts == 2], [0, 1, 4, 3],
+                                default=2).tolist()
+
+        valueLists = [self.columns[name].tolist() for name, _ in HourSeries.COLUMNS]
+        missingValues = [HourSeries.MISSING[typecode] for _, typecode in HourSeries.COLUMNS]
+        indexes = []
+        for values, codes in zip(zip(*valueLists), zip(*codeColumns)):
+            if any(value == missing for value, missing in zip(values, missingValues)):
+                indexes.append(0)
+            elif HourSeries.P_DES_LOW in codes:
+                indexes.append(1)
+            else:
+                highCount = codes.count(HourSeries.P_DES_HIGH)
+                indexes.append(4 if highCount == 3 else 3 if highCount == 2 else 2)
+        return indexes
+
+
+    def paramDesirabilityCodes(self, paramName, paramSteps):
+        """
+        :param paramSteps: paramName's steps from a rangeDict, e.g., [10, 30]
+        :return: a P_DES_* code for each of paramName's values, as Hour.paramDesirabilityForValue() rates them. a numpy
+        array if I use numpy, else a list. missing values get arbitrary codes
+        """
+        column = self.columns[paramName]
+        if self.useNumpy:
+            if len(paramSteps) == 2:  # H-M-L
+                return numpy.where(column < paramSteps[0], HourSeries.P_DES_HIGH,
+                                   numpy.where(column >= paramSteps[1], HourSeries.P_DES_LOW, HourSeries.P_DES_MED))
+
+            # L-M-H-M-L
+            return numpy.where((column < paramSteps[0]) | (column >= paramSteps[3]), HourSeries.P_DES_LOW,
+                               numpy.where((paramSteps[1] <= column) & (column < paramSteps[2]), HourSeries.P_DES_HIGH,
+                                           HourSeries.P_DES_MED))
+
+        if len(paramSteps) == 2:
+            return [HourSeries.P_DES_HIGH if value < paramSteps[0] else
+                    HourSeries.P_DES_LOW if value >= paramSteps[1] else HourSeries.P_DES_MED
+                    for value in column]
+
+        return [HourSeries.P_DES_LOW if value < paramSteps[0] or value >= paramSteps[3] else
+                HourSeries.P_DES_HIGH if paramSteps[1] <= value < paramSteps[2] else HourSeries.P_DES_MED
+                for value in column]
@@ -0,0 +1,454 @@
+import asyncio
+import collections
+import http.client
+import logging
+import socket
+import threading
+import time
+import urllib.parse
+import zlib
+
+
+logger = logging.getLogger(__name__)
+
+
+class FetchResponse(object):
+    """
+    The result of one HttpFetcher.fetch() call. body is always fully read and decompressed.
+    """
+
+
+    def __init__(self, url, status, headers, body, elapsedSeconds):
+        """
+        :param url: the requested URL
+        :param status: int HTTP status code
+        :param headers: dict of response headers with lower-case names
+        :param body: bytes, decompressed if the server gzipped them
+        :param elapsedSeconds: wall time from sending the request to reading the last byte
+        """
+        self.url = url
+        self.status = status
+        self.headers = headers
+        self.body = body
+        self.elapsedSeconds = elapsedSeconds
+
+
+    def __repr__(self):
+        return '{cls}({url!r}, {status}, {numBytes} bytes, {elapsedSeconds:.3f}s)'.format(
+            cls=self.__class__.__name__, url=self.url, status=self.status, numBytes=len(self.body),
+            elapsedSeconds=self.elapsedSeconds)
+
+
+class FetchAbortedError(OSError):
+    """
+    Raised by a fetch that another thread stopped with HttpFetcher.abort().
+    """
+
+
+class FetchStats(object):
+    """
+    Thread-safe timing and size counters for a fetcher. Keeps the most recent successful fetches' latencies so that
+    percentiles can be computed. Failures aren't included: they're often fast (e.g., a refused connection) or cut short
+    (e.g., a timeout), so they'd skew the percentiles that HedgedFetcher waits for.
+    """
+
+    RECENT_LATENCIES_MAX = 500
+
+
+    def __init__(self):
+        self.fetchCount = 0
+        self.errorCount = 0
+        self.totalSeconds = 0.0
+        self.maxSeconds = 0.0
+        self.wireBytes = 0  # bytes as received, i.e., compressed if the server gzipped them
+        self.bodyBytes = 0  # bytes after decompression
+        self.newConnectionCount = 0
+        self.reusedConnectionCount = 0
+        self.recentLatencies = collections.deque(maxlen=FetchStats.RECENT_LATENCIES_MAX)
+        self._lock = threading.Lock()
+
+
+    def recordFetch(self, elapsedSeconds, wireBytes, bodyBytes):
+        with self._lock:
+            self.fetchCount += 1
+            self.totalSeconds += elapsedSeconds
+            self.maxSeconds = max(self.maxSeconds, elapsedSeconds)
+            self.wireBytes += wireBytes
+            self.bodyBytes += bodyBytes
+            self.recentLatencies.append(elapsedSeconds)
+
+
+    def recordError(self, elapsedSeconds):
+        with self._lock:
+            self.errorCount += 1  # NB: elapsedSeconds isn't a latency sample. see the class docs
+
+
+    def recordConnection(self, isReused):
+        with self._lock:
+            if isReused:
+                self.reusedConnectionCount += 1
+            else:
+                self.newConnectionCount += 1
+
+
+    def percentile(self, percent):
+        """
+        :param percent: 0 through 100
+        :return: the percent-th percentile of recent latencies in seconds, or None if there are none
+        """
+        with self._lock:
+            latencies = sorted(self.recentLatencies)
+        if not latencies:
+            return None
+
+        index = min(len(latencies) - 1, int(len(latencies) * percent / 100))
+        return latencies[index]
+
+
+    def asDict(self):
+        with self._lock:
+            fetchCount = self.fetchCount
+            return {'fetches': fetchCount,
+                    'errors': self.errorCount,
+                    'meanSeconds': self.totalSeconds / fetchCount if fetchCount else None,
+                    'maxSeconds': self.maxSeconds,
+                    'wireBytes': self.wireBytes,
+                    'bodyBytes': self.bodyBytes,
+                    'newConnections': self.newConnectionCount,
+                    'reusedConnections': self.reusedConnectionCount}
+
+
+class HttpFetcher(object):
+    """
+    A minimal HTTP/1.1 GET client for the NDFD service. Keeps a small pool of idle keep-alive connections per host,
+    applies separate connect and read timeouts, asks for gzip and decompresses it as the body streams in, and records
+    FetchStats.
+
+    Any object with a compatible fetch() method can be used in its place - see WeatherGovSource.fetcher.
+    """
+
+    CONNECT_TIMEOUT_DEFAULT = 3.05
+    READ_TIMEOUT_DEFAULT = 10
+    MAX_IDLE_PER_HOST_DEFAULT = 4
+    CHUNK_SIZE = 16 * 1024
+
+
+    def __init__(self, connectTimeout=CONNECT_TIMEOUT_DEFAULT, readTimeout=READ_TIMEOUT_DEFAULT,
+                 maxIdlePerHost=MAX_IDLE_PER_HOST_DEFAULT):
+        """
+        :param connectTimeout: seconds to wait for the TCP connection to open
+        :param readTimeout: seconds to wait for any single socket read once connected
+        :param maxIdlePerHost: maximum number of idle keep-alive connections kept per (scheme, host, port)
+        """
+        self.connectTimeout = connectTimeout
+        self.readTimeout = readTimeout
+        self.maxIdlePerHost = maxIdlePerHost
+        self.stats = FetchStats()
+        self._idleConnections = collections.defaultdict(list)  # (scheme, host, port) -> [HTTPConnection]
+        self._inFlightSockets = {}  # thread ident -> the socket of that thread's fetch, or None before it's connected
+        self._abortedThreads = set()  # thread idents whose in-flight fetch was aborted
+        self._lock = threading.Lock()
+
+
+    def __repr__(self):
+        return '{cls}({connectTimeout}, {readTimeout})'.format(
+            cls=self.__class__.__name__, connectTimeout=self.connectTimeout, readTimeout=self.readTimeout)
+
+
+    def fetch(self, url, headers=None, timeout=None):
+        """
+        :param url: an http or https URL
+        :param headers: optional dict of extra request headers
+        :param timeout: optional latency budget in seconds for the whole request, i.e., sending it and reading the
+            response. raises socket.timeout once it's used up, even if the server is still trickling data
+        :return: a FetchResponse. NB: non-200 responses are returned, not raised - callers decide what to do with them.
+            raises FetchAbortedError if another thread abort()s it
+        """
+        urlParts = urllib.parse.urlsplit(url)
+        poolKey = (urlParts.scheme, urlParts.hostname, urlParts.port)
+        path = urlParts.path + ('?' + urlParts.query if urlParts.query else '')
+        requestHeaders = {'Accept-Encoding': 'gzip', 'Connection': 'keep-alive'}
+        requestHeaders.update(headers or {})
+
+        startTime = time.monotonic()
+        deadline = startTime + timeout if timeout else None
+        threadIdent = threading.get_ident()
+        with self._lock:
+            self._inFlightSockets[threadIdent] = None
+        connection, isReused = self.checkoutConnection(poolKey)
+        try:
+            try:
+                status, responseHeaders, body, wireBytes, willClose = \
+                    self.sendRequest(connection, path, requestHeaders, deadline)
+            except (http.client.RemoteDisconnected, ConnectionResetError, BrokenPipeError):
+                if not isReused or threadIdent in self._abortedThreads:
+                    raise
+
+                # the server closed an idle keep-alive connection. retry once on a fresh one
+                connection.close()
+                connection, isReused = self.newConnection(poolKey), False
+                status, responseHeaders, body, wireBytes, willClose = \
+                    self.sendRequest(connection, path, requestHeaders, deadline)
+            if threadIdent in self._abortedThreads:  # NB: a shut-down socket can look like the end of the body
+                raise FetchAbortedError("fetch of {} was aborted".format(url))
+        except Exception as ex:
+            connection.close()
+            self.stats.recordError(time.monotonic() - startTime)
+            if threadIdent in self._abortedThreads and not isinstance(ex, FetchAbortedError):
+                raise FetchAbortedError("fetch of {} was aborted".format(url)) from ex
+            raise
+        finally:
+            with self._lock:
+                del self._inFlightSockets[threadIdent]
+                self._abortedThreads.discard(threadIdent)
+
+        if willClose:
+            connection.close()
+        else:
+            self.checkinConnection(poolKey, connection)
+        elapsedSeconds = time.monotonic() - startTime
+        self.stats.recordFetch(elapsedSeconds, wireBytes, len(body))
+        return FetchResponse(url, status, responseHeaders, body, elapsedSeconds)
+
+
+    def sendRequest(self, connection, path, requestHeaders, deadline=None):
+        """
+        :param deadline: optional time.monotonic() value by which the response must be completely read
+        :return: 5-tuple: (status, responseHeaders, body, wireBytes, willClose)
+        """
+        if connection.sock is None:
+            connection.connect()  # honors connection.timeout, i.e., connectTimeout
+        sock = connection.sock  # NB: getresponse() clears connection.sock if the server will close the connection
+        with self._lock:
+            self._inFlightSockets[threading.get_ident()] = sock
+            if threading.get_ident() in self._abortedThreads:  # aborted while connecting
+                raise FetchAbortedError("fetch was aborted")
+        sock.settimeout(self.readTimeoutBefore(deadline))
+        connection.request('GET', path, headers=requestHeaders)
+        response = connection.getresponse()
+        responseHeaders = {name.lower(): value for name, value in response.getheaders()}
+        isGzipped = responseHeaders.get('content-encoding', '').lower() == 'gzip'
+        body, wireBytes = self.readBody(response, isGzipped, sock, deadline)
+        return response.status, responseHeaders, body, wireBytes, response.will_close
+
+
+    def readBody(self, response, isGzipped, sock=None, deadline=None):
+        """
+        :return: 2-tuple: (body, wireBytes) where body is decompressed chunk by chunk as it arrives
+        """
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if isGzipped else None  # 16+ -> gzip header
+        chunks = []
+        wireBytes = 0
+        while True:
+            if deadline is not None:  # shrink each read's timeout so that the whole body fits in the budget
+                sock.settimeout(self.readTimeoutBefore(deadline))
+            chunk = response.read1(HttpFetcher.CHUNK_SIZE)  # NB: read() would wait for the whole CHUNK_SIZE
+            if not chunk:
+                break
+
+            wireBytes += len(chunk)
+            chunks.append(decompressor.decompress(chunk) if decompressor else chunk)
+        response.close()  # read1() doesn't mark a fully read Content-Length body as done, which blocks connection reuse
+        if decompressor:
+            chunks.append(decompressor.flush())
+        return b''.join(chunks), wireBytes
+
+
+    def readTimeoutBefore(self, deadline):
+        """
+        :return: the socket timeout to use for the next read: readTimeout, or less if deadline is sooner. raises
+        socket.timeout if deadline has passed
+        """
+        if deadline is None:
+            return self.readTimeout
+
+        remainingSeconds = deadline - time.monotonic()
+        if remainingSeconds <= 0:
+            raise socket.timeout('latency budget exceeded')
+
+        return min(self.readTimeout, remainingSeconds)
+
+
+    def abort(self, threadIdent):
+        """
+        Stops the fetch that threadIdent's thread is making, if any, by shutting down its socket. That fetch raises
+        FetchAbortedError. Used by HedgedFetcher once a hedge request has won.
+        """
+        with self._lock:
+            if threadIdent not in self._inFlightSockets:  # it's done
+                return
+
+            self._abortedThreads.add(threadIdent)
+            sock = self._inFlightSockets[threadIdent]
+        if sock:
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:  # already closed
+                pass
+
+
+    # ==== connection pool ====
+
+    def checkoutConnection(self, poolKey):
+        """
+        :return: 2-tuple: (connection, isReused)
+        """
+        with self._lock:
+            idleConnections = self._idleConnections[poolKey]
+            connection = idleConnections.pop() if idleConnections else None
+        if connection:
+            self.stats.recordConnection(True)
+            return connection, True
+
+        return self.newConnection(poolKey), False
+
+
+    def newConnection(self, poolKey):
+        scheme, host, port = poolKey
+        connectionClass = http.client.HTTPSConnection if scheme == 'https' else http.client.HTTPConnection
+        self.stats.recordConnection(False)
+        return connectionClass(host, port, timeout=self.connectTimeout)
+
+
+    def checkinConnection(self, poolKey, connection):
+        with self._lock:
+            idleConnections = self._idleConnections[poolKey]
+            if len(idleConnections) < self.maxIdlePerHost:
+                idleConnections.append(connection)
+                return
+
+        connection.close()
+
+
+    def close(self):
+        """
+        Closes all idle connections.
+        """
+        with self._lock:
+            idleConnections = [connection for connections in self._idleConnections.values()
+                               for connection in connections]
+            self._idleConnections.clear()
+        for connection in idleConnections:
+            connection.close()
+
+
+class AsyncHttpFetcher(object):
+    """
+    An asyncio counterpart to HttpFetcher for AsyncForecastService, built on asyncio streams so that one event loop
+    can keep hundreds of requests in flight. Same gzip handling, timeouts, and FetchStats, but no connection pooling:
+    each request uses its own 'Connection: close' connection.
+    """
+
+
+    def __init__(self, connectTimeout=HttpFetcher.CONNECT_TIMEOUT_DEFAULT,
+                 readTimeout=HttpFetcher.READ_TIMEOUT_DEFAULT):
+        """
+        :param connectTimeout: seconds to wait for the TCP connection to open
+        :param readTimeout: seconds to wait for the whole response once connected
+        """
+        self.connectTimeout = connectTimeout
+        self.readTimeout = readTimeout
+        self.stats = FetchStats()
+
+
+    def __repr__(self):
+        return '{cls}({connectTimeout}, {readTimeout})'.format(
+            cls=self.__class__.__name__, connectTimeout=self.connectTimeout, readTimeout=self.readTimeout)
+
+
+    async def fetch(self, url, headers=None, timeout=None):
+        """
+        Coroutine version of HttpFetcher.fetch() - same arguments and return value.
+        """
+        urlParts = urllib.parse.urlsplit(url)
+        isHttps = urlParts.scheme == 'https'
+        port = urlParts.port or (443 if isHttps else 80)
+        path = urlParts.path + ('?' + urlParts.query if urlParts.query else '')
+        requestHeaders = {'Host': urlParts.netloc, 'Accept-Encoding': 'gzip', 'Connection': 'close'}
+        requestHeaders.update(headers or {})
+
+        startTime = time.monotonic()
+        try:
+            reader, writer = await asyncio.wait_for(
+                asyncio.open_connection(urlParts.hostname, port, ssl=True if isHttps else None), self.connectTimeout)
+            try:
+                requestLines = ['GET {} HTTP/1.1'.format(path)] + \
+                               ['{}: {}'.format(name, value) for name, value in requestHeaders.items()]
+                writer.write(('\r\n'.join(requestLines) + '\r\n\r\n').encode('latin-1'))
+                readTimeout = self.readTimeout
+                if timeout:  # the latency budget covers the whole request, so take off the time spent connecting
+                    readTimeout = min(readTimeout, max(0, startTime + timeout - time.monotonic()))
+                status, responseHeaders, body, wireBytes = await asyncio.wait_for(self.readResponse(reader),
+                                                                                  readTimeout)
+            finally:
+                writer.close()
+        except Exception:
+            self.stats.recordError(time.monotonic() - startTime)
+            raise
+
+        elapsedSeconds = time.monotonic() - startTime
+        self.stats.recordFetch(elapsedSeconds, wireBytes, len(body))
+        return FetchResponse(url, status, responseHeaders, body, elapsedSeconds)
+
+
+    async def readResponse(self, reader):
+        """
+        :return: 4-tuple: (status, responseHeaders, body, wireBytes). handles chunked and gzipped bodies
+        """
+        statusLine = (await reader.readline()).decode('latin-1')
+        statusParts = statusLine.split(None, 2)
+        if len(statusParts) < 2 or not statusParts[0].startswith('HTTP/'):
+            raise http.client.BadStatusLine(statusLine)
+
+        status = int(statusParts[1])
+        responseHeaders = {}
+        while True:
+            headerLine = (await reader.readline()).decode('latin-1').strip()
+            if not headerLine:
+                break
+
+            name, _, value = headerLine.partition(':')
+            responseHeaders[name.strip().lower()] = value.strip()
+
+        isGzipped = responseHeaders.get('content-encoding', '').lower() == 'gzip'
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if isGzipped else None
+        chunks = []
+        wireBytes = 0
+        async for chunk in self.bodyChunks(reader, status, responseHeaders):
+            wireBytes += len(chunk)
+            chunks.append(decompressor.decompress(chunk) if decompressor else chunk)
+        if decompressor:
+            chunks.append(decompressor.flush())
+        return status, responseHeaders, b''.join(chunks), wireBytes
+
+
+    async def bodyChunks(self, reader, status, responseHeaders):
+        if status == 304 or status == 204 or 100 <= status < 200:
+            return
+
+        if responseHeaders.get('transfer-encoding', '').lower() == 'chunked':
+            while True:
+                sizeLine = await reader.readline()
+                chunkSize = int(sizeLine.split(b';')[0].strip(), 16)
+                if chunkSize == 0:
+                    await reader.readline()  # trailing CRLF. NB: ignores trailers
+                    return
+
+                yield await reader.readexactly(chunkSize)
+                await reader.readexactly(2)  # CRLF after each chunk
+        elif 'content-length' in responseHeaders:
+            remaining = int(responseHeaders['content-length'])
+            while remaining:
+                chunk = await reader.read(min(remaining, HttpFetcher.CHUNK_SIZE))
+                if not chunk:
+                    raise asyncio.IncompleteReadError(b'', remaining)
+
+                remaining -= len(chunk)
+                yield chunk
+        else:
+            while True:
+                chunk = await reader.read(HttpFetcher.CHUNK_SIZE)
+                if not chunk:
+                    return
+
+                yield chunk
@@ -34,6 +34,14 @@ class Location(object):
         return '{cls}({zipOrLatLon!r})'.format(cls=self.__class__.__name__, zipOrLatLon=zipOrLatLon)
 
 
+    def key(self):
+        """
+        :return: a hashable key identifying my lat/lon. used by the forecast caches so that a zip code and its lat/lon
+        share the same forecast data
+        """
+        return self.latitude, self.longitude
+
+
     def latLonTruncated(self):
         # truncate to four digits after decimal
         latStr = self.latitude[:self.latitude.index('.') + 5]
@@ -0,0 +1,78 @@
+import collections
+import threading
+import time
+
+
+class NegativeCache(object):
+    """
+    A small, short-lived, thread-safe cache of failures keyed by Location.key(), so that repeated requests for a
+    location that weather.gov has no data for (e.g., a lat/lon outside NDFD coverage) fail right away instead of going
+    upstream every time. Holds each failure's error message for ttlSeconds. Only failures that will recur should go in
+    here - not timeouts or 5xx responses, which CircuitBreaker handles.
+    """
+
+    TTL_SECONDS_DEFAULT = 10 * 60
+    MAX_ENTRIES_DEFAULT = 10000
+
+
+    def __init__(self, ttlSeconds=TTL_SECONDS_DEFAULT, maxEntries=MAX_ENTRIES_DEFAULT, clock=time.time):
+        """
+        :param ttlSeconds: how long to remember a failure
+        :param maxEntries: maximum number of failures to remember. oldest ones are forgotten first
+        :param clock: function returning the current time in seconds. for testing
+        """
+        self.ttlSeconds = ttlSeconds
+        self.maxEntries = maxEntries
+        self.clock = clock
+        self.hits = 0
+        self._entries = collections.OrderedDict()  # key -> (errorMessage, expiresAt), oldest first
+        self._lock = threading.Lock()
+
+
+    def __repr__(self):
+        return '{cls}({numEntries} entries)'.format(cls=self.__class__.__name__, numEntries=len(self))
+
+
+    def __len__(self):
+        return len(self._entries)
+
+
+    def get(self, key):
+        """
+        :return: the error message for key's recent failure, or None if it hasn't failed recently
+        """
+        with self._lock:
+            errorMessageAndExpiresAt = self._entries.get(key)
+            if errorMessageAndExpiresAt is None:
+                return None
+
+            errorMessage, expiresAt = errorMessageAndExpiresAt
+            if self.clock() >= expiresAt:
+                del self._entries[key]
+                return None
+
+            self.hits += 1
+            return errorMessage
+
+
+    def put(self, key, errorMessage):
+        with self._lock:
+            self._entries.pop(key, None)
+            self._entries[key] = (errorMessage, self.clock() + self.ttlSeconds)
+            while len(self._entries) > self.maxEntries:
+                self._entries.popitem(last=False)
+
+
+    def invalidate(self, key):
+        with self._lock:
+            self._entries.pop(key, None)
+
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+    def stats(self):
+        with self._lock:
+            return {'entries': len(self._entries), 'hits': self.hits}
@@ -0,0 +1,154 @@
+import datetime
+import http.client
+import json
+import logging
+import urllib.parse
+
+from forecast.ForecastCache import CacheEntry
+from forecast.HashRing import HashRing
+from forecast.Hour import Hour
+from forecast.HourSeries import HourSeries
+from forecast.HttpFetcher import HttpFetcher
+
+
+logger = logging.getLogger(__name__)
+
+
+class PeerRouter(object):
+    """
+    Spreads forecasts across several app nodes so that together they cache (and fetch from weather.gov) each location
+    once, instead of every node keeping its own copy of every popular forecast. A HashRing of the nodes' URLs maps each
+    Location.key() to an owner node. The owner makes and caches the forecast as usual; other nodes ask the owner for it
+    via its PEER_PATH route and don't cache it themselves. If the owner can't be reached then the asking node falls back
+    to making the forecast itself, so a node going down costs only its share of cache hits.
+
+    Every node must be given the same node URLs. Adding or removing one moves only about 1/N of the locations.
+    """
+
+    PEER_PATH = '/peer/cache-entry/'
+    TIMEOUT_SECONDS_DEFAULT = 2
+
+
+    def __init__(self, nodeUrl, nodeUrls, fetcher=None, timeoutSeconds=TIMEOUT_SECONDS_DEFAULT,
+                 virtualNodes=HashRing.VIRTUAL_NODES_DEFAULT):
+        """
+        :param nodeUrl: this node's base URL as the other nodes reach it, e.g., 'http://10.0.0.1:8000'
+        :param nodeUrls: every node's base URL. nodeUrl is added if it's missing
+        :param fetcher: an HttpFetcher or compatible object for asking owners. defaults to a new HttpFetcher
+        :param timeoutSeconds: the most time to wait for an owner before falling back to making the forecast here
+        :param virtualNodes: as passed to HashRing()
+        """
+        self.nodeUrl = nodeUrl.rstrip('/')
+        self.ring = HashRing(virtualNodes=virtualNodes)
+        self.fetcher = fetcher or HttpFetcher()
+        self.timeoutSeconds = timeoutSeconds
+        self.forwardCount = 0
+        self.fallbackCount = 0
+        self.setNodeUrls(nodeUrls)
+
+
+    def __repr__(self):
+        return '{cls}({nodeUrl}, {numNodes} nodes)'.format(cls=self.__class__.__name__, nodeUrl=self.nodeUrl,
+                                                           numNodes=len(self.ring))
+
+
+    @classmethod
+    def fromConfigString(cls, nodeUrl, configString, **kwargs):
+        """
+        :param configString: comma-separated node base URLs, e.g., 'http://10.0.0.1:8000,http://10.0.0.2:8000'
+        """
+        return cls(nodeUrl, filter(None, map(str.strip, configString.split(','))), **kwargs)
+
+
+    def setNodeUrls(self, nodeUrls):
+        """
+        Changes membership to nodeUrls (plus me), e.g., when a node is added or retired.
+        """
+        self.ring.setNodes({nodeUrl.rstrip('/') for nodeUrl in nodeUrls} | {self.nodeUrl})
+
+
+    # ==== routing ====
+
+    def ownerForLocation(self, location):
+        """
+        :return: the base URL of the node that owns location's forecasts. all of a location's windows have the same
+        owner, so that its whole forecast can serve them
+        """
+        return self.ring.nodeForKey(location.key())
+
+
+    def isOwner(self, location):
+        return self.ownerForLocation(location) == self.nodeUrl
+
+
+    def peerUrl(self, ownerUrl, location, numDays=None):
+        url = '{}{}{}'.format(ownerUrl, PeerRouter.PEER_PATH,
+                              urllib.parse.quote('{}|{}'.format(location.latitude, location.longitude)))
+        return url + ('?days={}'.format(numDays) if numDays else '')
+
+
+    def cacheEntryFromOwner(self, location, numDays=None):
+        """
+        Asks location's owner for its forecast. Call only if I'm not the owner.
+
+        :return: 2-tuple: (CacheEntry, isStale), or None if the owner couldn't be reached or had a server error (incl.
+        weather.gov failing for it), in which case the caller should make the forecast itself. raises ValueError if the
+        owner found location to be bad, e.g., weather.gov has no data for it
+        """
+        url = self.peerUrl(self.ownerForLocation(location), location, numDays)
+        self.forwardCount += 1
+        try:
+            fetchResponse = self.fetcher.fetch(url, timeout=self.timeoutSeconds)
+        except (OSError, http.client.HTTPException) as ex:  # OSError includes timeouts and connection errors
+            logger.warning('peer {} unreachable: {!r}'.format(url, ex))
+            self.fallbackCount += 1
+            return None
+
+        if fetchResponse.status == 200:
+            return self.cacheEntryFromJson(fetchResponse.body)
+
+        if fetchResponse.status == 422:  # the owner's ValueError. other statuses, e.g., 503, are the owner's trouble
+            raise ValueError(json.loads(fetchResponse.body.decode())['error'])
+
+        logger.warning('peer {} returned HTTP status {}'.format(url, fetchResponse.status))
+        self.fallbackCount += 1
+        return None
+
+
+    def stats(self):
+        """
+        :return: a dict of counters, suitable for logging or JSON
+        """
+        return {'nodeUrl': self.nodeUrl, 'nodeUrls': self.ring.nodes, 'forwardCount': self.forwardCount,
+                'fallbackCount': self.fallbackCount}
+
+
+    # ==== serialization. JSON rather than pickle, since it comes over the network ====
+
+    @classmethod
+    def cacheEntryToJson(cls, cacheEntry, isStale=False):
+        """
+        :return: bytes encoding cacheEntry (without its validators, which only the owner uses) and isStale
+        """
+        return json.dumps({
+            'hours': [[hour.datetime.isoformat(), hour.precip, hour.temp, hour.wind, hour.clouds]
+                      for hour in cacheEntry.hours],
+            'creationDate': cacheEntry.creationDate.isoformat() if cacheEntry.creationDate else None,
+            'refreshSeconds': cacheEntry.refreshSeconds,
+            'fetchedAt': cacheEntry.fetchedAt,
+            'isStale': isStale,
+        }).encode()
+
+
+    @classmethod
+    def cacheEntryFromJson(cls, jsonBytes):
+        """
+        :return: 2-tuple: (CacheEntry, isStale) from cacheEntryToJson()'s output
+        """
+        entryDict = json.loads(jsonBytes.decode())
+        hours = HourSeries.fromHours(Hour(datetime.datetime.fromisoformat(isoformat), precip, temp, wind, clouds)
+                                     for isoformat, precip, temp, wind, clouds in entryDict['hours'])
+        creationDate = datetime.datetime.fromisoformat(entryDict['creationDate']) if entryDict['creationDate'] \
+            else None
+        return CacheEntry(hours, creationDate, entryDict['refreshSeconds'], entryDict['fetchedAt']), \
+            entryDict['isStale']
@@ -0,0 +1,161 @@
+import hashlib
+import math
+import threading
+import time
+
+
+class PopularityTracker(object):
+    """
+    Tracks how often each location is requested, in memory that doesn't grow with the number of distinct locations:
+    counts go in a count-min sketch (depth rows of width counters, where a key's count is the minimum of its counters,
+    so it can be overestimated but never underestimated), and only the topCapacity most popular keys are remembered by
+    name, for topK(). Counts decay exponentially with a half-life of halfLifeSeconds, so the ranking follows current
+    traffic. Thread-safe.
+
+    Decay is done the "forward" way: each request adds weight 2 ** ((now - epoch) / halfLifeSeconds) rather than 1, so
+    nothing has to be decayed on a timer, and counts are scaled back to the present when they're read. The counters are
+    rescaled (and the epoch moved up) before the weights get too big for floats.
+    """
+
+    WIDTH_DEFAULT = 2048
+    DEPTH_DEFAULT = 4
+    HALF_LIFE_SECONDS_DEFAULT = 60 * 60
+    TOP_CAPACITY_DEFAULT = 200
+    MAX_WEIGHT = 2.0 ** 500  # rescale before here. floats overflow at about 2 ** 1024
+
+
+    def __init__(self, width=WIDTH_DEFAULT, depth=DEPTH_DEFAULT, halfLifeSeconds=HALF_LIFE_SECONDS_DEFAULT,
+                 topCapacity=TOP_CAPACITY_DEFAULT, clock=time.time):
+        """
+        :param width: counters per row. more makes overestimates from hash collisions less likely
+        :param depth: rows, i.e., independent hashes per key. more makes bad overestimates less likely
+        :param halfLifeSeconds: how long it takes a request's contribution to a count to halve
+        :param topCapacity: how many of the most popular keys to remember by name. the most topK() can return
+        :param clock: function returning the current time in seconds. for testing
+        """
+        self.width = width
+        self.depth = depth
+        self.halfLifeSeconds = halfLifeSeconds
+        self.topCapacity = topCapacity
+        self.clock = clock
+        self.recordCount = 0
+        self._rows = [[0.0] * width for _ in range(depth)]
+        self._epoch = clock()
+        self._topCounts = {}  # key -> its (scaled) sketch count when it was last recorded
+        self._minTopKey = None  # the key in _topCounts with the smallest count, or None if not known
+        self._lock = threading.Lock()
+
+
+    def __repr__(self):
+        return '{cls}({width}x{depth}, {halfLifeSeconds}s)'.format(
+            cls=self.__class__.__name__, width=self.width, depth=self.depth, halfLifeSeconds=self.halfLifeSeconds)
+
+
+    def __len__(self):
+        return len(self._topCounts)
+
+
+    # ==== recording ====
+
+    def indexesForKey(self, key):
+        """
+        :return: key's counter index in each row, from one hash via double hashing
+        """
+        digest = hashlib.blake2b(repr(key).encode(), digest_size=16).digest()
+        hash1, hash2 = int.from_bytes(digest[:8], 'little'), int.from_bytes(digest[8:], 'little') | 1
+        return [(hash1 + row * hash2) % self.width for row in range(self.depth)]
+
+
+    def record(self, key):
+        """
+        Counts one request for key, e.g., a Location.key().
+        """
+        indexes = self.indexesForKey(key)
+        with self._lock:
+            weight = self.weightAt(self.clock())
+            if weight > PopularityTracker.MAX_WEIGHT:
+                self.rescale(weight)
+                weight = 1.0
+            count = math.inf
+            for row, index in zip(self._rows, indexes):
+                row[index] += weight
+                count = min(count, row[index])
+            self.recordCount += 1
+            self.updateTopCounts(key, count)
+
+
+    def weightAt(self, now):
+        return 2.0 ** ((now - self._epoch) / self.halfLifeSeconds)
+
+
+    def rescale(self, weight):
+        # NB: caller must hold _lock. divides every count by weight and moves the epoch up to now to match
+        for row in self._rows:
+            for index, count in enumerate(row):
+                row[index] = count / weight
+        self._topCounts = {key: count / weight for key, count in self._topCounts.items()}
+        self._epoch += self.halfLifeSeconds * math.log2(weight)
+
+
+    def updateTopCounts(self, key, count):
+        # NB: caller must hold _lock. count is key's new scaled sketch count
+        if key in self._topCounts or len(self._topCounts) < self.topCapacity:
+            if key not in self._topCounts or key == self._minTopKey:
+                self._minTopKey = None  # the smallest might have changed
+            self._topCounts[key] = count
+            return
+
+        if self._minTopKey is None:
+            self._minTopKey = min(self._topCounts, key=self._topCounts.get)
+        if count > self._topCounts[self._minTopKey]:
+            del self._topCounts[self._minTopKey]
+            self._topCounts[key] = count
+            self._minTopKey = None
+
+
+    # ==== reading ====
+
+    def count(self, key):
+        """
+        :return: key's decayed request count as of now. an estimate that's never too low
+        """
+        indexes = self.indexesForKey(key)
+        with self._lock:
+            scaledCount = min(row[index] for row, index in zip(self._rows, indexes))
+            return scaledCount / self.weightAt(self.clock())
+
+
+    def topK(self, k=10):
+        """
+        :return: list of up to k (key, count, ratePerSecond) tuples for the most popular keys, most popular first.
+        count is as in count(). ratePerSecond is the request rate that would, if steady, make that count
+        """
+        decayPerSecond = math.log(2) / self.halfLifeSeconds
+        with self._lock:
+            weight = self.weightAt(self.clock())
+            topCounts = sorted(self._topCounts.items(), key=lambda keyAndCount: keyAndCount[1], reverse=True)[:k]
+        return [(key, scaledCount / weight, scaledCount / weight * decayPerSecond) for key, scaledCount in topCounts]
+
+
+    def topKeys(self, k=10):
+        """
+        :return: the keys from topK(k)
+        """
+        return [key for key, _, _ in self.topK(k)]
+
+
+    def clear(self):
+        with self._lock:
+            self._rows = [[0.0] * self.width for _ in range(self.depth)]
+            self._epoch = self.clock()
+            self._topCounts = {}
+            self._minTopKey = None
+
+
+    def stats(self):
+        """
+        :return: a dict of counters, suitable for logging or JSON
+        """
+        with self._lock:
+            return {'width': self.width, 'depth': self.depth, 'halfLifeSeconds': self.halfLifeSeconds,
+                    'recordCount': self.recordCount, 'trackedKeys': len(self._topCounts)}
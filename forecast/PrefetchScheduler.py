@@ -0,0 +1,225 @@
+import concurrent.futures
+import logging
+import math
+import os
+import random
+import socket
+import threading
+import time
+
+from forecast.Location import Location
+from forecast.RateLimiter import RateLimiter
+from forecast.WeatherGovSource import WeatherGovSource
+
+
+logger = logging.getLogger(__name__)
+
+
+class PrefetchScheduler(object):
+    """
+    A background thread that keeps WeatherGovSource.forecastCache warm for hot locations so that page requests almost
+    never wait on weather.gov. Hot locations are the configured ones plus the most popular ones per popularityTracker
+    (or, without one, the most recently used ones in the cache). Each cycle runs shortly after the next expected NDFD
+    issuance (per the cached <creation-date> and refresh-frequency), spread out by random jitter, and refreshes
+    locations with bounded concurrency. Refreshing goes through the normal WeatherGovSource fetch path, so the cached
+    Hours are exactly what makeHours() produces.
+
+    With a sharedCache, only the process holding its 'prefetch' lease runs cycles, so that a host's workers (and the
+    FetcherDaemon, if any) prefetch each location once rather than once apiece. The others take over if it stops.
+    Without one, each process prefetches for its own forecastCache.
+    """
+
+    ISSUANCE_PERIOD_SECONDS_DEFAULT = 60 * 60  # NDFD's usual refresh-frequency, 'PT1H'
+    LEASE_NAME = 'prefetch'
+
+
+    def __init__(self, locations=(), learnedCount=20, maxConcurrency=4, issuanceOffsetSeconds=5 * 60,
+                 jitterSeconds=2 * 60, batchFetcher=None, popularityTracker=None, sharedCache=None,
+                 sourceClass=WeatherGovSource, clock=time.time):
+        """
+        :param locations: Locations to always refresh
+        :param learnedCount: number of most popular (or most recently used) locations to refresh in addition to
+            locations
+        :param maxConcurrency: maximum number of simultaneous upstream refreshes
+        :param issuanceOffsetSeconds: how long after an expected issuance to start a cycle, giving NDFD time to publish
+        :param jitterSeconds: maximum random delay added to each cycle and to each location within a cycle
+        :param batchFetcher: optional BatchFetcher. if passed, each cycle fetches hot locations in multi-point batches
+            instead of one at a time
+        :param popularityTracker: optional PopularityTracker whose top locations are learned. if None then the most
+            recently used cached locations are
+        :param sharedCache: optional SharedForecastCache whose lease decides which process prefetches
+        :param sourceClass: WeatherGovSource or a compatible class. for testing
+        :param clock: function returning the current time in seconds. for testing
+        """
+        self.locations = list(locations)
+        self.learnedCount = learnedCount
+        self.maxConcurrency = maxConcurrency
+        self.issuanceOffsetSeconds = issuanceOffsetSeconds
+        self.jitterSeconds = jitterSeconds
+        self.batchFetcher = batchFetcher
+        self.popularityTracker = popularityTracker
+        self.sharedCache = sharedCache
+        self.sourceClass = sourceClass
+        self.clock = clock
+        self.leaseHolder = '{}:{}:{}'.format(socket.gethostname(), os.getpid(), id(self))
+        self.refreshCount = 0
+        self.errorCount = 0
+        self._stopEvent = threading.Event()
+        self._thread = None
+        self._lock = threading.Lock()  # guards the counters, which refreshLocation() updates from pool threads
+
+
+    def __repr__(self):
+        return '{cls}({numLocations} locations, {learnedCount} learned)'.format(
+            cls=self.__class__.__name__, numLocations=len(self.locations), learnedCount=self.learnedCount)
+
+
+    @classmethod
+    def fromConfigString(cls, configString, **kwargs):
+        """
+        :param configString: comma-separated zip codes and pipe-separated lat/lons, in the same format as the
+            /forecast/<zipOrLatLon> route, e.g., '01002,42.375370|-72.519249'
+        :return: a new PrefetchScheduler for those locations
+        """
+        locations = []
+        for zipOrLatLon in filter(None, map(str.strip, configString.split(','))):
+            locations.append(Location(zipOrLatLon.split('|') if '|' in zipOrLatLon else zipOrLatLon))
+        return cls(locations, **kwargs)
+
+
+    # ==== scheduling ====
+
+    def start(self):
+        if self._thread:
+            return
+
+        self._thread = threading.Thread(target=self.run, name='PrefetchScheduler', daemon=True)
+        self._thread.start()
+
+
+    def stop(self):
+        self._stopEvent.set()
+
+
+    def run(self):
+        logger.info('{} starting'.format(self))
+        while not self._stopEvent.is_set():
+            if self.isLeader():
+                self.runOnce()
+            self._stopEvent.wait(self.secondsUntilNextRun())
+
+
+    def isLeader(self):
+        """
+        :return: True if this process should run this cycle: it holds sharedCache's lease, or there's no sharedCache.
+        the lease lasts a cycle and a half, so the holder renews it every cycle and another process takes over a cycle
+        after the holder stops
+        """
+        if not self.sharedCache:
+            return True
+
+        leaseSeconds = 1.5 * self.periodSeconds() + self.issuanceOffsetSeconds + self.jitterSeconds
+        return self.sharedCache.acquireLease(PrefetchScheduler.LEASE_NAME, self.leaseHolder, leaseSeconds)
+
+
+    def secondsUntilNextRun(self):
+        """
+        :return: seconds from now until issuanceOffsetSeconds after the next expected issuance, plus jitter
+        """
+        now = self.clock()
+        nextRun = self.nextIssuanceAfter(now - self.issuanceOffsetSeconds) + self.issuanceOffsetSeconds
+        return (nextRun - now) + random.uniform(0, self.jitterSeconds)
+
+
+    def nextIssuanceAfter(self, now):
+        """
+        :return: the first expected issuance time after now, phased to the most recent cached creation date if there
+        is one, and to the top of the UTC period otherwise
+        """
+        period = self.periodSeconds()
+        creationDate = self.latestCreationDate()
+        phase = creationDate.timestamp() if creationDate else 0
+        return phase + (math.floor((now - phase) / period) + 1) * period
+
+
+    def periodSeconds(self):
+        refreshSeconds = [entry.refreshSeconds for entry in self.cachedEntries() if entry.refreshSeconds]
+        return min(refreshSeconds) if refreshSeconds else PrefetchScheduler.ISSUANCE_PERIOD_SECONDS_DEFAULT
+
+
+    def latestCreationDate(self):
+        creationDates = [entry.creationDate for entry in self.cachedEntries() if entry.creationDate]
+        return max(creationDates) if creationDates else None
+
+
+    def cachedEntries(self):
+        forecastCache = self.sourceClass.forecastCache
+        entries = [forecastCache.peek(location.key()) for location in self.hotLocations()]
+        return [entry for entry in entries if entry]
+
+
+    # ==== refreshing ====
+
+    def hotLocations(self):
+        """
+        :return: my configured locations followed by learned ones, without duplicates. a location learned from a
+        forecast window gets its whole forecast prefetched, which serves every window. if sourceClass has a peerRouter
+        then only the locations this node owns are returned, since the other nodes prefetch theirs
+        """
+        hotLocations = list(self.locations)
+        seenKeys = {location.key() for location in hotLocations}
+        learnedKeys = self.popularityTracker.topKeys(self.learnedCount) if self.popularityTracker \
+            else self.sourceClass.forecastCache.recentKeys(self.learnedCount)
+        for key in learnedKeys:
+            key = key[:2]  # (latitude, longitude), without any WeatherGovSource.cacheKey() window
+            if key not in seenKeys:
+                seenKeys.add(key)
+                hotLocations.append(Location(list(key)))
+        peerRouter = self.sourceClass.peerRouter
+        return [location for location in hotLocations if not peerRouter or peerRouter.isOwner(location)]
+
+
+    def runOnce(self):
+        """
+        Refreshes all hot locations, at most maxConcurrency at a time (or in batches if I have a batchFetcher), and
+        waits for them to finish.
+        """
+        hotLocations = self.hotLocations()
+        startTime = time.monotonic()
+        if self.batchFetcher:
+            self.refreshLocationsInBatches(hotLocations)
+            logger.info('{} refreshed {} locations in {:.1f}s'.format(self, len(hotLocations),
+                                                                     time.monotonic() - startTime))
+            return
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=self.maxConcurrency) as executor:
+            for location in hotLocations:
+                executor.submit(self.refreshLocation, location, random.uniform(0, self.jitterSeconds))
+        logger.info('{} refreshed {} locations in {:.1f}s'.format(self, len(hotLocations),
+                                                                 time.monotonic() - startTime))
+
+
+    def refreshLocationsInBatches(self, locations):
+        cacheEntries = self.batchFetcher.cacheEntries(locations, priority=RateLimiter.BACKGROUND)
+        for key, cacheEntryOrException in cacheEntries.items():
+            if isinstance(cacheEntryOrException, Exception):
+                with self._lock:
+                    self.errorCount += 1
+                logger.warning('prefetch failed for {}: {!r}'.format(key, cacheEntryOrException))
+            else:
+                with self._lock:
+                    self.refreshCount += 1
+
+
+    def refreshLocation(self, location, delaySeconds=0):
+        if self._stopEvent.wait(delaySeconds):
+            return
+
+        try:
+            self.sourceClass(location, None, refresh=True)
+            with self._lock:
+                self.refreshCount += 1
+        except Exception as ex:
+            with self._lock:
+                self.errorCount += 1
+            logger.warning('prefetch failed for {}: {!r}'.format(location, ex))
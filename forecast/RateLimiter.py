@@ -0,0 +1,168 @@
+import asyncio
+import collections
+import heapq
+import itertools
+import threading
+import time
+
+from forecast.UpstreamError import UpstreamError
+
+
+class RateLimitedError(UpstreamError):
+    """
+    Raised when a request couldn't get a RateLimiter token in time.
+    """
+
+
+class RateLimiter(object):
+    """
+    A thread-safe token bucket that limits this process's upstream requests to ratePerSecond on average, with bursts
+    of up to burst requests. Callers that have to wait queue by priority: every waiting INTERACTIVE caller (a page
+    load) gets a token before any BACKGROUND one (prefetching, background revalidation, bulk batches), and callers
+    with equal priority go in arrival order. Queue depth and wait times are available from stats().
+    """
+
+    INTERACTIVE = 0
+    BACKGROUND = 1
+    PRIORITY_NAMES = {INTERACTIVE: 'interactive', BACKGROUND: 'background'}
+    ASYNC_POLL_SECONDS = 0.01  # how often acquireAsync() waiters check for their turn
+
+
+    def __init__(self, ratePerSecond, burst=None, clock=time.monotonic):
+        """
+        :param ratePerSecond: average number of tokens added per second
+        :param burst: bucket size, i.e., the most tokens that can be used at once. defaults to ratePerSecond (min 1)
+        :param clock: function returning the current time in seconds. for testing
+        """
+        if ratePerSecond <= 0:
+            raise ValueError("ratePerSecond must be positive: {}".format(ratePerSecond))
+
+        self.ratePerSecond = ratePerSecond
+        self.burst = burst if burst is not None else max(1, ratePerSecond)
+        self.clock = clock
+        self._tokens = self.burst
+        self._refilledAt = clock()
+        self._waiters = []  # heap of (priority, sequence number) for queued callers
+        self._sequence = itertools.count()
+        self._condition = threading.Condition()
+        self._waitSeconds = {priority: collections.deque(maxlen=500) for priority in RateLimiter.PRIORITY_NAMES}
+        self._acquiredCounts = {priority: 0 for priority in RateLimiter.PRIORITY_NAMES}
+        self._timeoutCounts = {priority: 0 for priority in RateLimiter.PRIORITY_NAMES}
+
+
+    def __repr__(self):
+        return '{cls}({ratePerSecond}/s, {burst})'.format(cls=self.__class__.__name__,
+                                                          ratePerSecond=self.ratePerSecond, burst=self.burst)
+
+
+    def acquire(self, priority=INTERACTIVE, timeout=None):
+        """
+        Takes a token, waiting for one if necessary.
+
+        :param priority: INTERACTIVE or BACKGROUND
+        :param timeout: maximum seconds to wait, or None to wait as long as it takes
+        :return: True if a token was taken, or False if timeout passed first
+        """
+        startTime = self.clock()
+        waiter = (priority, next(self._sequence))
+        with self._condition:
+            heapq.heappush(self._waiters, waiter)
+            while True:
+                isAcquired, waitSeconds = self.tryTake(waiter, startTime, timeout)
+                if isAcquired is not None:
+                    return isAcquired
+
+                self._condition.wait(waitSeconds)
+
+
+    async def acquireAsync(self, priority=INTERACTIVE, timeout=None):
+        """
+        acquire() for coroutines: waits on the event loop rather than blocking a thread. async waiters queue with the
+        threaded ones, but since they can't be notified they check back every ASYNC_POLL_SECONDS.
+        """
+        startTime = self.clock()
+        waiter = (priority, next(self._sequence))
+        with self._condition:
+            heapq.heappush(self._waiters, waiter)
+        try:
+            while True:
+                with self._condition:
+                    isAcquired, waitSeconds = self.tryTake(waiter, startTime, timeout)
+                if isAcquired is not None:
+                    return isAcquired
+
+                await asyncio.sleep(RateLimiter.ASYNC_POLL_SECONDS if waitSeconds is None
+                                    else min(waitSeconds, RateLimiter.ASYNC_POLL_SECONDS))
+        except asyncio.CancelledError:  # e.g., the request timed out. don't block the queue
+            with self._condition:
+                if waiter in self._waiters:
+                    self._waiters.remove(waiter)
+                    heapq.heapify(self._waiters)
+                    self._condition.notify_all()
+            raise
+
+
+    def tryTake(self, waiter, startTime, timeout):
+        """
+        One attempt by a queued waiter to take a token. NB: caller must hold _condition.
+
+        :return: 2-tuple: (isAcquired, waitSeconds). isAcquired is True if waiter took a token, False if its timeout
+        passed (and it's been dequeued), and None if it should wait up to waitSeconds (None: until notified) and try
+        again
+        """
+        priority = waiter[0]
+        self.refill()
+        if self._waiters[0] == waiter and self._tokens >= 1:
+            heapq.heappop(self._waiters)
+            self._tokens -= 1
+            self._acquiredCounts[priority] += 1
+            self._waitSeconds[priority].append(self.clock() - startTime)
+            self._condition.notify_all()  # the next waiter may be able to go too
+            return True, None
+
+        remainingSeconds = None if timeout is None else startTime + timeout - self.clock()
+        if remainingSeconds is not None and remainingSeconds <= 0:
+            self._waiters.remove(waiter)
+            heapq.heapify(self._waiters)
+            self._timeoutCounts[priority] += 1
+            self._condition.notify_all()  # we might have been blocking the head of the queue
+            return False, None
+
+        # the head waits for its token. everyone else waits to be notified that the head changed
+        waitSeconds = (1 - self._tokens) / self.ratePerSecond if self._waiters[0] == waiter else None
+        if remainingSeconds is not None:
+            waitSeconds = remainingSeconds if waitSeconds is None else min(waitSeconds, remainingSeconds)
+        return None, waitSeconds
+
+
+    def refill(self):
+        # NB: caller must hold _condition
+        now = self.clock()
+        self._tokens = min(self.burst, self._tokens + (now - self._refilledAt) * self.ratePerSecond)
+        self._refilledAt = now
+
+
+    def queueDepth(self, priority=None):
+        """
+        :return: number of callers waiting for a token, either all of them or just those with priority
+        """
+        with self._condition:
+            return sum(1 for waiterPriority, _ in self._waiters if priority is None or waiterPriority == priority)
+
+
+    def stats(self):
+        """
+        :return: a dict of counters and recent wait times by priority, suitable for logging or JSON
+        """
+        stats = {'ratePerSecond': self.ratePerSecond, 'burst': self.burst}
+        with self._condition:
+            for priority, name in RateLimiter.PRIORITY_NAMES.items():
+                waitSeconds = sorted(self._waitSeconds[priority])
+                stats[name] = {
+                    'queueDepth': sum(1 for waiterPriority, _ in self._waiters if waiterPriority == priority),
+                    'acquired': self._acquiredCounts[priority],
+                    'timeouts': self._timeoutCounts[priority],
+                    'meanWaitSeconds': sum(waitSeconds) / len(waitSeconds) if waitSeconds else None,
+                    'p95WaitSeconds': waitSeconds[int(0.95 * (len(waitSeconds) - 1))] if waitSeconds else None,
+                }
+        return stats
@@ -0,0 +1,298 @@
+import collections
+import logging
+import os
+import pickle
+import sqlite3
+import threading
+import time
+
+from forecast.ForecastCache import CacheEntry
+
+
+logger = logging.getLogger(__name__)
+
+
+class SharedForecastCache(object):
+    """
+    A forecast cache shared by all worker processes on a host, kept in a SQLite database file. It sits behind each
+    process's in-memory ForecastCache: a location that one gunicorn worker has fetched and parsed is available to the
+    others without them going to weather.gov or parsing anything. Entries are pickled CacheEntry contents along with
+    the expiresAt that the writer's ForecastCache computed. The hit, miss, and eviction counters live in the database
+    too, so they cover all workers.
+
+    get() only reads: each process counts its hits and misses, and notes the keys it used, in memory, and writes them
+    to the database at most every flushSeconds (and before evicting or reporting stats). So other processes' counts
+    and entries' accessedAt, which decides what's least recently used, can be up to flushSeconds behind.
+
+    Each thread in each process gets its own connection (sqlite3 connections can't be shared), and the database uses
+    WAL mode so that readers don't block on the occasional writer. NB: entries are pickles, so the database file must
+    only be writable by the app.
+
+    The database also holds a queue of fetch requests, for when a FetcherDaemon does all of the fetching and the web
+    workers only read: a worker that misses calls requestFetch(), and the daemon takes the request, puts the forecast
+    (or records an error for fetchError()), and completes it. The daemon also records a heartbeat, so that workers can
+    tell whether it's running. Leases (acquireLease()) let one process do a job for all of them, e.g., prefetching.
+    """
+
+    MAX_ENTRIES_DEFAULT = 5000
+    BUSY_TIMEOUT_SECONDS = 5
+    ERROR_SECONDS_DEFAULT = 30  # how long a failed fetch's error is reported before the key may be requested again
+    FLUSH_SECONDS_DEFAULT = 10
+
+
+    def __init__(self, path, maxEntries=MAX_ENTRIES_DEFAULT, errorSeconds=ERROR_SECONDS_DEFAULT,
+                 flushSeconds=FLUSH_SECONDS_DEFAULT, clock=time.time):
+        """
+        :param path: the SQLite database file. created if necessary
+        :param maxEntries: maximum number of locations to keep. least recently used ones are evicted first
+        :param errorSeconds: how long fetchError() reports a failed fetch
+        :param flushSeconds: how often get() writes this process's counts and accessed keys to the database
+        :param clock: function returning the current time in seconds. for testing
+        """
+        self.path = path
+        self.maxEntries = maxEntries
+        self.errorSeconds = errorSeconds
+        self.flushSeconds = flushSeconds
+        self.clock = clock
+        self._local = threading.local()
+        self._pendingLock = threading.Lock()
+        self._pendingCounts = collections.Counter()  # counter name -> increment not yet written
+        self._pendingAccesses = {}  # keyString() -> latest accessedAt not yet written
+        self._flushedAt = clock()
+        with self.connection() as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS entries '
+                               '(key TEXT PRIMARY KEY, payload BLOB, expiresAt REAL, accessedAt REAL)')
+            connection.execute('CREATE INDEX IF NOT EXISTS entriesByAccessedAt ON entries (accessedAt)')
+            connection.execute('CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER)')
+            connection.execute('CREATE TABLE IF NOT EXISTS fetchRequests '
+                               '(key TEXT PRIMARY KEY, requestedAt REAL, error TEXT, erroredAt REAL)')
+            connection.execute('CREATE TABLE IF NOT EXISTS heartbeats (name TEXT PRIMARY KEY, beatAt REAL)')
+            connection.execute('CREATE TABLE IF NOT EXISTS leases (name TEXT PRIMARY KEY, holder TEXT, expiresAt REAL)')
+            connection.executemany('INSERT OR IGNORE INTO counters VALUES (?, 0)',
+                                   [('hits',), ('misses',), ('evictions',)])
+
+
+    def __repr__(self):
+        return '{cls}({path!r})'.format(cls=self.__class__.__name__, path=self.path)
+
+
+    def connection(self):
+        """
+        :return: this thread's connection, opening it if necessary. also reopens after a fork, since connections
+        mustn't be used by more than one process
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None or self._local.pid != os.getpid():
+            connection = sqlite3.connect(self.path, timeout=SharedForecastCache.BUSY_TIMEOUT_SECONDS)
+            connection.execute('PRAGMA journal_mode=WAL')
+            connection.execute('PRAGMA synchronous=NORMAL')  # safe with WAL. a crash can lose only the latest writes
+            self._local.connection = connection
+            self._local.pid = os.getpid()
+        return connection
+
+
+    @classmethod
+    def keyString(cls, key):
+        return '|'.join(map(str, key))  # e.g., Location.key() -> '<latitude>|<longitude>'
+
+
+    @classmethod
+    def keyForKeyString(cls, keyString):
+        """
+        :return: the WeatherGovSource.cacheKey() that keyString() made keyString from
+        """
+        keyParts = keyString.split('|')
+        return tuple(keyParts[:2]) + tuple(int(keyPart) for keyPart in keyParts[2:])
+
+
+    # ==== reading and writing ====
+
+    def get(self, key, isCountingMiss=True):
+        """
+        :param isCountingMiss: False if a miss shouldn't count, e.g., because the caller is polling for key
+        :return: the fresh CacheEntry for key, or None if there is none or it has expired
+        """
+        keyString = self.keyString(key)
+        row = self.connection().execute('SELECT payload, expiresAt FROM entries WHERE key = ?',
+                                        (keyString,)).fetchone()
+        now = self.clock()
+        isHit = row is not None and now < row[1]
+        with self._pendingLock:
+            if isHit:
+                self._pendingCounts['hits'] += 1
+                self._pendingAccesses[keyString] = now
+            elif isCountingMiss:
+                self._pendingCounts['misses'] += 1
+            isFlushDue = now - self._flushedAt >= self.flushSeconds
+        if isFlushDue:
+            with self.connection() as connection:
+                self.flush(connection)
+        return self.cacheEntryForPayload(row[0]) if isHit else None
+
+
+    def put(self, key, entry):
+        """
+        Adds or replaces the entry for key, and then evicts entries as needed.
+
+        :param entry: a CacheEntry whose expiresAt has been set, i.e., one that's been put in a ForecastCache
+        """
+        payload = pickle.dumps((entry.hours, entry.creationDate, entry.refreshSeconds, entry.fetchedAt, entry.etag,
+                                entry.lastModified), pickle.HIGHEST_PROTOCOL)
+        with self.connection() as connection:
+            connection.execute('INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?)',
+                               (self.keyString(key), payload, entry.expiresAt, self.clock()))
+            self.flush(connection)  # so that eviction sees which entries were used recently
+            self.evictAsNeeded(connection)
+
+
+    def invalidate(self, key):
+        with self.connection() as connection:
+            connection.execute('DELETE FROM entries WHERE key = ?', (self.keyString(key),))
+
+
+    def clear(self):
+        with self.connection() as connection:
+            connection.execute('DELETE FROM entries')
+            connection.execute('UPDATE counters SET value = 0')
+
+
+    def keysExpiringBefore(self, expiresBefore, accessedSince):
+        """
+        :return: list of keys whose entries expire before expiresBefore and were used since accessedSince, soonest to
+        expire first. used by FetcherDaemon to refresh them before readers miss. NB: readers' uses are up to their
+        flushSeconds behind
+        """
+        rows = self.connection().execute('SELECT key FROM entries WHERE expiresAt < ? AND accessedAt >= ? '
+                                         'ORDER BY expiresAt', (expiresBefore, accessedSince)).fetchall()
+        return [self.keyForKeyString(row[0]) for row in rows]
+
+
+    def evictAsNeeded(self, connection):
+        """
+        Deletes the least recently used entries if there are more than maxEntries.
+        """
+        numEntries = connection.execute('SELECT COUNT(*) FROM entries').fetchone()[0]
+        if numEntries <= self.maxEntries:
+            return
+
+        cursor = connection.execute('DELETE FROM entries WHERE key IN '
+                                    '(SELECT key FROM entries ORDER BY accessedAt LIMIT ?)',
+                                    (numEntries - self.maxEntries,))
+        connection.execute("UPDATE counters SET value = value + ? WHERE name = 'evictions'", (cursor.rowcount,))
+
+
+    def flush(self, connection):
+        """
+        Writes the hit and miss counts and accessed keys that get() has noted since the last flush.
+        """
+        with self._pendingLock:
+            pendingCounts, self._pendingCounts = self._pendingCounts, collections.Counter()
+            pendingAccesses, self._pendingAccesses = self._pendingAccesses, {}
+            self._flushedAt = self.clock()
+        connection.executemany('UPDATE counters SET value = value + ? WHERE name = ?',
+                               [(count, name) for name, count in pendingCounts.items()])
+        connection.executemany('UPDATE entries SET accessedAt = MAX(accessedAt, ?) WHERE key = ?',
+                               [(accessedAt, keyString) for keyString, accessedAt in pendingAccesses.items()])
+
+
+    # ==== fetch requests ====
+
+    def requestFetch(self, key):
+        """
+        Asks the FetcherDaemon to fetch key, unless that's already been asked, or it recently failed.
+        """
+        with self.connection() as connection:
+            connection.execute('DELETE FROM fetchRequests WHERE key = ? AND erroredAt < ?',
+                               (self.keyString(key), self.clock() - self.errorSeconds))
+            connection.execute('INSERT OR IGNORE INTO fetchRequests VALUES (?, ?, NULL, NULL)',
+                               (self.keyString(key), self.clock()))
+
+
+    def fetchError(self, key):
+        """
+        :return: the error message for key's latest fetch if it failed within errorSeconds, or None otherwise
+        """
+        row = self.connection().execute('SELECT error FROM fetchRequests WHERE key = ? AND erroredAt >= ?',
+                                        (self.keyString(key), self.clock() - self.errorSeconds)).fetchone()
+        return row[0] if row else None
+
+
+    def pendingFetchRequests(self, limit):
+        """
+        :return: list of up to limit requested keys that haven't been completed, oldest first
+        """
+        rows = self.connection().execute('SELECT key FROM fetchRequests WHERE erroredAt IS NULL '
+                                         'ORDER BY requestedAt LIMIT ?', (limit,)).fetchall()
+        return [self.keyForKeyString(row[0]) for row in rows]
+
+
+    def completeFetchRequest(self, key, error=None):
+        """
+        Removes key's fetch request, or, if error is passed, records it for fetchError().
+        """
+        with self.connection() as connection:
+            if error is None:
+                connection.execute('DELETE FROM fetchRequests WHERE key = ?', (self.keyString(key),))
+            else:
+                connection.execute('INSERT OR REPLACE INTO fetchRequests VALUES (?, ?, ?, ?)',
+                                   (self.keyString(key), self.clock(), error, self.clock()))
+
+
+    def recordHeartbeat(self, name='fetcher'):
+        with self.connection() as connection:
+            connection.execute('INSERT OR REPLACE INTO heartbeats VALUES (?, ?)', (name, self.clock()))
+
+
+    def heartbeatAge(self, name='fetcher'):
+        """
+        :return: seconds since name's last recordHeartbeat(), or None if it has never recorded one
+        """
+        row = self.connection().execute('SELECT beatAt FROM heartbeats WHERE name = ?', (name,)).fetchone()
+        return self.clock() - row[0] if row else None
+
+
+    # ==== leases ====
+
+    def acquireLease(self, name, holder, leaseSeconds):
+        """
+        Lets one of several processes (e.g., gunicorn workers) do a job, such as prefetching, for all of them. The
+        holder keeps the lease by calling this again before it expires. If it stops (e.g., its process died) then
+        another caller gets the lease once it has expired.
+
+        :param holder: a string identifying the caller, unique across processes
+        :param leaseSeconds: how long the lease lasts from now
+        :return: True if holder now holds name's lease, and False if another holder does
+        """
+        now = self.clock()
+        with self.connection() as connection:
+            cursor = connection.execute('INSERT OR IGNORE INTO leases VALUES (?, ?, ?)',
+                                        (name, holder, now + leaseSeconds))
+            if cursor.rowcount == 1:
+                return True
+
+            cursor = connection.execute('UPDATE leases SET holder = ?, expiresAt = ? '
+                                        'WHERE name = ? AND (holder = ? OR expiresAt <= ?)',
+                                        (holder, now + leaseSeconds, name, holder, now))
+            return cursor.rowcount == 1
+
+
+    @classmethod
+    def cacheEntryForPayload(cls, payload):
+        hours, creationDate, refreshSeconds, fetchedAt, etag, lastModified = pickle.loads(payload)
+        return CacheEntry(hours, creationDate, refreshSeconds, fetchedAt, etag, lastModified)
+
+
+    def stats(self):
+        """
+        :return: a dict of counters for all processes using my database, suitable for logging or JSON. includes my
+        process's latest counts, but other processes' only as of their last flush
+        """
+        connection = self.connection()
+        with connection:
+            self.flush(connection)
+        stats = dict(connection.execute('SELECT name, value FROM counters').fetchall())
+        stats['entries'], stats['bytes'] = connection.execute(
+            'SELECT COUNT(*), COALESCE(SUM(LENGTH(payload)), 0) FROM entries').fetchone()
+        stats['pendingFetchRequests'] = connection.execute(
+            'SELECT COUNT(*) FROM fetchRequests WHERE erroredAt IS NULL').fetchone()[0]
+        return stats
@@ -0,0 +1,66 @@
+import threading
+
+
+class SingleFlight(object):
+    """
+    Coalesces concurrent calls that share a key: the first caller (the leader) runs the function, and callers that
+    arrive while it is in flight wait for it and share its result or exception. Nothing is remembered once the leader
+    finishes - that's ForecastCache's job.
+    """
+
+
+    def __init__(self):
+        self.leaderCount = 0  # calls that actually ran
+        self.coalescedCount = 0  # calls that waited on a leader instead of running
+        self._calls = {}  # key -> _Call
+        self._lock = threading.Lock()
+
+
+    def __repr__(self):
+        return '{cls}({numInFlight} in flight)'.format(cls=self.__class__.__name__, numInFlight=len(self._calls))
+
+
+    def do(self, key, function):
+        """
+        :param key: hashable key identifying the work, e.g., a Location.key()
+        :param function: no-arg function to call if no call for key is in flight
+        :return: function's return value, either from calling it or from sharing the in-flight leader's call
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            isLeader = call is None
+            if isLeader:
+                call = _Call()
+                self._calls[key] = call
+                self.leaderCount += 1
+            else:
+                self.coalescedCount += 1
+
+        if not isLeader:
+            call.doneEvent.wait()
+            if call.exception is not None:
+                raise call.exception
+            return call.result
+
+        try:
+            call.result = function()
+            return call.result
+        except Exception as ex:
+            call.exception = ex
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.doneEvent.set()
+
+
+    def isInFlight(self, key):
+        with self._lock:
+            return key in self._calls
+
+
+class _Call(object):
+    def __init__(self):
+        self.doneEvent = threading.Event()
+        self.result = None
+        self.exception = None
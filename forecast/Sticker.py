@@ -36,6 +36,7 @@ class Sticker:
         # for now all squares, including row and column headers, are equal sizes
         firstHour, numHours = 8, 13  # 8a to 8p
         hoursAsCalendarRows = self.forecast.hoursAsCalendarRows()
+        cssClassRows = self.forecast.cssClassesAsCalendarRows()
         numCols = len(hoursAsCalendarRows[0]) + 1  # including row header
         # excluding brand and column header
         squareSize = self.tableSize[0] / numCols, (self.tableSize[1] - self.brandSize[1]) / (
@@ -50,9 +51,9 @@ class Sticker:
                 self.forecast) else 'gray'  # todo cleaner if css classes
             rowHeading = self.forecast.rowHeadingForHour(hourOfDayIndex)  # '8', '12p', etc.
             self.drawRowHeading(x, y, rowHeading, rowHeadingColor)
-            for hour in hourOfDayRow:  # day of week columns
+            for cssClass in cssClassRows[hourOfDayIndex]:  # day of week columns
                 x += squareSize[0]
-                self.drawHourSquare(x, y, squareSize, hour)
+                self.drawHourSquare(x, y, squareSize, cssClass)
         self.drawGrid(squareSize, numCols, numHours)
 
 
@@ -61,8 +62,10 @@ class Sticker:
         draw.text((x + 2, y), rowHeading, rowHeadingColor)
 
 
-    def drawHourSquare(self, x, y, squareSize, hour):
-        cssClass = hour.cssClassForDesirability(self.forecast.rangeDict)
+    def drawHourSquare(self, x, y, squareSize, cssClass):
+        """
+        :param cssClass: the hour's Hour.cssClassForDesirability(), e.g., from Forecast.cssClassesAsCalendarRows()
+        """
         cssClassToColor = {
             'Poor': '#ff0000',
             'Fair': '#ffaa00',
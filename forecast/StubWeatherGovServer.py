@@ -0,0 +1,242 @@
+import argparse
+import gzip
+import hashlib
+import http.server
+import logging
+import os
+import random
+import threading
+import time
+import urllib.parse
+import xml.etree.ElementTree as ET
+
+
+logger = logging.getLogger(__name__)
+
+
+class StubWeatherGovServer(object):
+    """
+    A local stand-in for the NDFD REST endpoint that replays recorded DWML files, for testing and benchmarking the
+    fetch path without weather.gov. Single-point requests (whichClient=NDFDgen) get the recorded file whose <point> is
+    nearest the requested lat/lon. Multi-point requests (whichClient=NDFDgenLatLonList) get those files' data combined
+    into one multi-point document, like NDFD's. Responses have an ETag and honor If-None-Match, and are gzipped if the
+    client asks for it.
+
+    To simulate a bad day, the server can add latency, answer with HTTP 503s, or answer with NDFD's 200 OK <error>
+    document (as in test-forecast-error-response.xml). Point WeatherGovSource.baseUrl at url() to use it.
+    """
+
+    ERROR_DOCUMENT_FILE_NAME = 'test-forecast-error-response.xml'
+
+
+    def __init__(self, fixtureDirectory='test', host='127.0.0.1', port=0, latencySeconds=0, latencyJitterSeconds=0,
+                 errorRate=0, errorDocumentRate=0, maxDistanceDegrees=None, seed=None):
+        """
+        :param fixtureDirectory: where to find recorded DWML files. every single-point *.xml file is used
+        :param host: interface to listen on
+        :param port: port to listen on. 0 picks a free one - see url()
+        :param latencySeconds: delay before every response
+        :param latencyJitterSeconds: maximum random delay added to latencySeconds
+        :param errorRate: fraction of requests answered with HTTP 503
+        :param errorDocumentRate: fraction of requests answered with the <error> document
+        :param maxDistanceDegrees: if passed, lat/lons farther than this from every recorded point get the <error>
+            document, as NDFD does for points outside its grid. by default the nearest recording is always used
+        :param seed: optional random seed, for reproducible error and latency injection
+        """
+        self.latencySeconds = latencySeconds
+        self.latencyJitterSeconds = latencyJitterSeconds
+        self.errorRate = errorRate
+        self.errorDocumentRate = errorDocumentRate
+        self.maxDistanceDegrees = maxDistanceDegrees
+        self.random = random.Random(seed)
+        self.requestCount = 0
+        self.fixtures = self.fixturesInDirectory(fixtureDirectory)  # list of (latitude, longitude, dwmlElement)
+        with open(os.path.join(fixtureDirectory, StubWeatherGovServer.ERROR_DOCUMENT_FILE_NAME), 'rb') as xmlFile:
+            self.errorDocument = xmlFile.read()
+        self.httpServer = http.server.ThreadingHTTPServer((host, port), _StubHandler)
+        self.httpServer.stub = self
+        self._thread = None
+
+
+    def __repr__(self):
+        return '{cls}({url}, {numFixtures} fixtures)'.format(cls=self.__class__.__name__, url=self.url(),
+                                                              numFixtures=len(self.fixtures))
+
+
+    def url(self):
+        """
+        :return: my base URL, suitable for WeatherGovSource.baseUrl
+        """
+        host, port = self.httpServer.server_address[:2]
+        return 'http://{}:{}/xml/sample_products/browser_interface/ndfdXMLclient.php'.format(host, port)
+
+
+    def start(self):
+        self._thread = threading.Thread(target=self.httpServer.serve_forever, name=repr(self), daemon=True)
+        self._thread.start()
+
+
+    def stop(self):
+        self.httpServer.shutdown()
+        self.httpServer.server_close()
+
+
+    # ==== fixtures ====
+
+    @classmethod
+    def fixturesInDirectory(cls, fixtureDirectory):
+        fixtures = []
+        for fileName in sorted(os.listdir(fixtureDirectory)):
+            if not fileName.endswith('.xml'):
+                continue
+
+            try:
+                dwmlElement = ET.parse(os.path.join(fixtureDirectory, fileName)).getroot()
+            except ET.ParseError:
+                continue
+
+            pointEles = dwmlElement.findall('data/location/point')
+            if dwmlElement.tag == 'dwml' and len(pointEles) == 1:
+                fixtures.append((float(pointEles[0].attrib['latitude']), float(pointEles[0].attrib['longitude']),
+                                 dwmlElement))
+        if not fixtures:
+            raise ValueError("no single-point DWML files found in {}".format(fixtureDirectory))
+
+        return fixtures
+
+
+    def fixtureNearest(self, latitude, longitude):
+        """
+        :return: the dwmlElement recorded nearest latitude and longitude, or None if it's farther than
+        maxDistanceDegrees
+        """
+        fixtureLat, fixtureLon, dwmlElement = min(
+            self.fixtures, key=lambda fixture: (fixture[0] - latitude) ** 2 + (fixture[1] - longitude) ** 2)
+        if self.maxDistanceDegrees is not None and \
+                (fixtureLat - latitude) ** 2 + (fixtureLon - longitude) ** 2 > self.maxDistanceDegrees ** 2:
+            return None
+
+        return dwmlElement
+
+
+    @classmethod
+    def multiPointDocument(cls, dwmlElements):
+        """
+        :return: a DWML root element that combines the single-point dwmlElements as NDFD would for a multi-point
+        request: point N's <location> and <parameters> have location-key 'pointN', and its time-layout keys get a
+        '-pN' suffix so that the points' layouts don't collide
+        """
+        multiDwmlEle = ET.Element(dwmlElements[0].tag, dwmlElements[0].attrib)
+        multiDwmlEle.append(dwmlElements[0].find('head'))
+        multiDataEle = ET.SubElement(multiDwmlEle, 'data')
+        for index, dwmlElement in enumerate(dwmlElements):
+            pointKey = 'point{}'.format(index + 1)
+            layoutSuffix = '-p{}'.format(index + 1)
+            locationEle = ET.fromstring(ET.tostring(dwmlElement.find('data/location')))  # copies, so we can change
+            locationEle.find('location-key').text = pointKey
+            multiDataEle.append(locationEle)
+            for timeLayoutEle in dwmlElement.findall('data/time-layout'):
+                timeLayoutEle = ET.fromstring(ET.tostring(timeLayoutEle))
+                timeLayoutEle.find('layout-key').text += layoutSuffix
+                multiDataEle.append(timeLayoutEle)
+            parametersEle = ET.fromstring(ET.tostring(dwmlElement.find('data/parameters')))
+            parametersEle.set('applicable-location', pointKey)
+            for paramEle in parametersEle:
+                if 'time-layout' in paramEle.attrib:
+                    paramEle.set('time-layout', paramEle.attrib['time-layout'] + layoutSuffix)
+            multiDataEle.append(parametersEle)
+        return multiDwmlEle
+
+
+    # ==== responding ====
+
+    def responseForQuery(self, queryDict):
+        """
+        :param queryDict: the request's query parameters, as from urllib.parse.parse_qs()
+        :return: 2-tuple: (status, body), before any injected latency or errors
+        """
+        try:
+            if queryDict.get('whichClient', [''])[0] == 'NDFDgenLatLonList':
+                latLons = [latLon.split(',') for latLon in queryDict['listLatLon'][0].replace('+', ' ').split()]
+            else:
+                latLons = [(queryDict['lat'][0], queryDict['lon'][0])]
+            dwmlElements = [self.fixtureNearest(float(lat), float(lon)) for lat, lon in latLons]
+        except (KeyError, ValueError):
+            return 400, b'bad request'
+
+        if not dwmlElements or None in dwmlElements:
+            return 200, self.errorDocument
+
+        dwmlElement = dwmlElements[0] if len(dwmlElements) == 1 else self.multiPointDocument(dwmlElements)
+        return 200, ET.tostring(dwmlElement, encoding='UTF-8')
+
+
+    def injectedLatencySeconds(self):
+        return self.latencySeconds + self.random.uniform(0, self.latencyJitterSeconds)
+
+
+class _StubHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive, like weather.gov
+
+
+    def do_GET(self):
+        stub = self.server.stub
+        stub.requestCount += 1
+        time.sleep(stub.injectedLatencySeconds())
+        roll = stub.random.random()
+        if roll < stub.errorRate:
+            self.sendBody(503, b'Service Unavailable')
+            return
+
+        if roll < stub.errorRate + stub.errorDocumentRate:
+            self.sendBody(200, stub.errorDocument)
+            return
+
+        status, body = stub.responseForQuery(urllib.parse.parse_qs(urllib.parse.urlsplit(self.path).query))
+        etag = '"{}"'.format(hashlib.sha1(body).hexdigest())
+        if status == 200 and self.headers.get('If-None-Match') == etag:
+            self.sendBody(304, b'', {'ETag': etag})
+        else:
+            self.sendBody(status, body, {'ETag': etag} if status == 200 else {})
+
+
+    def sendBody(self, status, body, headers=None):
+        if body and 'gzip' in self.headers.get('Accept-Encoding', ''):
+            body = gzip.compress(body)
+            headers = dict(headers or {}, **{'Content-Encoding': 'gzip'})
+        self.send_response(status)
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.send_header('Content-Type', 'text/xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, format, *args):
+        logger.debug('{} - {}'.format(self.address_string(), format % args))
+
+
+def main():
+    argParser = argparse.ArgumentParser(description="Serve recorded DWML files as a stand-in for weather.gov. Run the "
+                                                    "app with PEEPWEATHER_UPSTREAM_URL set to the printed URL.")
+    argParser.add_argument('--fixtures', default='test', help="directory of recorded DWML files")
+    argParser.add_argument('--host', default='127.0.0.1')
+    argParser.add_argument('--port', type=int, default=8001)
+    argParser.add_argument('--latency', type=float, default=0, help="seconds to wait before every response")
+    argParser.add_argument('--jitter', type=float, default=0, help="maximum random seconds added to --latency")
+    argParser.add_argument('--error-rate', type=float, default=0, help="fraction of requests answered with HTTP 503")
+    argParser.add_argument('--error-document-rate', type=float, default=0,
+                           help="fraction of requests answered with the <error> document")
+    argParser.add_argument('--max-distance', type=float, default=None,
+                           help="degrees beyond which lat/lons get the <error> document instead of the nearest file")
+    args = argParser.parse_args()
+
+    stub = StubWeatherGovServer(args.fixtures, args.host, args.port, args.latency, args.jitter, args.error_rate,
+                                args.error_document_rate, args.max_distance)
+    print(stub.url())
+    stub.httpServer.serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,6 @@
+class UpstreamError(Exception):
+    """
+    Raised when weather.gov can't be used right now, e.g., it responded with a server error (5xx), i.e., it's having
+    trouble rather than rejecting us. Unlike ValueError, which means a bad location or request, these are transient,
+    so callers should serve what they have or try again later rather than reporting the location as bad.
+    """
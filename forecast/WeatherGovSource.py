@@ -1,83 +1,486 @@
 import datetime
 import functools
+import itertools
 import logging
-import urllib.request
 import xml.etree.ElementTree as ET
-import operator
+import re
+import threading
+import time
 
+from forecast.CircuitBreaker import CircuitBreaker, CircuitOpenError
+from forecast.DwmlDocument import DwmlDocument
+from forecast.ForecastCache import ForecastCache, CacheEntry
 from forecast.Hour import Hour
-
-from forecast.Location import Location
+from forecast.HourSeries import HourSeries
+from forecast.HttpFetcher import HttpFetcher
+from forecast.NegativeCache import NegativeCache
+from forecast.PopularityTracker import PopularityTracker
+from forecast.RateLimiter import RateLimiter, RateLimitedError
+from forecast.SingleFlight import SingleFlight
+from forecast.UpstreamError import UpstreamError
+from forecast.WeatherSource import WeatherSource
 
 
 logger = logging.getLogger(__name__)
 
 
-class WeatherGovSource(object):
+class WeatherGovSource(WeatherSource):
     """
-    Abstract class that represents an online weather source that provides forecast information for a particular
-    Location. Stored as a sequence of Hour instances. These have no gaps, i.e., there is one Hour for every hour,
-    and all time zone information is normalized. (weather.gov mixes time zones, and has gaps in forecasts.)
-    A WeatherSource that uses weather.gov to get forecast data.
+    A WeatherSource that uses weather.gov to get forecast data. (weather.gov mixes time zones, and has gaps in
+    forecasts, which makeHours() fixes.)
     """
 
+    # the NDFD REST endpoint. point this at a StubWeatherGovServer to test or benchmark without weather.gov
+    baseUrl = 'http://graphical.weather.gov/xml/sample_products/browser_interface/ndfdXMLclient.php'
+
+    # shared by all instances so that repeated requests for a location skip the network and the XML parse
+    forecastCache = ForecastCache()
+
+    # concurrent cache misses for the same location share one fetch and parse
+    singleFlight = SingleFlight()
+
+    # cache keys with a revalidateInBackground() refresh running, so that concurrent stale hits start just one
+    revalidatingKeys = set()
+    revalidatingLock = threading.Lock()
+
+    # anything with an HttpFetcher-compatible fetch() method. shared so that keep-alive connections are reused
+    fetcher = HttpFetcher()
+
+    # optional BatchFetcher. if set, locations with nothing to revalidate are fetched in multi-point batches
+    batchFetcher = None
+
+    # locations that weather.gov recently answered with its <error> document. they fail without going upstream
+    negativeCache = NegativeCache()
+
+    # how often each location is requested, fed by the forecast, embed, and sticker routes. see PrefetchScheduler
+    popularityTracker = PopularityTracker()
+
+    # optional SharedForecastCache. if set, parsed forecasts are shared with the other worker processes on this host
+    sharedCache = None
+
+    # True if this process leaves weather.gov to a FetcherDaemon: on a miss it asks the daemon via sharedCache and
+    # waits up to latencyBudgetSeconds for the result. requires sharedCache. if the daemon's heartbeat is older than
+    # READER_HEARTBEAT_SECONDS (e.g., it isn't running) then this process fetches for itself as usual
+    isReader = False
+    READER_POLL_SECONDS = 0.05
+    READER_HEARTBEAT_SECONDS = 5
+
+    # optional PeerRouter. if set, forecasts for locations that another app node owns are gotten from that node
+    peerRouter = None
 
-    def __repr__(self):
-        return '{cls}({location})'.format(
-            cls=self.__class__.__name__, location=self.location.__repr__())
+    # optional DwmlStore. if set, fetched documents are saved to disk, and are checked before going to weather.gov
+    dwmlStore = None
 
+    # fails fetches fast while weather.gov is erroring or slow, instead of making every request wait for a timeout
+    circuitBreaker = CircuitBreaker()
 
-    def __init__(self, location, rangeDict, elementTree=None):
+    # optional RateLimiter for upstream requests. page loads get tokens before prefetching and background refreshes
+    rateLimiter = None
+
+    # the most time one upstream request may take, from sending it to reading the last byte of the response
+    latencyBudgetSeconds = 8
+
+    # parseStartValidTime()'s memo size, and its tzinfos: {'-05:00' -> datetime.timezone}
+    PARSED_TIMES_MAX = 4096
+    TZINFO_FOR_OFFSET_TEXT = {}
+
+    # the Hour attribute that each DWML <parameters> element's values go in
+    PARAM_NAME_TO_HOUR_ATTRIBUTE = {'probability-of-precipitation': 'precip', 'temperature': 'temp',
+                                    'wind-speed': 'wind', 'cloud-amount': 'clouds'}
+
+
+    def __init__(self, location, rangeDict, elementTree=None, refresh=False, numDays=None, usePeers=True,
+                 dwmlDocument=None, cacheEntry=None, priority=None):
         """
         :param location: a Location
         :param rangeDict: optional as in PARAM_RANGE_STEPS_DEFAULT. uses that default if not passed
-        :param elementTree: optional ElementTree to use for testing to bypass urlopen() call
+        :param elementTree: optional ElementTree to use for testing to bypass the fetcher
+        :param refresh: True if a fresh forecastCache entry should be ignored and (conditionally) fetched again. used
+            by PrefetchScheduler
+        :param numDays: optional number of calendar days of forecast to get, starting today. if passed then only that
+            window is requested from weather.gov, which makes for a smaller response, parse, and list of Hours.
+            defaults to the whole forecast
+        :param usePeers: False if peerRouter shouldn't be used, e.g., because another node asked me for the forecast
+        :param dwmlDocument: optional DwmlDocument to make my Hours from, bypassing the fetcher. like elementTree, but
+            already parsed
+        :param cacheEntry: optional CacheEntry to make my Hours from, bypassing the caches and the fetcher, e.g., one
+            that AsyncForecastService already got. if it's expired then I'm stale
+        :param priority: the RateLimiter priority of my fetch, if any. defaults to BACKGROUND if refresh, else
+            INTERACTIVE
+        """
+        super().__init__(location)
+        self.numDays = numDays
+        self.usePeers = usePeers
+        if elementTree:
+            dwmlDocument = DwmlDocument.fromElement(elementTree.getroot())
+        self.hours = self.makeHours(dwmlDocument, rangeDict, refresh, cacheEntry, priority)
+
+
+    def makeHours(self, dwmlDocument, rangeDict, refresh=False, cacheEntry=None, priority=None):
+        """
+        :return: a list of Hour instances for location. uses forecastCache unless dwmlDocument or cacheEntry is passed
+        """
+        if dwmlDocument:
+            self.creationDate, self.refreshSeconds = self.creationDateFromDocument(dwmlDocument)
+            self.fetchedAt = time.time()
+            return self.hoursFromDocument(dwmlDocument, rangeDict)
+
+        if cacheEntry:
+            if self.forecastCache.isExpired(cacheEntry):
+                self.isStale = True
+                if self.forecastCache.isServable(cacheEntry):  # as with getStale() below
+                    self.revalidateInBackground(rangeDict)
+            return self.hoursFromCacheEntry(cacheEntry)
+
+        key = self.cacheKey(self.location, self.numDays)
+        cacheEntry = None if refresh else self.forecastCache.get(key)
+        if not cacheEntry and not refresh and self.numDays:
+            # a fresh whole forecast (e.g., a prefetched one) has every window in it
+            wholeEntry = self.forecastCache.peek(self.location.key())
+            if wholeEntry and not self.forecastCache.isExpired(wholeEntry):
+                cacheEntry = wholeEntry
+        if not cacheEntry and not refresh and self.sharedCache:
+            cacheEntry = self.sharedCache.get(key)  # another worker may have fetched it
+            if cacheEntry:
+                self.forecastCache.put(key, cacheEntry)
+        if not cacheEntry and not refresh and self.usePeers and self.peerRouter \
+                and not self.peerRouter.isOwner(self.location):
+            # the owner caches it, so we don't. None means the owner is unreachable, so we make it ourselves
+            cacheEntryAndIsStale = self.peerRouter.cacheEntryFromOwner(self.location, self.numDays)
+            if cacheEntryAndIsStale:
+                cacheEntry, self.isStale = cacheEntryAndIsStale
+        if not cacheEntry and not refresh:
+            # stale-while-revalidate: serve a recently expired forecast right away and refresh it in the background
+            cacheEntry = self.forecastCache.getStale(key)
+            if cacheEntry:
+                self.isStale = True
+                self.revalidateInBackground(rangeDict)
+        if not cacheEntry and self.isFetcherDaemonRunning():
+            cacheEntry = self.cacheEntryFromFetcherDaemon(key)
+        if not cacheEntry:
+            errorMessage = self.negativeCache.get(self.location.key())
+            if errorMessage:
+                raise ValueError(errorMessage)
+
+            if priority is None:
+                priority = RateLimiter.BACKGROUND if refresh else RateLimiter.INTERACTIVE
+            try:
+                cacheEntry = self.singleFlight.do(key, lambda: self.fetchCacheEntry(rangeDict, priority))
+            except (CircuitOpenError, RateLimitedError, UpstreamError, OSError):  # OSError: timeouts, connections
+                # weather.gov is down, failing, too slow, or too busy. serve the last good forecast we have, if any
+                cacheEntry = None if refresh else self.forecastCache.peek(key)
+                if not cacheEntry:
+                    raise
+
+                logger.warning('serving last good forecast for {} from {}'.format(self.location, cacheEntry.fetchedAt))
+                self.isStale = True
+        return self.hoursFromCacheEntry(cacheEntry)
+
+
+    def hoursFromCacheEntry(self, cacheEntry):
+        """
+        :return: cacheEntry's Hours in my numDays window. also sets my creationDate, refreshSeconds, and fetchedAt
+        """
+        self.creationDate = cacheEntry.creationDate
+        self.refreshSeconds = cacheEntry.refreshSeconds
+        self.fetchedAt = cacheEntry.fetchedAt
+        return self.hoursInWindow(cacheEntry.hours, self.numDays)
+
+
+    def revalidateInBackground(self, rangeDict):
+        """
+        Starts a thread that refreshes my location's forecastCache entry, unless a refresh is already in flight.
+        """
+        key = self.cacheKey(self.location, self.numDays)
+        if self.isFetcherDaemonRunning():
+            self.sharedCache.requestFetch(key)
+            return
+
+        with self.revalidatingLock:
+            if key in self.revalidatingKeys or self.singleFlight.isInFlight(key):
+                return
+
+            self.revalidatingKeys.add(key)
+
+
+        def revalidate():
+            try:
+                if not self.forecastCache.get(key):  # another thread may have beaten us to it
+                    self.singleFlight.do(key, lambda: self.fetchCacheEntry(rangeDict, RateLimiter.BACKGROUND))
+            except Exception as ex:
+                logger.warning('background refresh failed for {}: {!r}'.format(self.location, ex))
+            finally:
+                with self.revalidatingLock:
+                    self.revalidatingKeys.discard(key)
+
+
+        threading.Thread(target=revalidate, name='revalidate {}'.format(self.location), daemon=True).start()
+
+
+    @classmethod
+    def isFetcherDaemonRunning(cls):
+        """
+        :return: True if I'm a reader and there's a FetcherDaemon to fetch for me
+        """
+        if not cls.isReader:
+            return False
+
+        heartbeatAge = cls.sharedCache.heartbeatAge()
+        return heartbeatAge is not None and heartbeatAge < cls.READER_HEARTBEAT_SECONDS
+
+
+    def cacheEntryFromFetcherDaemon(self, key):
+        """
+        For readers: asks the FetcherDaemon for key and waits for it to show up in sharedCache, up to
+        latencyBudgetSeconds. If it doesn't, the last good forecast is used if there is one.
+
+        :return: the CacheEntry. raises ValueError if the daemon's fetch failed or it took too long
         """
-        if not isinstance(location, Location):
-            raise ValueError("location is not a Location instance: {}".format(location))
+        self.sharedCache.requestFetch(key)
+        deadline = time.monotonic() + self.latencyBudgetSeconds
+        while True:
+            cacheEntry = self.sharedCache.get(key, isCountingMiss=False)
+            if cacheEntry:
+                self.forecastCache.put(key, cacheEntry)
+                return cacheEntry
 
-        self.location = location
-        self.hours = self.makeHours(elementTree, rangeDict)
+            errorMessage = self.sharedCache.fetchError(key)
+            if errorMessage:
+                raise ValueError(errorMessage)
 
+            if time.monotonic() >= deadline:
+                break
 
-    def makeHours(self, elementTree, rangeDict):
+            time.sleep(self.READER_POLL_SECONDS)
+
+        cacheEntry = self.forecastCache.peek(key)
+        if not cacheEntry:
+            raise ValueError("Timed out getting the forecast from weather.gov. Please try again in a few minutes")
+
+        logger.warning('serving last good forecast for {} from {}'.format(self.location, cacheEntry.fetchedAt))
+        self.isStale = True
+        return cacheEntry
+
+
+    def fetchCacheEntry(self, rangeDict, priority=RateLimiter.INTERACTIVE):
+        """
+        Fetches and parses my location's forecast from weather.gov, and saves the result in forecastCache. If there is
+        an expired entry with validators then the request is conditional, and a 304 response reuses its Hours without
+        downloading or parsing anything. If forecastCache has nothing for my location then dwmlStore is tried first.
+        dwmlStore and batchFetcher only hold whole forecasts, so they're skipped if I have numDays.
+
+        :param priority: the request's rateLimiter priority
+        :return: the new CacheEntry
+        """
+        staleEntry = self.forecastCache.peek(self.cacheKey(self.location, self.numDays))
+        if not staleEntry and self.dwmlStore and not self.numDays:
+            staleEntry = self.cacheEntryFromDwmlStore(self.location, rangeDict)
+            if staleEntry and not self.forecastCache.isExpired(staleEntry):
+                return staleEntry
+
+        validatorHeaders = staleEntry.validatorHeaders() if staleEntry else {}
+        if self.batchFetcher and not validatorHeaders and not self.numDays:
+            return self.batchFetcher.cacheEntry(self.location, rangeDict, priority=priority)
+
+        url = self.weatherDotGovUrl()
+        fetchResponse = self.fetchUrl(url, headers=validatorHeaders, priority=priority)
+        logger.info('Forecast({}) @ {} -> {}: {}'.format(self.location, datetime.datetime.now(), url, fetchResponse))
+        return self.cacheEntryForFetchResponse(self.location, rangeDict, fetchResponse, staleEntry, self.numDays)
+
+
+    @classmethod
+    def fetchUrl(cls, url, headers=None, priority=RateLimiter.INTERACTIVE):
+        """
+        Fetches url with fetcher, within latencyBudgetSeconds and through circuitBreaker. Exceptions and 5xx
+        responses count as failures. If there's a rateLimiter then a token is taken first: INTERACTIVE requests wait
+        at most latencyBudgetSeconds for it, and BACKGROUND ones as long as it takes.
+
+        :param priority: RateLimiter.INTERACTIVE or RateLimiter.BACKGROUND
+        :return: a FetchResponse. raises CircuitOpenError without fetching if the breaker is open, and
+        RateLimitedError if no token was available in time
+        """
+        if cls.rateLimiter:
+            timeout = cls.latencyBudgetSeconds if priority == RateLimiter.INTERACTIVE else None
+            if not cls.rateLimiter.acquire(priority, timeout):
+                raise RateLimitedError("Too many requests to weather.gov right now. Please try again in a few minutes")
+
+        cls.circuitBreaker.beforeCall()
+        startTime = time.monotonic()
+        try:
+            fetchResponse = cls.fetcher.fetch(url, headers=headers, timeout=cls.latencyBudgetSeconds)
+        except Exception:
+            cls.circuitBreaker.recordCall(False, time.monotonic() - startTime)
+            raise
+
+        cls.circuitBreaker.recordCall(fetchResponse.status < 500, time.monotonic() - startTime)
+        return fetchResponse
+
+
+    @classmethod
+    def cacheEntryForFetchResponse(cls, location, rangeDict, fetchResponse, staleEntry, numDays=None):
+        """
+        Second half of fetchCacheEntry(), split out so that other fetch paths (e.g., AsyncForecastService) can share
+        it: parses fetchResponse (or reuses staleEntry's Hours on a 304) and saves the result in forecastCache.
+
+        :param fetchResponse: a FetchResponse for location's weatherDotGovUrlForLocation(location, numDays)
+        :param staleEntry: the CacheEntry whose validators were sent with the request, or None
+        :param numDays: the window that was requested, as passed to __init__()
+        :return: the new CacheEntry
+        """
+        etag = fetchResponse.headers.get('etag')
+        lastModified = fetchResponse.headers.get('last-modified')
+        if fetchResponse.status == 304 and staleEntry:
+            cacheEntry = CacheEntry(staleEntry.hours, staleEntry.creationDate, staleEntry.refreshSeconds,
+                                    etag=etag or staleEntry.etag, lastModified=lastModified or staleEntry.lastModified)
+            cls.saveCacheEntry(location, cacheEntry, numDays)
+            return cacheEntry
+
+        if fetchResponse.status >= 500:
+            raise UpstreamError("weather.gov returned HTTP status {} for {}".format(fetchResponse.status, location))
+
+        if fetchResponse.status != 200:
+            raise ValueError("weather.gov returned HTTP status {} for {}".format(fetchResponse.status, location))
+
+        dwmlDocument = DwmlDocument.fromBytes(fetchResponse.body)
+        try:
+            cacheEntry = cls.cacheEntryForDocument(location, rangeDict, dwmlDocument, etag, lastModified,
+                                                   numDays=numDays)
+        except ValueError as ex:
+            if dwmlDocument.errorString is not None:  # e.g., location is outside NDFD coverage. don't ask again soon
+                cls.negativeCache.put(location.key(), ex.args[0])
+            raise
+
+        if cls.dwmlStore and not numDays:
+            cls.dwmlStore.put(location.key(), fetchResponse.body, cacheEntry.fetchedAt)
+        return cacheEntry
+
+
+    @classmethod
+    def cacheEntryForElementTree(cls, location, rangeDict, elementTree, etag=None, lastModified=None, fetchedAt=None,
+                                 numDays=None):
+        """
+        cacheEntryForDocument() for an ElementTree.
+        """
+        return cls.cacheEntryForDocument(location, rangeDict, DwmlDocument.fromElement(elementTree.getroot()), etag,
+                                         lastModified, fetchedAt, numDays)
+
+
+    @classmethod
+    def cacheEntryForDocument(cls, location, rangeDict, dwmlDocument, etag=None, lastModified=None, fetchedAt=None,
+                              numDays=None):
+        """
+        Makes location's forecast from dwmlDocument and saves the result in forecastCache.
+
+        :param fetchedAt: time.time() when dwmlDocument was fetched. defaults to now
+        :param numDays: the window that was requested, as passed to __init__()
+        :return: the new CacheEntry
+        """
+        source = cls(location, rangeDict, numDays=numDays, dwmlDocument=dwmlDocument)
+        cacheEntry = CacheEntry(source.hours, source.creationDate, source.refreshSeconds, fetchedAt=fetchedAt,
+                                etag=etag, lastModified=lastModified)
+        cls.saveCacheEntry(location, cacheEntry, numDays)
+        return cacheEntry
+
+
+    @classmethod
+    def saveCacheEntry(cls, location, cacheEntry, numDays=None):
+        """
+        Puts cacheEntry in forecastCache, and in sharedCache if there is one.
+        """
+        key = cls.cacheKey(location, numDays)
+        cls.forecastCache.put(key, cacheEntry)
+        if cls.sharedCache:
+            cls.sharedCache.put(key, cacheEntry)
+
+
+    @classmethod
+    def cacheKey(cls, location, numDays=None):
         """
-        :return: a list of Hour instances for location
+        :return: the forecastCache and sharedCache key for location's forecast: Location.key() for the whole forecast,
+        and that plus numDays for a window of it, so that windows and whole forecasts don't replace each other
         """
-        if not elementTree:
-            httpResponse = urllib.request.urlopen(self.weatherDotGovUrl())
-            logger.info('Forecast({}) @ {} -> {}: '.format(
-                self.location, datetime.datetime.now(), self.weatherDotGovUrl()))
-            elementTree = ET.parse(httpResponse)
+        return location.key() + (numDays,) if numDays else location.key()
 
-        dwmlElement = elementTree.getroot()
-        if dwmlElement.tag == 'error':
-            errorString = ET.tostring(dwmlElement.find('pre'),
-                                      encoding='unicode')  # "xml", "html" or "text" (default xml)
+
+    @classmethod
+    def cacheEntryFromDwmlStore(cls, location, rangeDict):
+        """
+        Parses location's newest dwmlStore document, if any, and saves the result in forecastCache with the document's
+        original fetch time, so it expires when it would have had it never left memory.
+
+        :return: the new CacheEntry, or None if dwmlStore has nothing usable for location
+        """
+        fetchedAtAndBytes = cls.dwmlStore.latest(location.key())
+        if not fetchedAtAndBytes:
+            return None
+
+        fetchedAt, dwmlBytes = fetchedAtAndBytes
+        try:
+            return cls.cacheEntryForDocument(location, rangeDict, DwmlDocument.fromBytes(dwmlBytes),
+                                             fetchedAt=fetchedAt)
+        except Exception as ex:  # e.g., a truncated or otherwise bad file. fall back to weather.gov
+            logger.warning('could not use stored DWML for {}: {!r}'.format(location, ex))
+            return None
+
+
+    def hoursFromDocument(self, dwmlDocument, rangeDict):
+        """
+        :return: an HourSeries made from dwmlDocument, which is either a DWML document or an error document
+        """
+        errorString = dwmlDocument.errorString
+        if errorString is not None:
             logger.error(
                 "error getting data for zipOrLatLon {}\nurl: \t{}\nerror: {}".format(
                     self.location, self.weatherDotGovUrl(), errorString))
             raise ValueError(errorString)
 
-        hoursNoGaps = self.hoursWithNoGapsFromXml(dwmlElement, rangeDict)
-        
-        # normalize my Hours' timezones b/c weather service sometimes changes tz *within* one <time-layout> - go figure
-        # - and this causes problems: see testHoursAsCalendarRowsIndexOutOfBounds(). we normalize by:
-        # 1) adopting the first/closest Hour's TZ as the standard for the calendar, and
-        # 2) work forward through ea. Hour, adding one hour and saving that as a new Hour's new datetime
-        oneHour = datetime.timedelta(hours=1)
-        closestHour = hoursNoGaps[0]
-        normalizedHours = [closestHour]
-        for index, hour in enumerate(hoursNoGaps[1:]):
-            newHour = Hour(closestHour.datetime + (oneHour * (index + 1)), hour.precip, hour.temp, hour.wind,
-                           hour.clouds)
-            normalizedHours.append(newHour)
+        normalizedHours = HourSeries.fromHoursWithGaps(self.hoursWithGapsFromDocument(dwmlDocument, rangeDict))
+        return self.hoursInWindow(normalizedHours, self.numDays)
 
-        return normalizedHours
+
+    @classmethod
+    def hoursInWindow(cls, hours, numDays):
+        """
+        :param hours: an HourSeries or a list of Hours with no gaps
+        :param numDays: number of calendar days to keep, or None to keep all of them
+        :return: the Hours in the first numDays calendar days of hours, as reckoned in the first Hour's time zone.
+        weather.gov's window is in UTC, so a response for a window usually overruns into one more local day
+        """
+        if not numDays or not hours:
+            return hours
+
+        firstDatetime = hours[0].datetime
+        endDatetime = datetime.datetime.combine(firstDatetime.date() + datetime.timedelta(days=numDays),
+                                                datetime.time(), firstDatetime.tzinfo)
+        numHours = -((firstDatetime - endDatetime) // datetime.timedelta(hours=1))  # i.e., rounded up
+        return hours[:numHours]
 
 
     def weatherDotGovUrl(self):
-        url = 'http://graphical.weather.gov/xml/sample_products/browser_interface/ndfdXMLclient.php' \
+        return self.weatherDotGovUrlForLocation(self.location, self.numDays)
+
+
+    @classmethod
+    def timeWindowQuery(cls, numDays, now=None):
+        """
+        :param numDays: as passed to __init__()
+        :param now: aware datetime to start the window at. defaults to the current time. for testing
+        :return: NDFD begin and end query parameters that cover numDays calendar days starting today in any US time
+        zone. begin is 12 hours back so that the 12-hourly pop12 period that's in progress is included
+        """
+        now = (now or datetime.datetime.now(datetime.timezone.utc)).astimezone(datetime.timezone.utc)
+        now = now.replace(minute=0, second=0, microsecond=0, tzinfo=None)
+        begin = now - datetime.timedelta(hours=12)
+        end = now + datetime.timedelta(days=numDays)  # local midnight numDays from now is no later than this
+        return '&begin={}&end={}'.format(begin.isoformat(), end.isoformat())
+
+
+    @classmethod
+    def weatherDotGovUrlForLocation(cls, location, numDays=None):
+        """
+        :param numDays: as passed to __init__(). if passed then the URL asks for only that window
+        """
+        url = '{baseUrl}' \
               '?whichClient=NDFDgen' \
               '&lat={lat}' \
               '&lon={lon}' \
@@ -87,140 +490,247 @@ class WeatherGovSource(object):
               '&appt=appt' \
               '&wspd=wspd' \
               '&sky=sky' \
-              '&Submit=Submit'.format(lat=self.location.latitude, lon=self.location.longitude)
+              '&Submit=Submit'.format(baseUrl=cls.baseUrl, lat=location.latitude, lon=location.longitude)
+        if numDays:
+            url += cls.timeWindowQuery(numDays)
         return url
 
 
-    # ==== hoursWithNoGapsFromXml() and friends ====
+    @classmethod
+    def weatherDotGovUrlForLocations(cls, locations):
+        """
+        :return: a multi-point NDFD URL for locations. the response has one <parameters> element per location, in
+        order, whose applicable-location is 'point1', 'point2', etc. see elementTreesForPoints()
+        """
+        listLatLon = '+'.join('{},{}'.format(location.latitude, location.longitude) for location in locations)
+        url = '{baseUrl}' \
+              '?whichClient=NDFDgenLatLonList' \
+              '&listLatLon={listLatLon}' \
+              '&product=time-series' \
+              '&Unit=e' \
+              '&pop12=pop12' \
+              '&appt=appt' \
+              '&wspd=wspd' \
+              '&sky=sky' \
+              '&Submit=Submit'.format(baseUrl=cls.baseUrl, listLatLon=listLatLon)
+        return url
+
 
     @classmethod
-    def hoursWithNoGapsFromXml(cls, dwmlElement, rangeDict):
+    def elementTreesForPoints(cls, dwmlElement):
         """
-        Takes the output from hoursWithGapsFromXml() and interpolates missing hoursWithGaps to create a finished list
-        of Hours that starts at the first hour in hoursWithGapsFromXml() and finishes with the last.
+        Splits a multi-point DWML document into single-point ones that the rest of this class can parse.
 
-        :return: a list of Hours starting with the earliest hour in hoursWithGaps and ending with the last,
-        where all even hoursWithGaps are represented 
+        :param dwmlElement: root of a DWML document with one or more <parameters applicable-location="..."> elements
+        :return: dict: {<location-key> -> ElementTree}, e.g., {'point1': ..., 'point2': ...}. each tree has the
+        original <head>, the point's <location>, the <time-layout>s its parameters refer to, and its <parameters>
+        """
+        headElement = dwmlElement.find('head')
+        dataElement = dwmlElement.find('data')
+        timeLayoutEles = {timeLayoutEle.find('layout-key').text: timeLayoutEle
+                          for timeLayoutEle in dataElement.findall('time-layout')}
+        locationEles = {locationEle.find('location-key').text: locationEle
+                        for locationEle in dataElement.findall('location')}
+        pointElementTrees = {}
+        for parametersEle in dataElement.findall('parameters'):
+            pointKey = parametersEle.attrib.get('applicable-location')
+            pointDwmlEle = ET.Element(dwmlElement.tag, dwmlElement.attrib)
+            if headElement is not None:
+                pointDwmlEle.append(headElement)
+            pointDataEle = ET.SubElement(pointDwmlEle, 'data')
+            if pointKey in locationEles:
+                pointDataEle.append(locationEles[pointKey])
+            layoutKeys = []
+            for paramEle in parametersEle:
+                layoutKey = paramEle.attrib.get('time-layout')
+                if layoutKey in timeLayoutEles and layoutKey not in layoutKeys:
+                    layoutKeys.append(layoutKey)
+            for layoutKey in layoutKeys:
+                pointDataEle.append(timeLayoutEles[layoutKey])
+            pointDataEle.append(parametersEle)
+            pointElementTrees[pointKey] = ET.ElementTree(pointDwmlEle)
+        return pointElementTrees
+
+
+    # ==== creation date ====
+
+    @classmethod
+    def creationDateFromXml(cls, dwmlElement):
+        """
+        creationDateFromDocument() for a DWML element.
         """
-        oneHour = datetime.timedelta(hours=1)
-        hoursWithGaps = WeatherGovSource.hoursWithGapsFromXml(dwmlElement, rangeDict)
-        oldestHour = hoursWithGaps[0]
-        newestHour = hoursWithGaps[-1]
+        return cls.creationDateFromDocument(DwmlDocument.fromElement(dwmlElement))
 
-        hoursWithNoGaps = []
-        currDatetime = oldestHour.datetime
-        prevFoundHour = oldestHour
-        while currDatetime <= newestHour.datetime:
-            foundHour = WeatherGovSource.findHourForDatetimeFromHoursWithGaps(currDatetime, hoursWithGaps)
-            if not foundHour:
-                foundHour = Hour(currDatetime, prevFoundHour.precip, prevFoundHour.temp, prevFoundHour.wind,
-                                 prevFoundHour.clouds)
-            hoursWithNoGaps.append(foundHour)
-            prevFoundHour = foundHour
-            currDatetime += oneHour
-        return hoursWithNoGaps
 
+    @classmethod
+    def creationDateFromDocument(cls, dwmlDocument):
+        """
+        :param dwmlDocument:
+        :return: 2-tuple: (creationDate, refreshSeconds) from the <creation-date> element, e.g.,
+        <creation-date refresh-frequency="PT1H">2015-01-13T23:44:00Z</creation-date> . either can be None if missing
+        """
+        if not dwmlDocument.creationDateText:
+            return None, None
 
-    def findHourForDatetime(self, theDatetime):
-        for hour in self.hours:
-            if hour.datetime == theDatetime:
-                return hour
-        return None
+        creationDate = datetime.datetime.strptime(dwmlDocument.creationDateText, '%Y-%m-%dT%H:%M:%SZ') \
+            .replace(tzinfo=datetime.timezone.utc)
+        refreshSeconds = cls.parseRefreshFrequency(dwmlDocument.refreshFrequencyText)
+        return creationDate, refreshSeconds
 
 
     @classmethod
-    def findHourForDatetimeFromHoursWithGaps(cls, theDatetime, hoursWithGaps):
-        for hour in hoursWithGaps:
-            if hour.datetime == theDatetime:
-                return hour
-        return None
+    def parseRefreshFrequency(cls, refreshFrequencyText):
+        """
+        :param refreshFrequencyText: an ISO 8601 duration limited to hours, minutes, and seconds, e.g., 'PT1H'
+        :return: the duration in seconds, or None if refreshFrequencyText is None or not in that format
+        """
+        match = re.match(r'^PT(?:(\d+)H)?(?:(\d+)M)?(?:(\d+)S)?$', refreshFrequencyText or '')
+        if not match or not any(match.groups()):
+            return None
+
+        hours, minutes, seconds = [int(group) if group else 0 for group in match.groups()]
+        return (hours * 60 * 60) + (minutes * 60) + seconds
+
+
+    # ==== hoursWithNoGapsFromDocument() and friends. the *FromXml() versions take a DWML element instead ====
+
+    @classmethod
+    def hoursWithNoGapsFromXml(cls, dwmlElement, rangeDict):
+        return cls.hoursWithNoGapsFromDocument(DwmlDocument.fromElement(dwmlElement), rangeDict)
+
+
+    @classmethod
+    def hoursWithNoGapsFromDocument(cls, dwmlDocument, rangeDict):
+        """
+        Takes the output from hoursWithGapsFromDocument() and interpolates missing hoursWithGaps to create a finished
+        list of Hours that starts at the first hour in hoursWithGapsFromDocument() and finishes with the last.
+
+        :return: a list of Hours starting with the earliest hour in hoursWithGaps and ending with the last,
+        where all even hoursWithGaps are represented, in the earliest hour's time zone. see
+        HourSeries.fromHoursWithGaps(), which hoursFromDocument() uses directly to avoid making these Hours
+        """
+        return list(HourSeries.fromHoursWithGaps(WeatherGovSource.hoursWithGapsFromDocument(dwmlDocument, rangeDict)))
 
 
     @classmethod
     def hoursWithGapsFromXml(cls, dwmlElement, rangeDict):
+        return cls.hoursWithGapsFromDocument(DwmlDocument.fromElement(dwmlElement), rangeDict)
+
+
+    @classmethod
+    def hoursWithGapsFromDocument(cls, dwmlDocument, rangeDict):
         """
-        :param dwmlElement:
+        :param dwmlDocument:
         :return: a sequence of Hour instances corresponding to the passed DWML document element. 
         Note that this list will have gaps between hours because the incoming data itself has gaps, i.e., 
         it's not sampled every hour but (for example) every three or 12 hours. Gaps must be accounted for by callers. 
         Because the forecast data's samples are not the same for all parameters, we need to interpolate missing 
         values by using the most recently seen ones. 
         """
-        # 1) build empty Hours with no data based on min and max dates in layoutKeysToStartValidTimes
-        timeLayoutDict = cls.timeLayoutDictFromXml(dwmlElement)
-        uniqueDatetimes = set(functools.reduce(operator.add, timeLayoutDict.values()))
-        hours = list(map(lambda dt: Hour(dt), sorted(uniqueDatetimes)))
-
-        # 2) iterate over weather data and plug into corresponding hour. NB: will leave gaps, i.e., some Hours will not
-        # have all three values set
-        paramSamplesDict = cls.parameterSamplesDictFromXml(dwmlElement)
+        # 1) build empty value lists (precip, temp, wind, clouds) based on min and max dates in
+        # layoutKeysToStartValidTimes. NB: Hours are immutable, so we make them once the values are known
+        timeLayoutDict = cls.timeLayoutDictFromDocument(dwmlDocument)
+        uniqueDatetimes = sorted(set(itertools.chain.from_iterable(timeLayoutDict.values())))
+        valuesForDatetime = {dt: [None, None, None, None] for dt in uniqueDatetimes}
+
+        # 2) iterate over weather data and plug into corresponding values. NB: will leave gaps, i.e., some values lists
+        # will not have all three values set
+        paramSamplesDict = cls.parameterSamplesDict(dwmlDocument.parameterDict() or {}, timeLayoutDict)
         for pName, pVals in paramSamplesDict.items():
+            attributeName = WeatherGovSource.PARAM_NAME_TO_HOUR_ATTRIBUTE.get(pName)
             for pVal, pDt in pVals:
-                for hour in hours:
-                    if hour.datetime == pDt:
-                        if pName == 'probability-of-precipitation':
-                            hour.precip = pVal
-                        elif pName == 'temperature':
-                            hour.temp = pVal
-                        elif pName == 'wind-speed':
-                            hour.wind = pVal
-                        elif pName == 'cloud-amount':
-                            hour.clouds = pVal
-                        else:
-                            raise ValueError('invalid parameter name: {} for value {}'.format(pName, pVal))
+                values = valuesForDatetime.get(pDt)
+                if values is None:
+                    continue
+
+                if not attributeName:
+                    raise ValueError('invalid parameter name: {} for value {}'.format(pName, pVal))
+
+                values[Hour.VALUE_ATTRIBUTES.index(attributeName)] = pVal
 
         # 3) fill in missing data by projecting forward the most recently set value. note that the first item will
         # likely have missing values because there are no older items to project from
+        hours = []
         lastPTWC = (None, None, None, None)
-        for hour in hours:
-            precipTempWind = hour.precip, hour.temp, hour.wind, hour.clouds
+        for dt in uniqueDatetimes:
+            precipTempWind = valuesForDatetime[dt]
             lastPTWC = (precipTempWind[0] if precipTempWind[0] is not None else lastPTWC[0],
                         precipTempWind[1] if precipTempWind[1] is not None else lastPTWC[1],
                         precipTempWind[2] if precipTempWind[2] is not None else lastPTWC[2],
                         precipTempWind[3] if precipTempWind[3] is not None else lastPTWC[3],)
-            hour.precip, hour.temp, hour.wind, hour.clouds = lastPTWC
 
-        # 4) remove Hours that still have missing values
-        # hours = [hour for hour in hours if all((hour.precip, hour.temp, hour.wind))]
-        hours = [hour for hour in hours if hour.precip is not None and hour.temp is not None and hour.wind is not None]
+            # 4) skip Hours that still have missing values
+            if lastPTWC[0] is not None and lastPTWC[1] is not None and lastPTWC[2] is not None:
+                hours.append(Hour(dt, *lastPTWC))
         return hours
 
 
     @classmethod
     def timeLayoutDictFromXml(cls, dwmlElement):
+        return cls.timeLayoutDictFromDocument(DwmlDocument.fromElement(dwmlElement))
+
+
+    @classmethod
+    def timeLayoutDictFromDocument(cls, dwmlDocument):
         """
-        :param dwmlElement:
+        :param dwmlDocument:
         :return: dict: {<layout-key> -> [<start-valid-time> datetime instances]}
         """
-        timeLayoutDict = {}
-        for timeLayoutEle in dwmlElement.findall('data/time-layout'):
-            layoutKey = timeLayoutEle.find('layout-key')
-            startValidTimes = []
-            for startValidTimeEle in timeLayoutEle.findall('start-valid-time'):
-                dt = WeatherGovSource.parseStartValidTime(startValidTimeEle.text)
-                startValidTimes.append(dt)
-            timeLayoutDict[layoutKey.text] = startValidTimes
-        return timeLayoutDict
+        return {layoutKey: [WeatherGovSource.parseStartValidTime(startValidTimeText)
+                            for startValidTimeText in startValidTimeTexts]
+                for layoutKey, startValidTimeTexts in dwmlDocument.timeLayoutDict.items()}
+
+
+    @staticmethod
+    @functools.lru_cache(maxsize=PARSED_TIMES_MAX)
+    def parseStartValidTime(startValidTimeText):
+        """
+        :param startValidTimeText: e.g., '2015-01-13T07:00:00-05:00', from <start-valid-time>
+        :return: an aware datetime. memoized, since the same times recur in a document's layouts and in every location's
+            document. its tzinfo is shared by all datetimes with the same UTC offset (see tzinfoForOffsetText())
+        """
+        if len(startValidTimeText) == 25 and startValidTimeText[19] in '+-':  # the fixed format DWML uses
+            return datetime.datetime.fromisoformat(startValidTimeText[:19]) \
+                .replace(tzinfo=WeatherGovSource.tzinfoForOffsetText(startValidTimeText[19:]))
+
+        dt = datetime.datetime.fromisoformat(startValidTimeText)  # e.g., a 'Z' suffix. slower, but still interned
+        if dt.tzinfo is None:
+            raise ValueError("start-valid-time has no UTC offset: {!r}".format(startValidTimeText))
+
+        offsetMinutes = int(dt.utcoffset().total_seconds()) // 60
+        return dt.replace(tzinfo=WeatherGovSource.tzinfoForOffsetText('{}{:02}:{:02}'.format(
+            '-' if offsetMinutes < 0 else '+', abs(offsetMinutes) // 60, abs(offsetMinutes) % 60)))
 
 
     @classmethod
-    def parseStartValidTime(cls, startValidTimeText):
-        # e.g., <start-valid-time>2015-01-13T07:00:00-05:00</start-valid-time>. NB: that format is ISO 8601
-        # EXCEPT for the ':' in the final time zone section (e.g., '-05:00'), so we remove it before parsing
-        startValidTimeText = startValidTimeText[:-3] + startValidTimeText[-2:]
-        dt = datetime.datetime.strptime(startValidTimeText, '%Y-%m-%dT%H:%M:%S%z')
-        return dt
+    def tzinfoForOffsetText(cls, offsetText):
+        """
+        :param offsetText: a UTC offset like '-05:00'
+        :return: the one datetime.timezone for offsetText, so that a forecast's hours share a few tzinfos instead of
+            each having its own, which saves memory and makes pickled forecasts (e.g., in sharedCache) smaller
+        """
+        tzinfo = cls.TZINFO_FOR_OFFSET_TEXT.get(offsetText)
+        if tzinfo is None:
+            sign = -1 if offsetText[0] == '-' else 1
+            offset = datetime.timedelta(hours=int(offsetText[1:3]), minutes=int(offsetText[4:6]))
+            tzinfo = cls.TZINFO_FOR_OFFSET_TEXT.setdefault(offsetText, datetime.timezone(sign * offset))
+        return tzinfo
 
 
     @classmethod
     def parameterSamplesDictFromXml(cls, dwmlElement):
+        dwmlDocument = DwmlDocument.fromElement(dwmlElement)
+        return cls.parameterSamplesDict(dwmlDocument.parameterDict(), cls.timeLayoutDictFromDocument(dwmlDocument))
+
+
+    @classmethod
+    def parameterSamplesDict(cls, paramDict, timeLayoutDict):
         """
-        :param dwmlElement:
+        :param paramDict: as returned by parameterDictFromXml()
+        :param timeLayoutDict: as returned by timeLayoutDictFromDocument()
         :return: dict: {<paramName> -> [(paramVal, paramDatetime)]}
         """
         parameterSamplesDict = {}
-        paramDict = cls.parameterDictFromXml(dwmlElement)
-        timeLayoutDict = cls.timeLayoutDictFromXml(dwmlElement)
         for paramName, (timeLayoutKey, paramVals) in paramDict.items():
             timeLayoutDatetimes = timeLayoutDict[timeLayoutKey]
             paramSamples = list(zip(paramVals, timeLayoutDatetimes))
@@ -232,13 +742,8 @@ class WeatherGovSource(object):
     def parameterDictFromXml(cls, dwmlElement):
         """
         :param dwmlElement:
-        :return: dict: {<name> -> (<time-layout>, [int values])}
-        """
-        paramDict = {}
-        for paramEle in dwmlElement.find('data/parameters'):
-            paramVals = list(map(lambda val: int(val.text), paramEle.findall('value')))
-            timeLayout = paramEle.attrib['time-layout']
-            paramDict[paramEle.tag] = (timeLayout, paramVals)
-        return paramDict
+        :return: dict: {<name> -> (<time-layout>, [int values])} for the first point. see DwmlDocument.parameterDict()
+        """
+        return DwmlDocument.fromElement(dwmlElement).parameterDict()
 
 
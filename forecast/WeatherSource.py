@@ -0,0 +1,59 @@
+import abc
+import datetime
+
+from forecast.Location import Location
+
+
+class WeatherSource(abc.ABC):
+    """
+    Abstract class that represents an online weather source that provides forecast information for a particular
+    Location. Stored as a sequence of Hour instances. These have no gaps, i.e., there is one Hour for every hour,
+    and all time zone information is normalized. Forecast uses only what's defined here, so any subclass can back it.
+
+    Subclasses must call __init__() and then set hours, usually via makeHours().
+    """
+
+
+    def __repr__(self):
+        return '{cls}({location})'.format(
+            cls=self.__class__.__name__, location=self.location.__repr__())
+
+
+    def __init__(self, location):
+        """
+        :param location: a Location
+        """
+        if not isinstance(location, Location):
+            raise ValueError("location is not a Location instance: {}".format(location))
+
+        self.location = location
+        self.hours = []  # the rest are set by makeHours()
+        self.creationDate = None  # aware datetime when the source generated its forecast, or None if not known
+        self.refreshSeconds = None  # how often the source generates forecasts, or None if not known
+        self.fetchedAt = None  # time.time() when the forecast was fetched
+        self.isStale = False  # True if the forecast is older than the source says it should be used for
+
+
+    @abc.abstractmethod
+    def makeHours(self, *args, **kwargs):
+        """
+        :return: a list of Hour instances for my location, with no gaps and normalized timezones. also sets
+        creationDate, refreshSeconds, fetchedAt, and isStale
+        """
+        pass
+
+
+    def findHourForDatetime(self, theDatetime):
+        """
+        :return: the Hour for theDatetime, or None if there isn't one. since hours has no gaps, that's the one
+            theDatetime's offset from the first Hour says, without searching
+        """
+        if not self.hours:
+            return None
+
+        offsetHours, remainder = divmod(theDatetime - self.hours[0].datetime, datetime.timedelta(hours=1))
+        if remainder or not 0 <= offsetHours < len(self.hours):
+            return None
+
+        hour = self.hours[offsetHours]
+        return hour if hour.datetime == theDatetime else None
@@ -0,0 +1,122 @@
+import abc
+import xml.etree.ElementTree as ET
+
+try:
+    import lxml.etree
+except ImportError:  # optional. without it DWML is parsed by the stdlib
+    lxml = None
+
+
+class XmlParserBackend(abc.ABC):
+    """
+    Abstract class for the XML calls that DwmlDocument's streaming parse needs, so that it can use whichever parser is
+    fastest here: LxmlParserBackend if lxml is installed, else StdlibParserBackend. Both give the same elements' tags,
+    attributes, and text, so a DwmlDocument doesn't depend on which one read it.
+    """
+
+    NAME = None
+
+
+    def __repr__(self):
+        return '{cls}()'.format(cls=self.__class__.__name__)
+
+
+    @classmethod
+    def backends(cls):
+        """
+        :return: dict: {<NAME> -> backend instance} for the backends whose parsers are installed
+        """
+        return {backendClass.NAME: backendClass() for backendClass in (LxmlParserBackend, StdlibParserBackend)
+                if backendClass.isInstalled()}
+
+
+    @classmethod
+    def forName(cls, name):
+        """
+        :param name: a NAME, e.g., 'lxml', or None for the default: the fastest installed backend
+        :return: a backend instance. raises ValueError if name is unknown or its parser isn't installed
+        """
+        backends = cls.backends()
+        if name is None:
+            return next(iter(backends.values()))
+
+        if name not in backends:
+            raise ValueError("XML parser backend {!r} isn't one of the installed ones: {}".format(name, list(backends)))
+
+        return backends[name]
+
+
+    @classmethod
+    def isInstalled(cls):
+        return True
+
+
+    @abc.abstractmethod
+    def iterparse(self, xmlFile, tags):
+        """
+        :param xmlFile: a binary file object or file name
+        :param tags: the tags the caller wants. others may be returned too, but needn't be
+        :return: an iterator of (event, element) 2-tuples with 'end' events only, i.e., each element once it's complete
+        """
+        pass
+
+
+    @abc.abstractmethod
+    def tostring(self, element):
+        """
+        :return: element (and its tail) serialized as a str
+        """
+        pass
+
+
+    def release(self, element):
+        """
+        Frees element's children and text once the caller is done with it.
+        """
+        element.clear()
+
+
+class StdlibParserBackend(XmlParserBackend):
+    """
+    xml.etree.ElementTree, which is always available.
+    """
+
+    NAME = 'stdlib'
+
+
+    def iterparse(self, xmlFile, tags):
+        return ET.iterparse(xmlFile)  # NB: ignores tags. filtering in C isn't an option
+
+
+    def tostring(self, element):
+        return ET.tostring(element, encoding='unicode')
+
+
+class LxmlParserBackend(XmlParserBackend):
+    """
+    lxml, whose C parser is faster, if it's installed. entities aren't resolved, and nothing is fetched from the
+    network.
+    """
+
+    NAME = 'lxml'
+
+
+    @classmethod
+    def isInstalled(cls):
+        return lxml is not None
+
+
+    def iterparse(self, xmlFile, tags):
+        # NB: tag filtering happens in C, so the caller never sees the many <value> and <start-valid-time> elements
+        return lxml.etree.iterparse(xmlFile, tag=tags, resolve_entities=False, no_network=True)
+
+
+    def tostring(self, element):
+        return lxml.etree.tostring(element, encoding='unicode')
+
+
+    def release(self, element):
+        # cleared elements keep their place in the tree, so also remove the earlier siblings, as lxml's docs suggest
+        element.clear()
+        while element.getprevious() is not None:
+            del element.getparent()[0]
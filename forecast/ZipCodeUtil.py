@@ -21,10 +21,12 @@ def latLonNameForZipcode(zipcode):
     :param zipcode:
     :return: looks up and returns information for zipcode as a 3-tuple of the form: (latitude, longitude, name)
     """
-    for (csv_zipcode, city, state, latitude, longitude) in CACHED_ZIP_INFO_TUPLES:
-        if csv_zipcode == zipcode:
-            return latitude, longitude, city + ", " + state
-    raise ValueError("couldn't find zipcode: {}".format(zipcode))
+    zipInfoTuple = CACHED_ZIP_INFO_DICT.get(zipcode)
+    if not zipInfoTuple:
+        raise ValueError("couldn't find zipcode: {}".format(zipcode))
+
+    (csv_zipcode, city, state, latitude, longitude) = zipInfoTuple
+    return latitude, longitude, city + ", " + state
 
 
 def searchZipcodes(query):
@@ -43,3 +45,5 @@ def searchZipcodes(query):
 
 CACHED_ZIP_INFO_TUPLES = makeZipInfoTuples()
 
+# zipcode -> zip info tuple, so that latLonNameForZipcode() - and rejecting unknown zipcodes - doesn't scan every row
+CACHED_ZIP_INFO_DICT = {zipInfoTuple[0]: zipInfoTuple for zipInfoTuple in CACHED_ZIP_INFO_TUPLES}
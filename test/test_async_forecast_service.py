@@ -0,0 +1,117 @@
+import asyncio
+import gzip
+import http.server
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from forecast.AsyncForecastService import AsyncForecastService, EventLoopThread
+from forecast.Forecast import Forecast
+from forecast.ForecastCache import ForecastCache
+from forecast.HttpFetcher import AsyncHttpFetcher
+from forecast.Location import Location
+from forecast.WeatherGovSource import WeatherGovSource
+
+
+class _DwmlHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+    requestCount = 0
+
+
+    def do_GET(self):
+        _DwmlHandler.requestCount += 1
+        time.sleep(0.2)  # give concurrent requests time to pile up
+        with open('test/test-forecast-data.xml', 'rb') as xmlFile:
+            body = gzip.compress(xmlFile.read())
+        self.send_response(200)
+        self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        for start in range(0, len(body), 1000):
+            chunk = body[start:start + 1000]
+            self.wfile.write('{:x}\r\n'.format(len(chunk)).encode() + chunk + b'\r\n')
+        self.wfile.write(b'0\r\n\r\n')
+
+
+    def log_message(self, format, *args):
+        pass
+
+
+class AsyncForecastServiceTestCase(unittest.TestCase):
+    """
+    """
+
+
+    def setUp(self):
+        _DwmlHandler.requestCount = 0
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _DwmlHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        url = 'http://127.0.0.1:{}/xml'.format(self.server.server_address[1])
+        self.patchers = [patch.object(WeatherGovSource, 'forecastCache', ForecastCache()),
+                         patch.object(WeatherGovSource, 'weatherDotGovUrlForLocation',
+                                      classmethod(lambda cls, location, numDays=None: url))]
+        for patcher in self.patchers:
+            patcher.start()
+
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        self.server.shutdown()
+        self.server.server_close()
+
+
+    def testConcurrentForecastsShareOneFetch(self):
+        service = AsyncForecastService(fetcher=AsyncHttpFetcher())
+
+
+        async def makeForecasts():
+            return await asyncio.gather(*[service.forecast(Location('01002')) for _ in range(20)])
+
+
+        forecasts = asyncio.run(makeForecasts())
+        self.assertEqual(1, _DwmlHandler.requestCount)
+        self.assertEqual(20, len(forecasts))
+        self.assertEqual(1, len({id(forecast.source.hours) for forecast in forecasts}))
+        self.assertEqual(['T', 'W', 'T', 'F', 'S', 'S', 'M', 'T'], forecasts[0].calendarHeaderRow())
+        self.assertLess(service.fetcher.stats.wireBytes, service.fetcher.stats.bodyBytes)  # gzipped
+
+
+    def testLastGoodForecastWithoutRefetching(self):
+        now = [time.time()]
+        forecastCache = ForecastCache(staleSeconds=0, clock=lambda: now[0])
+        service = AsyncForecastService(fetcher=AsyncHttpFetcher())
+        with patch.object(WeatherGovSource, 'forecastCache', forecastCache):
+            asyncio.run(service.forecast(Location('01002')))  # caches it
+            now[0] += 2 * forecastCache.ttlSeconds  # expired and not servable, so it's only a last good forecast
+
+
+            async def failingFetch(url, headers=None, timeout=None):
+                raise OSError("weather.gov is down")
+
+
+            service.fetcher.fetch = failingFetch
+            with patch.object(WeatherGovSource, 'fetchCacheEntry', side_effect=AssertionError("sync fetch")):
+                forecast = asyncio.run(service.forecast(Location('01002')))
+        self.assertTrue(forecast.source.isStale)
+        self.assertEqual(1, _DwmlHandler.requestCount)
+
+
+    def testBadNumDays(self):
+        service = AsyncForecastService(fetcher=AsyncHttpFetcher())
+        for numDays in [0, Forecast.NUM_DAYS_MAX + 1, '2']:
+            with self.assertRaisesRegex(ValueError, "numDays was not an int"):
+                asyncio.run(service.forecast(Location('01002'), numDays=numDays))
+        self.assertEqual(0, _DwmlHandler.requestCount)
+
+
+    def testEventLoopThread(self):
+        eventLoopThread = EventLoopThread()
+        service = AsyncForecastService()
+        forecast = eventLoopThread.run(service.forecast(Location('01002')), timeout=10)
+        self.assertEqual(Location('01002').key(), forecast.location.key())
+
+        with self.assertRaisesRegex(ValueError, "location is not a Location instance"):
+            eventLoopThread.run(service.forecast(None), timeout=10)
+        eventLoopThread.stop()
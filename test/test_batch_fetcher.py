@@ -0,0 +1,129 @@
+import threading
+import unittest
+import xml.etree.ElementTree as ET
+from unittest.mock import patch, Mock
+
+from forecast.BatchFetcher import BatchFetcher
+from forecast.Forecast import Forecast
+from forecast.ForecastCache import ForecastCache
+from forecast.HttpFetcher import FetchResponse
+from forecast.Location import Location
+from forecast.NegativeCache import NegativeCache
+from forecast.WeatherGovSource import WeatherGovSource
+
+
+class BatchFetcherTestCase(unittest.TestCase):
+    """
+    """
+
+
+    def setUp(self):
+        self.patchers = [patch.object(WeatherGovSource, 'forecastCache', ForecastCache()),
+                         patch.object(WeatherGovSource, 'negativeCache', NegativeCache())]
+        for patcher in self.patchers:
+            patcher.start()
+
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+
+
+    def mockFetcherForFile(self, xmlFileName):
+        with open(xmlFileName, 'rb') as xmlFile:
+            body = xmlFile.read()
+        mockFetcher = Mock()
+        mockFetcher.fetch.side_effect = lambda url, **kwargs: FetchResponse(url, 200, {}, body, 0.1)
+        return mockFetcher
+
+
+    def testElementTreesForPoints(self):
+        dwmlElement = ET.parse('test/test-forecast-data-multi-point.xml').getroot()
+        pointElementTrees = WeatherGovSource.elementTreesForPoints(dwmlElement)
+        self.assertEqual(['point1', 'point2'], sorted(pointElementTrees.keys()))
+
+        # each point's hours are the same as parsing its original single-point document
+        for pointKey, xmlFileName in [('point1', 'test/test-forecast-data.xml'),
+                                      ('point2', 'test/test-forecast-data-sky-cover.xml')]:
+            location = Location('01002')
+            expSource = WeatherGovSource(location, Forecast.PARAM_RANGE_STEPS_DEFAULT,
+                                         elementTree=ET.parse(xmlFileName))
+            actSource = WeatherGovSource(location, Forecast.PARAM_RANGE_STEPS_DEFAULT,
+                                         elementTree=pointElementTrees[pointKey])
+            self.assertEqual(expSource.hours, actSource.hours)
+            self.assertEqual([hour.clouds for hour in expSource.hours], [hour.clouds for hour in actSource.hours])
+
+
+    def testConcurrentLocationsShareOneRequest(self):
+        mockFetcher = self.mockFetcherForFile('test/test-forecast-data-multi-point.xml')
+        batchFetcher = BatchFetcher(windowSeconds=0.2)
+        locations = [Location('01002'), Location(['41.88', '-87.63'])]
+        results = {}
+
+
+        def fetchLocation(location):
+            results[location.key()] = batchFetcher.cacheEntry(location)
+
+
+        with patch.object(WeatherGovSource, 'fetcher', mockFetcher):
+            threads = [threading.Thread(target=fetchLocation, args=(location,)) for location in locations]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+
+        self.assertEqual(1, mockFetcher.fetch.call_count)
+        self.assertIn('listLatLon=42.377651,-72.50323+41.88,-87.63', mockFetcher.fetch.call_args[0][0])
+        self.assertEqual(1, batchFetcher.batchCount)
+        for location in locations:
+            self.assertIs(results[location.key()], WeatherGovSource.forecastCache.get(location.key()))
+
+
+    def testMaxBatchSizeAndMissingPoint(self):
+        mockFetcher = self.mockFetcherForFile('test/test-forecast-data-multi-point.xml')
+        batchFetcher = BatchFetcher(windowSeconds=60, maxBatchSize=3)
+        locations = [Location('01002'), Location(['41.88', '-87.63']), Location(['1.0', '2.0'])]
+        with patch.object(WeatherGovSource, 'fetcher', mockFetcher):
+            results = batchFetcher.cacheEntries(locations)  # sent when full rather than after the 60s window
+        self.assertEqual(1, batchFetcher.batchCount)
+        self.assertIsInstance(results[('1.0', '2.0')], ValueError)
+        self.assertEqual(2, len(WeatherGovSource.forecastCache))
+
+
+    def testErrorResponse(self):
+        mockFetcher = self.mockFetcherForFile('test/test-forecast-error-response.xml')
+        batchFetcher = BatchFetcher(windowSeconds=0)
+        with patch.object(WeatherGovSource, 'fetcher', mockFetcher):
+            with self.assertRaisesRegex(ValueError, "No data were found"):
+                batchFetcher.cacheEntry(Location('01002'))
+
+
+    def testBadPointDoesNotFailTheBatch(self):
+        # NDFD fails any request that includes the bad location, so the batch is split until it's alone
+        with open('test/test-forecast-error-response.xml', 'rb') as xmlFile:
+            errorBody = xmlFile.read()
+        with open('test/test-forecast-data.xml', 'rb') as xmlFile:
+            goodBody = xmlFile.read()
+        badLocation = Location(['1.0', '2.0'])
+        mockFetcher = Mock()
+        mockFetcher.fetch.side_effect = lambda url, **kwargs: FetchResponse(
+            url, 200, {}, errorBody if '1.0,2.0' in url else goodBody, 0.1)
+        negativeCache = WeatherGovSource.negativeCache
+        batchFetcher = BatchFetcher(windowSeconds=60, maxBatchSize=2)
+        with patch.object(WeatherGovSource, 'fetcher', mockFetcher):
+            results = batchFetcher.cacheEntries([Location('01002'), badLocation])
+        self.assertEqual(3, mockFetcher.fetch.call_count)  # the batch, then each half
+        self.assertTrue(results[Location('01002').key()].hours)
+        self.assertIsInstance(results[badLocation.key()], ValueError)
+        self.assertIn("No data were found", results[badLocation.key()].args[0])
+        self.assertIsNotNone(negativeCache.get(badLocation.key()))
+        self.assertIsNone(negativeCache.get(Location('01002').key()))
+
+
+    def testWeatherGovSourceUsesBatchFetcher(self):
+        mockFetcher = self.mockFetcherForFile('test/test-forecast-data-multi-point.xml')
+        with patch.object(WeatherGovSource, 'fetcher', mockFetcher), \
+             patch.object(WeatherGovSource, 'batchFetcher', BatchFetcher(windowSeconds=0)):
+            wgSource = WeatherGovSource(Location('01002'), Forecast.PARAM_RANGE_STEPS_DEFAULT)
+        self.assertIn('whichClient=NDFDgenLatLonList', mockFetcher.fetch.call_args[0][0])
+        self.assertEqual(wgSource.hours, WeatherGovSource.forecastCache.get(Location('01002').key()).hours)
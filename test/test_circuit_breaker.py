@@ -0,0 +1,145 @@
+import http.server
+import socket
+import threading
+import time
+import unittest
+from unittest.mock import patch, Mock
+
+from forecast.CircuitBreaker import CircuitBreaker, CircuitOpenError
+from forecast.ForecastCache import ForecastCache
+from forecast.HttpFetcher import FetchResponse, HttpFetcher
+from forecast.Location import Location
+from forecast.UpstreamError import UpstreamError
+from forecast.WeatherGovSource import WeatherGovSource
+
+
+class _TricklingHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'
+
+
+    def do_GET(self):
+        self.send_response(200)
+        self.send_header('Content-Length', '100')
+        self.end_headers()
+        try:
+            for _ in range(100):  # each byte arrives well within a read timeout, but the whole body takes 5 seconds
+                self.wfile.write(b'x')
+                self.wfile.flush()
+                time.sleep(0.05)
+        except OSError:
+            pass
+
+
+    def log_message(self, format, *args):
+        pass
+
+
+class CircuitBreakerTestCase(unittest.TestCase):
+    """
+    """
+
+
+    def setUp(self):
+        self.now = 1000.0
+
+
+    def makeBreaker(self, **kwargs):
+        return CircuitBreaker(windowSize=10, minCalls=4, failureRateThreshold=0.5, slowCallSeconds=2, openSeconds=30,
+                              clock=lambda: self.now, **kwargs)
+
+
+    def testTripsOnFailureRate(self):
+        breaker = self.makeBreaker()
+        breaker.recordCall(True, 0.1)
+        breaker.recordCall(False, 0.1)
+        breaker.recordCall(True, 0.1)
+        self.assertEqual(CircuitBreaker.CLOSED, breaker.state())  # under minCalls
+
+        breaker.recordCall(False, 0.1)  # 2 of 4 failed
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state())
+        with self.assertRaisesRegex(CircuitOpenError, "weather.gov is not responding"):
+            breaker.call(lambda: 'not called')
+        self.assertEqual({'state': CircuitBreaker.OPEN, 'failureRate': 0.5, 'slowRate': 0, 'calls': 4, 'rejected': 1,
+                          'trips': 1}, breaker.stats())
+
+
+    def testTripsOnSlowRate(self):
+        breaker = self.makeBreaker()
+        for _ in range(4):
+            breaker.recordCall(True, 3)  # succeeded, but slowly
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state())
+
+
+    def testHalfOpenProbes(self):
+        breaker = self.makeBreaker(halfOpenMaxCalls=1)
+        for _ in range(4):
+            breaker.recordCall(False, 0.1)
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state())
+
+        self.now += 30
+        self.assertEqual(CircuitBreaker.HALF_OPEN, breaker.state())
+        breaker.beforeCall()  # the one allowed probe
+        with self.assertRaises(CircuitOpenError):
+            breaker.beforeCall()
+
+        breaker.recordCall(False, 0.1)  # bad probe -> open again
+        self.assertEqual(CircuitBreaker.OPEN, breaker.state())
+
+        self.now += 30
+        self.assertEqual('probed', breaker.call(lambda: 'probed'))  # good probe -> closed
+        self.assertEqual(CircuitBreaker.CLOSED, breaker.state())
+        self.assertEqual(0, breaker.stats()['calls'])
+
+
+    def testWeatherGovSourceFailsFastAndServesLastGoodData(self):
+        with open('test/test-forecast-data.xml', 'rb') as xmlFile:
+            body = xmlFile.read()
+        statuses = [200, 503, 503, 503]
+        mockFetcher = Mock()
+        mockFetcher.fetch.side_effect = lambda url, **kwargs: FetchResponse(url, statuses.pop(0), {}, body, 0.1)
+        cache = ForecastCache(ttlSeconds=0, staleSeconds=0)  # always expired and never stale-servable
+        with patch.object(WeatherGovSource, 'forecastCache', cache), \
+                patch.object(WeatherGovSource, 'fetcher', mockFetcher), \
+                patch.object(WeatherGovSource, 'circuitBreaker', self.makeBreaker()):
+            location = Location('01002')
+            goodSource = WeatherGovSource(location, None)
+            self.assertEqual(8, mockFetcher.fetch.call_args[1]['timeout'])  # latencyBudgetSeconds
+            for _ in range(3):  # server errors are served the last good data, too
+                failedSource = WeatherGovSource(location, None)
+                self.assertTrue(failedSource.isStale)
+                self.assertIs(goodSource.hours, failedSource.hours)
+            self.assertEqual(CircuitBreaker.OPEN, WeatherGovSource.circuitBreaker.state())  # 3 of 4 failed
+
+            lastGoodSource = WeatherGovSource(location, None)
+            self.assertEqual(4, mockFetcher.fetch.call_count)  # failed fast
+            self.assertTrue(lastGoodSource.isStale)
+            self.assertIs(goodSource.hours, lastGoodSource.hours)
+
+            cache.clear()  # no last good data -> fail fast
+            with self.assertRaises(CircuitOpenError):
+                WeatherGovSource(location, None)
+
+
+    def testWeatherGovSourceServerErrorWithoutLastGoodData(self):
+        mockFetcher = Mock()
+        mockFetcher.fetch.side_effect = lambda url, **kwargs: FetchResponse(url, 503, {}, b'', 0.1)
+        with patch.object(WeatherGovSource, 'forecastCache', ForecastCache()), \
+                patch.object(WeatherGovSource, 'fetcher', mockFetcher), \
+                patch.object(WeatherGovSource, 'circuitBreaker', self.makeBreaker()):
+            with self.assertRaisesRegex(UpstreamError, "HTTP status 503"):
+                WeatherGovSource(Location('01002'), None)
+
+
+    def testLatencyBudget(self):
+        server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _TricklingHandler)
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        try:
+            fetcher = HttpFetcher(readTimeout=10)
+            startTime = time.monotonic()
+            with self.assertRaises(socket.timeout):
+                fetcher.fetch('http://127.0.0.1:{}/xml'.format(server.server_address[1]), timeout=0.5)
+            self.assertLess(time.monotonic() - startTime, 2)
+            self.assertEqual(1, fetcher.stats.errorCount)
+        finally:
+            server.shutdown()
+            server.server_close()
@@ -0,0 +1,86 @@
+import glob
+import unittest
+import xml.etree.ElementTree as ET
+
+from forecast.DwmlDocument import DwmlDocument
+from forecast.XmlParserBackend import XmlParserBackend, LxmlParserBackend
+
+
+class DwmlDocumentTestCase(unittest.TestCase):
+    """
+    """
+
+
+    def testSameDataAsTree(self):
+        # the streaming pass finds what findall() finds in the full tree
+        for xmlFileName in glob.glob('test/test-*.xml'):
+            dwmlElement = ET.parse(xmlFileName).getroot()
+            if dwmlElement.tag == 'error':
+                continue
+
+            dwmlDocument = DwmlDocument.fromFile(xmlFileName)
+            expTimeLayoutDict = {timeLayoutEle.find('layout-key').text:
+                                     [ele.text for ele in timeLayoutEle.findall('start-valid-time')]
+                                 for timeLayoutEle in dwmlElement.findall('data/time-layout')}
+            self.assertEqual(expTimeLayoutDict, dwmlDocument.timeLayoutDict, xmlFileName)
+            for parametersEle in dwmlElement.findall('data/parameters'):
+                expParameterDict = {paramEle.tag: (paramEle.attrib['time-layout'],
+                                                   [int(valueEle.text) for valueEle in paramEle.findall('value')])
+                                    for paramEle in parametersEle}
+                self.assertEqual(expParameterDict,
+                                 dwmlDocument.parameterDict(parametersEle.attrib.get('applicable-location')),
+                                 xmlFileName)
+            creationDateEle = dwmlElement.find('head/product/creation-date')
+            self.assertEqual(creationDateEle.text, dwmlDocument.creationDateText)
+            self.assertEqual(creationDateEle.attrib.get('refresh-frequency'), dwmlDocument.refreshFrequencyText)
+            self.assertIsNone(dwmlDocument.errorString)
+
+
+    def testParserBackendsAgree(self):
+        # every installed backend reads the same documents. lxml's is compared with the stdlib's if it's installed
+        stdlibBackend = XmlParserBackend.forName('stdlib')
+        for parserBackend in XmlParserBackend.backends().values():
+            for xmlFileName in glob.glob('test/test-*.xml'):
+                expDocument = DwmlDocument.fromFile(xmlFileName, stdlibBackend)
+                actDocument = DwmlDocument.fromFile(xmlFileName, parserBackend)
+                self.assertEqual(vars(expDocument), vars(actDocument), (parserBackend, xmlFileName))
+
+        self.assertEqual('lxml' if LxmlParserBackend.isInstalled() else 'stdlib', XmlParserBackend.forName(None).NAME)
+        with self.assertRaises(ValueError):
+            XmlParserBackend.forName('expat')
+        if not LxmlParserBackend.isInstalled():
+            with self.assertRaises(ValueError):
+                XmlParserBackend.forName('lxml')
+        with self.assertRaises(TypeError):  # abstract
+            XmlParserBackend()
+
+
+    def testErrorDocument(self):
+        dwmlDocument = DwmlDocument.fromFile('test/test-forecast-error-response.xml')
+        self.assertIn('<problem>No data were found using the following input:</problem>', dwmlDocument.errorString)
+        self.assertIsNone(dwmlDocument.parameterDict())
+        self.assertEqual({}, dwmlDocument.timeLayoutDict)
+
+
+    def testDocumentsForPoints(self):
+        with open('test/test-forecast-data-multi-point.xml', 'rb') as xmlFile:
+            dwmlDocument = DwmlDocument.fromBytes(xmlFile.read())
+        pointDocuments = dwmlDocument.documentsForPoints()
+        self.assertEqual(['point1', 'point2'], sorted(pointDocuments.keys()))
+        for pointKey, pointDocument in pointDocuments.items():
+            parameterDict = dwmlDocument.parameterDict(pointKey)
+            self.assertEqual(parameterDict, pointDocument.parameterDict())
+            self.assertEqual({layoutKey for layoutKey, _ in parameterDict.values()},
+                             set(pointDocument.timeLayoutDict.keys()))
+            self.assertEqual(dwmlDocument.creationDateText, pointDocument.creationDateText)
+
+
+    def testFromElementLeavesTreeAlone(self):
+        dwmlElement = ET.parse('test/test-forecast-data.xml').getroot()
+        xmlBefore = ET.tostring(dwmlElement)
+        DwmlDocument.fromElement(dwmlElement)
+        self.assertEqual(xmlBefore, ET.tostring(dwmlElement))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,85 @@
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch, Mock
+
+from forecast.DwmlStore import DwmlStore
+from forecast.ForecastCache import ForecastCache
+from forecast.HttpFetcher import FetchResponse
+from forecast.Location import Location
+from forecast.WeatherGovSource import WeatherGovSource
+
+
+class DwmlStoreTestCase(unittest.TestCase):
+    """
+    """
+
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        with open('test/test-forecast-data.xml', 'rb') as xmlFile:
+            self.body = xmlFile.read()
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def testPutAndLatest(self):
+        dwmlStore = DwmlStore(self.directory)
+        key = ('42.377651', '-72.50323')
+        self.assertIsNone(dwmlStore.latest(key))
+
+        dwmlStore.put(key, b'<dwml>old</dwml>', 1000)
+        dwmlStore.put(key, b'<dwml>new</dwml>', 2000)
+        self.assertEqual((2000, b'<dwml>new</dwml>'), dwmlStore.latest(key))
+        self.assertEqual(1, dwmlStore.stats()['files'])  # the older document was replaced
+        self.assertEqual(1, DwmlStore(self.directory).stats()['files'])  # another process's view
+
+        dwmlStore.put(('../../etc', 'passwd'), b'<dwml/>')  # not a lat/lon, so not stored
+        self.assertEqual(1, dwmlStore.stats()['files'])
+        self.assertIsNone(dwmlStore.latest(('../../etc', 'passwd')))
+
+
+    def testSizeEviction(self):
+        dwmlStore = DwmlStore(self.directory, maxBytes=len(self.body))  # room for a few gzipped documents
+        for index in range(20):
+            dwmlStore.put((str(40 + index), '-72'), self.body, 1000 + index)
+        stats = dwmlStore.stats()
+        self.assertLessEqual(stats['bytes'], len(self.body))
+        self.assertEqual(20 - stats['files'], stats['evictions'])
+        self.assertIsNone(dwmlStore.latest(('40', '-72')))  # oldest went first
+        self.assertEqual(1019, dwmlStore.latest(('59', '-72'))[0])
+
+
+    def testFailedPutLeavesNoTempFile(self):
+        dwmlStore = DwmlStore(self.directory)
+        with patch('os.replace', side_effect=OSError("disk full")):
+            with self.assertRaises(OSError):
+                dwmlStore.put(('42', '-72'), self.body, 1000)
+        self.assertEqual([], os.listdir(self.directory))
+        self.assertEqual(0, dwmlStore.stats()['bytes'])
+
+
+    def testWeatherGovSourceStartsWarm(self):
+        mockFetcher = Mock()
+        mockFetcher.fetch.side_effect = lambda url, **kwargs: FetchResponse(url, 200, {}, self.body, 0.1)
+        dwmlStore = DwmlStore(self.directory)
+        location = Location('01002')
+        with patch.object(WeatherGovSource, 'forecastCache', ForecastCache()), \
+                patch.object(WeatherGovSource, 'fetcher', mockFetcher), \
+                patch.object(WeatherGovSource, 'dwmlStore', dwmlStore):
+            fetchedHours = WeatherGovSource(location, None).hours
+            self.assertEqual(1, mockFetcher.fetch.call_count)
+            self.assertEqual(1, dwmlStore.stats()['files'])
+
+        # a new worker: empty memory cache, same directory
+        newCache = ForecastCache(clock=lambda: dwmlStore.latest(location.key())[0])  # not expired yet
+        with patch.object(WeatherGovSource, 'forecastCache', newCache), \
+                patch.object(WeatherGovSource, 'fetcher', mockFetcher), \
+                patch.object(WeatherGovSource, 'dwmlStore', dwmlStore):
+            source = WeatherGovSource(location, None)
+            self.assertEqual(1, mockFetcher.fetch.call_count)
+            self.assertEqual([hour.datetime for hour in fetchedHours], [hour.datetime for hour in source.hours])
+            self.assertIn(location.key(), newCache)
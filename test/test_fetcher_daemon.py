@@ -0,0 +1,202 @@
+import os
+import shutil
+import tempfile
+import threading
+import unittest
+from unittest.mock import patch, Mock
+
+from forecast.FetcherDaemon import FetcherDaemon
+from forecast.ForecastCache import ForecastCache, CacheEntry
+from forecast.HttpFetcher import FetchResponse
+from forecast.Location import Location
+from forecast.NegativeCache import NegativeCache
+from forecast.RateLimiter import RateLimiter
+from forecast.SharedForecastCache import SharedForecastCache
+from forecast.WeatherGovSource import WeatherGovSource
+
+
+class _ReaderSource(WeatherGovSource):
+    """
+    A web worker in the same process as the daemon: its own memory cache, and it never fetches.
+    """
+    isReader = True
+    forecastCache = ForecastCache()
+
+
+class FetcherDaemonTestCase(unittest.TestCase):
+    """
+    """
+
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.directory)  # NB: cleanups, not tearDown, so that daemons stop first
+        self.sharedCache = SharedForecastCache(os.path.join(self.directory, 'forecasts.sqlite'))
+        with open('test/test-forecast-data.xml', 'rb') as xmlFile:
+            self.body = xmlFile.read()
+        self.mockFetcher = Mock()
+        self.mockFetcher.fetch.side_effect = lambda url, **kwargs: FetchResponse(url, 200, {}, self.body, 0.1)
+        self.patches = [patch.object(WeatherGovSource, 'fetcher', self.mockFetcher),
+                        patch.object(WeatherGovSource, 'sharedCache', self.sharedCache),
+                        patch.object(WeatherGovSource, 'forecastCache', ForecastCache()),
+                        patch.object(WeatherGovSource, 'negativeCache', NegativeCache()),
+                        patch.object(_ReaderSource, 'forecastCache', ForecastCache())]
+        for aPatch in self.patches:
+            aPatch.start()
+            self.addCleanup(aPatch.stop)
+
+
+    def startDaemon(self):
+        fetcherDaemon = FetcherDaemon(maxConcurrency=2, pollSeconds=0.01)
+        fetcherDaemon.runOnce()  # its first heartbeat, so that readers don't fetch for themselves
+        thread = threading.Thread(target=fetcherDaemon.run, daemon=True)
+        thread.start()
+        self.addCleanup(thread.join, 5)
+        self.addCleanup(fetcherDaemon.stop)
+        return fetcherDaemon, thread
+
+
+    def testFetchRequestQueue(self):
+        now = 1000.0
+        sharedCache = SharedForecastCache(os.path.join(self.directory, 'queue.sqlite'), errorSeconds=30,
+                                          clock=lambda: now)
+        key1, key2 = ('42.37', '-72.51'), ('42.37', '-72.51', 3)
+        sharedCache.requestFetch(key1)
+        sharedCache.requestFetch(key2)
+        sharedCache.requestFetch(key1)  # already asked
+        self.assertEqual([key1, key2], sharedCache.pendingFetchRequests(10))
+        self.assertEqual(2, sharedCache.stats()['pendingFetchRequests'])
+
+        sharedCache.completeFetchRequest(key1)
+        sharedCache.completeFetchRequest(key2, 'no data for key2')
+        self.assertEqual([], sharedCache.pendingFetchRequests(10))
+        self.assertIsNone(sharedCache.fetchError(key1))
+        self.assertEqual('no data for key2', sharedCache.fetchError(key2))
+
+        sharedCache.requestFetch(key2)  # failed recently, so not asked again
+        self.assertEqual([], sharedCache.pendingFetchRequests(10))
+
+        now += 31
+        self.assertIsNone(sharedCache.fetchError(key2))
+        sharedCache.requestFetch(key2)
+        self.assertEqual([key2], sharedCache.pendingFetchRequests(10))
+
+
+    def testHeartbeat(self):
+        self.assertFalse(_ReaderSource.isFetcherDaemonRunning())
+        self.assertIsNone(self.sharedCache.heartbeatAge())
+        FetcherDaemon().runOnce()
+        self.assertTrue(_ReaderSource.isFetcherDaemonRunning())
+        self.assertFalse(WeatherGovSource.isFetcherDaemonRunning())  # not a reader
+        with patch.object(_ReaderSource, 'READER_HEARTBEAT_SECONDS', 0):
+            self.assertFalse(_ReaderSource.isFetcherDaemonRunning())
+
+        with patch.object(WeatherGovSource, 'isReader', True), self.assertRaises(ValueError):
+            FetcherDaemon()
+        with patch.object(WeatherGovSource, 'sharedCache', None), self.assertRaises(ValueError):
+            FetcherDaemon()
+
+
+    def testHeartbeatIsNotRecordedEveryPoll(self):
+        now = 1000.0
+        fetcherDaemon = FetcherDaemon(heartbeatSeconds=2, clock=lambda: now)
+        with patch.object(self.sharedCache, 'recordHeartbeat') as mockRecordHeartbeat:
+            fetcherDaemon.runOnce()
+            now += 1
+            fetcherDaemon.runOnce()
+            self.assertEqual(1, mockRecordHeartbeat.call_count)
+            now += 1
+            fetcherDaemon.runOnce()
+            self.assertEqual(2, mockRecordHeartbeat.call_count)
+
+
+    def testReaderGetsForecastFromDaemon(self):
+        fetcherDaemon, thread = self.startDaemon()
+        location = Location('01002')
+        with patch.object(_ReaderSource, 'latencyBudgetSeconds', 5):
+            readerHours = _ReaderSource(location, None).hours
+            windowHours = _ReaderSource(location, None, numDays=2).hours
+        fetcherDaemon.stop()
+        thread.join(5)  # finishes its fetches
+        self.assertEqual(len(WeatherGovSource(location, None).hours), len(readerHours))  # from the daemon's cache
+        self.assertLess(len(windowHours), len(readerHours))  # from the reader's whole forecast
+        self.assertEqual(1, self.mockFetcher.fetch.call_count)  # only the daemon fetched
+        self.assertEqual(1, fetcherDaemon.stats()['fetchCount'])
+        self.assertEqual(0, self.sharedCache.stats()['pendingFetchRequests'])
+
+
+    def testReaderGetsDaemonsError(self):
+        with open('test/test-forecast-error-response.xml', 'rb') as xmlFile:
+            self.body = xmlFile.read()
+        fetcherDaemon, thread = self.startDaemon()
+        with patch.object(_ReaderSource, 'latencyBudgetSeconds', 5), \
+                self.assertRaisesRegex(ValueError, 'No data were found'):
+            _ReaderSource(Location('01002'), None)
+        fetcherDaemon.stop()
+        thread.join(5)
+        self.assertEqual(1, fetcherDaemon.stats()['errorCount'])
+
+
+    def testReaderTimesOut(self):
+        FetcherDaemon().runOnce()  # a heartbeat, but nothing fetches
+        location = Location('01002')
+        with patch.object(_ReaderSource, 'latencyBudgetSeconds', 0.1), self.assertRaises(ValueError):
+            _ReaderSource(location, None)
+        self.assertEqual([location.key()], self.sharedCache.pendingFetchRequests(10))
+        self.mockFetcher.fetch.assert_not_called()
+
+
+    def testReaderFetchesWithoutDaemon(self):
+        location = Location('01002')
+        self.assertTrue(_ReaderSource(location, None).hours)
+        self.assertEqual(1, self.mockFetcher.fetch.call_count)
+        self.assertEqual([], self.sharedCache.pendingFetchRequests(10))
+
+
+    def testRequestedKeysGoFirst(self):
+        fetchedLatitudes = []
+        firstFetchEvent = threading.Event()
+
+
+        def fetch(url, **kwargs):
+            fetchedLatitudes.append(url.split('&lat=')[1].split('&')[0])
+            firstFetchEvent.wait(5)  # the first fetch holds up the others until they're all queued
+            return FetchResponse(url, 200, {}, self.body, 0.1)
+
+
+        self.mockFetcher.fetch.side_effect = fetch
+        rateLimiter = RateLimiter(1000)
+        with patch.object(WeatherGovSource, 'rateLimiter', rateLimiter):
+            fetcherDaemon = FetcherDaemon(maxConcurrency=1)
+            for latitude in ['42.1', '42.2', '42.3']:
+                fetcherDaemon.submit((latitude, '-72.1'), False)  # refreshes
+            fetcherDaemon.submit(('42.4', '-72.1'), True)  # a reader's request
+            fetcherDaemon.submit(('42.3', '-72.1'), True)  # a queued refresh that a reader asks for, too
+            firstFetchEvent.set()
+            fetcherDaemon._executor.shutdown(wait=True)
+        self.assertEqual(['42.1', '42.4', '42.3', '42.2'], fetchedLatitudes)
+        self.assertEqual((2, 2), (rateLimiter.stats()['interactive']['acquired'],
+                                  rateLimiter.stats()['background']['acquired']))
+
+
+    def testRefreshesExpiringEntries(self):
+        now = 1000.0
+        location = Location('01002')
+        cacheEntry = CacheEntry([], fetchedAt=now)
+        cacheEntry.expiresAt = now + 60
+        self.sharedCache.put(location.key(), cacheEntry)
+
+        fetcherDaemon = FetcherDaemon(refreshAheadSeconds=30, refreshCheckSeconds=10, clock=lambda: now)
+        fetcherDaemon.runOnce()  # not expiring soon
+        now += 40
+        fetcherDaemon.runOnce()  # not time to check
+        now += 10
+        fetcherDaemon.runOnce()
+        fetcherDaemon._executor.shutdown(wait=True)
+        self.assertEqual(1, self.mockFetcher.fetch.call_count)
+        self.assertEqual(1, fetcherDaemon.stats()['refreshCount'])
+        self.assertTrue(self.sharedCache.get(location.key()).hours)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,228 @@
+import datetime
+import threading
+import unittest
+from unittest.mock import patch, Mock
+
+from forecast.Forecast import Forecast
+from forecast.ForecastCache import ForecastCache, CacheEntry
+from forecast.Hour import Hour
+from forecast.HttpFetcher import FetchResponse
+from forecast.Location import Location
+from forecast.WeatherGovSource import WeatherGovSource
+
+
+class ForecastCacheTestCase(unittest.TestCase):
+    """
+    """
+
+
+    def setUp(self):
+        self.now = 1000.0
+        self.hours = [Hour(datetime.datetime(2015, 1, 13, 19, 0, tzinfo=datetime.timezone.utc), 0, 10, 3, 50)]
+
+
+    def clock(self):
+        return self.now
+
+
+    def testGetPutAndTtl(self):
+        cache = ForecastCache(ttlSeconds=60, clock=self.clock)
+        self.assertIsNone(cache.get('k'))
+        cache.put('k', CacheEntry(self.hours, fetchedAt=self.now))
+        self.assertIs(self.hours, cache.get('k').hours)
+
+        self.now += 60
+        self.assertIsNone(cache.get('k'))
+        self.assertIsNotNone(cache.peek('k'))  # expired entries are kept until evicted
+        self.assertEqual({'entries': 1, 'bytes': cache.numBytes, 'hits': 1, 'staleHits': 0, 'misses': 2,
+                          'evictions': 0}, cache.stats())
+
+
+    def testCreationDateExpiry(self):
+        cache = ForecastCache(ttlSeconds=60 * 60, clock=self.clock)
+        creationDate = datetime.datetime.fromtimestamp(self.now - 30, datetime.timezone.utc)
+        cache.put('k', CacheEntry(self.hours, creationDate=creationDate, refreshSeconds=60, fetchedAt=self.now))
+        self.assertEqual(self.now + 30, cache.peek('k').expiresAt)  # next issuance comes before the ttl
+
+        # an issuance time that has already passed falls back to the ttl
+        cache.put('k', CacheEntry(self.hours, creationDate=creationDate, refreshSeconds=10, fetchedAt=self.now))
+        self.assertEqual(self.now + (60 * 60), cache.peek('k').expiresAt)
+
+
+    def testLruEviction(self):
+        cache = ForecastCache(maxEntries=2, clock=self.clock)
+        cache.put('a', CacheEntry(self.hours, fetchedAt=self.now))
+        cache.put('b', CacheEntry(self.hours, fetchedAt=self.now))
+        cache.get('a')  # 'b' is now least recently used
+        cache.put('c', CacheEntry(self.hours, fetchedAt=self.now))
+        self.assertIn('a', cache)
+        self.assertNotIn('b', cache)
+        self.assertIn('c', cache)
+        self.assertEqual(1, cache.evictions)
+
+
+    def testByteBudgetEviction(self):
+        entrySize = CacheEntry(self.hours).size
+        cache = ForecastCache(maxBytes=(2 * entrySize) + 1, clock=self.clock)
+        for key in ['a', 'b', 'c']:
+            cache.put(key, CacheEntry(self.hours, fetchedAt=self.now))
+        self.assertEqual(['b', 'c'], [key for key in ['a', 'b', 'c'] if key in cache])
+        self.assertEqual(2 * entrySize, cache.numBytes)
+
+        cache.put('c', CacheEntry(self.hours, fetchedAt=self.now))  # replacing doesn't double-count
+        self.assertEqual(2 * entrySize, cache.numBytes)
+
+
+    def testWeatherGovSourceUsesCache(self):
+        location = Location('01002')
+        with open('test/test-forecast-data.xml', 'rb') as xmlFile:
+            body = xmlFile.read()
+        mockFetcher = Mock()
+        mockFetcher.fetch.side_effect = lambda url, **kwargs: FetchResponse(url, 200, {}, body, 0.1)
+        with patch.object(WeatherGovSource, 'forecastCache', ForecastCache()), \
+             patch.object(WeatherGovSource, 'fetcher', mockFetcher):
+            wgSource1 = WeatherGovSource(location, Forecast.PARAM_RANGE_STEPS_DEFAULT)
+            wgSource2 = WeatherGovSource(Location('01002'), Forecast.PARAM_RANGE_STEPS_DEFAULT)
+            self.assertEqual(1, mockFetcher.fetch.call_count)
+            self.assertIs(wgSource1.hours, wgSource2.hours)
+            self.assertEqual(datetime.datetime(2015, 1, 13, 23, 44, tzinfo=datetime.timezone.utc),
+                             wgSource2.creationDate)
+
+
+    def testWeatherGovSourceCachesWindowsSeparately(self):
+        location = Location('01002')
+        with open('test/test-forecast-data.xml', 'rb') as xmlFile:
+            body = xmlFile.read()
+        mockFetcher = Mock()
+        mockFetcher.fetch.side_effect = lambda url, **kwargs: FetchResponse(url, 200, {}, body, 0.1)
+        with patch.object(WeatherGovSource, 'forecastCache', ForecastCache()) as forecastCache, \
+             patch.object(WeatherGovSource, 'fetcher', mockFetcher):
+            windowSource = WeatherGovSource(location, Forecast.PARAM_RANGE_STEPS_DEFAULT, numDays=3)
+            self.assertIn('&begin=', mockFetcher.fetch.call_args[0][0])
+            self.assertIn(location.key() + (3,), forecastCache)
+            self.assertNotIn(location.key(), forecastCache)
+
+            # a whole forecast is fetched separately, and then serves every window without fetching
+            wholeSource = WeatherGovSource(location, Forecast.PARAM_RANGE_STEPS_DEFAULT)
+            self.assertNotIn('&begin=', mockFetcher.fetch.call_args[0][0])
+            forecastCache.invalidate(location.key() + (3,))
+            windowSource2 = WeatherGovSource(location, Forecast.PARAM_RANGE_STEPS_DEFAULT, numDays=3)
+            self.assertEqual(2, mockFetcher.fetch.call_count)
+            self.assertEqual(windowSource.hours, windowSource2.hours)
+            self.assertEqual(wholeSource.hours[:len(windowSource2.hours)], windowSource2.hours)
+
+
+    def testConditionalRevalidation(self):
+        with open('test/test-forecast-data.xml', 'rb') as xmlFile:
+            body = xmlFile.read()
+        requestHeaders = []
+
+
+        def fetch(url, headers=None, **kwargs):
+            requestHeaders.append(headers)
+            if headers and headers.get('If-None-Match') == '"v1"':
+                return FetchResponse(url, 304, {}, b'', 0.1)
+            return FetchResponse(url, 200, {'etag': '"v1"', 'last-modified': 'Tue, 13 Jan 2015 23:44:00 GMT'},
+                                 body, 0.1)
+
+
+        mockFetcher = Mock()
+        mockFetcher.fetch.side_effect = fetch
+        with patch.object(WeatherGovSource, 'forecastCache', ForecastCache(ttlSeconds=0)), \
+             patch.object(WeatherGovSource, 'fetcher', mockFetcher), \
+             patch.object(WeatherGovSource, 'hoursFromDocument',
+                          wraps=WeatherGovSource.hoursFromDocument, autospec=True) as mockParse:
+            wgSource1 = WeatherGovSource(Location('01002'), Forecast.PARAM_RANGE_STEPS_DEFAULT)
+            wgSource2 = WeatherGovSource(Location('01002'), Forecast.PARAM_RANGE_STEPS_DEFAULT)  # expired -> 304
+            self.assertEqual([{}, {'If-None-Match': '"v1"', 'If-Modified-Since': 'Tue, 13 Jan 2015 23:44:00 GMT'}],
+                             requestHeaders)
+            self.assertEqual(1, mockParse.call_count)
+            self.assertIs(wgSource1.hours, wgSource2.hours)
+            self.assertEqual(wgSource1.creationDate, wgSource2.creationDate)
+
+
+    def testGetStale(self):
+        cache = ForecastCache(ttlSeconds=60, staleSeconds=60, clock=self.clock)
+        cache.put('k', CacheEntry(self.hours, fetchedAt=self.now))
+        self.assertIsNone(cache.getStale('k'))  # fresh entries aren't stale
+
+        self.now += 90
+        self.assertIsNone(cache.get('k'))
+        self.assertIs(self.hours, cache.getStale('k').hours)
+
+        self.now += 30
+        self.assertIsNone(cache.getStale('k'))
+        self.assertEqual(1, cache.staleHits)
+
+
+    def testStaleWhileRevalidate(self):
+        with open('test/test-forecast-data.xml', 'rb') as xmlFile:
+            body = xmlFile.read()
+        fetchedEvent = threading.Event()
+
+
+        def fetch(url, **kwargs):
+            fetchedEvent.set()
+            return FetchResponse(url, 200, {}, body, 0.1)
+
+
+        mockFetcher = Mock()
+        mockFetcher.fetch.side_effect = fetch
+        cache = ForecastCache(ttlSeconds=60, clock=self.clock)
+        cache.put(Location('01002').key(), CacheEntry(self.hours, fetchedAt=self.now - 120))
+        with patch.object(WeatherGovSource, 'forecastCache', cache), \
+             patch.object(WeatherGovSource, 'fetcher', mockFetcher):
+            wgSource = WeatherGovSource(Location('01002'), Forecast.PARAM_RANGE_STEPS_DEFAULT)
+            self.assertIs(self.hours, wgSource.hours)  # served immediately
+            self.assertTrue(wgSource.isStale)
+            self.assertEqual(self.now - 120, wgSource.fetchedAt)
+            self.assertTrue(fetchedEvent.wait(5))
+            while WeatherGovSource.singleFlight.isInFlight(Location('01002').key()):
+                threading.Event().wait(0.01)
+
+        self.assertIsNot(self.hours, cache.peek(Location('01002').key()).hours)
+
+
+    def testConcurrentStaleHitsRevalidateOnce(self):
+        with open('test/test-forecast-data.xml', 'rb') as xmlFile:
+            body = xmlFile.read()
+        numThreads = 10
+        servedBarrier = threading.Barrier(numThreads + 1)  # the fetch waits until every thread was served
+
+
+        def fetch(url, **kwargs):
+            servedBarrier.wait(5)
+            return FetchResponse(url, 200, {}, body, 0.1)
+
+
+        def makeSource():
+            startBarrier.wait(5)
+            wgSources.append(WeatherGovSource(Location('01002'), Forecast.PARAM_RANGE_STEPS_DEFAULT))
+            servedBarrier.wait(5)
+
+
+        mockFetcher = Mock()
+        mockFetcher.fetch.side_effect = fetch
+        cache = ForecastCache(ttlSeconds=60, clock=self.clock)
+        cache.put(Location('01002').key(), CacheEntry(self.hours, fetchedAt=self.now - 120))
+        startBarrier = threading.Barrier(numThreads)
+        wgSources = []
+        with patch.object(WeatherGovSource, 'forecastCache', cache), \
+             patch.object(WeatherGovSource, 'fetcher', mockFetcher):
+            threads = [threading.Thread(target=makeSource) for _ in range(numThreads)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            while WeatherGovSource.revalidatingKeys:
+                threading.Event().wait(0.01)
+
+        self.assertTrue(all(wgSource.isStale for wgSource in wgSources))
+        self.assertEqual(1, mockFetcher.fetch.call_count)
+        self.assertIsNot(self.hours, cache.peek(Location('01002').key()).hours)
+
+
+    def testParseRefreshFrequency(self):
+        for refreshFrequencyText, expSeconds in [('PT1H', 3600), ('PT1H30M', 5400), ('PT45S', 45), ('P1D', None),
+                                                 ('PT', None), (None, None)]:
+            self.assertEqual(expSeconds, WeatherGovSource.parseRefreshFrequency(refreshFrequencyText))
@@ -0,0 +1,49 @@
+import collections
+import unittest
+
+from forecast.HashRing import HashRing
+
+
+class HashRingTestCase(unittest.TestCase):
+    """
+    """
+
+
+    def setUp(self):
+        self.keys = [('{:.2f}'.format(40 + index / 100), '-72.50') for index in range(2000)]
+
+
+    def testEmptyRing(self):
+        self.assertIsNone(HashRing().nodeForKey(('42.38', '-72.52')))
+
+
+    def testBalanceAndDeterminism(self):
+        nodes = ['http://10.0.0.{}:8000'.format(index) for index in range(4)]
+        ring = HashRing(nodes)
+        ownerCounts = collections.Counter(ring.nodeForKey(key) for key in self.keys)
+        self.assertEqual(set(nodes), set(ownerCounts))
+        for count in ownerCounts.values():
+            self.assertAlmostEqual(500, count, delta=150)
+
+        otherRing = HashRing(reversed(nodes))  # same nodes -> same owners, as on another app node
+        self.assertTrue(all(ring.nodeForKey(key) == otherRing.nodeForKey(key) for key in self.keys))
+
+
+    def testMembershipChangesRemapFewKeys(self):
+        ring = HashRing(['a', 'b', 'c', 'd'])
+        oldOwners = {key: ring.nodeForKey(key) for key in self.keys}
+
+        ring.addNode('e')
+        newOwners = {key: ring.nodeForKey(key) for key in self.keys}
+        movedKeys = [key for key in self.keys if oldOwners[key] != newOwners[key]]
+        self.assertTrue(all(newOwners[key] == 'e' for key in movedKeys))  # keys only move to the new node
+        self.assertAlmostEqual(len(self.keys) / 5, len(movedKeys), delta=150)
+
+        ring.removeNode('e')
+        self.assertEqual(oldOwners, {key: ring.nodeForKey(key) for key in self.keys})
+
+        ring.setNodes(['a', 'b', 'c'])
+        self.assertEqual(['a', 'b', 'c'], ring.nodes)
+        for key in self.keys:
+            if oldOwners[key] != 'd':
+                self.assertEqual(oldOwners[key], ring.nodeForKey(key))
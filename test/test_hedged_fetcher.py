@@ -0,0 +1,136 @@
+import threading
+import time
+import unittest
+
+from forecast.HedgedFetcher import HedgedFetcher
+from forecast.HttpFetcher import FetchAbortedError, FetchResponse, FetchStats
+from forecast.Location import Location
+from forecast.RateLimiter import RateLimiter
+from forecast.WeatherGovSource import WeatherGovSource
+from forecast.WeatherSource import WeatherSource
+
+
+class _FakeFetcher(object):
+    """
+    Takes delaysByBaseUrl[<the URL's start>] seconds to answer, and raises if that's an Exception. Can be aborted, like
+    HttpFetcher.
+    """
+
+
+    def __init__(self, delaysByBaseUrl):
+        self.delaysByBaseUrl = delaysByBaseUrl
+        self.stats = FetchStats()
+        self.fetchedUrls = []
+        self.fetchThreadIdents = []
+        self.abortEvents = {}  # thread ident -> Event
+
+
+    def fetch(self, url, headers=None, timeout=None):
+        self.fetchedUrls.append(url)
+        self.fetchThreadIdents.append(threading.get_ident())
+        baseUrl = next(baseUrl for baseUrl in self.delaysByBaseUrl if url.startswith(baseUrl))
+        delay = self.delaysByBaseUrl[baseUrl]
+        if isinstance(delay, Exception):
+            raise delay
+
+        abortEvent = self.abortEvents[threading.get_ident()] = threading.Event()
+        try:
+            if abortEvent.wait(delay):
+                raise FetchAbortedError("aborted")
+        finally:
+            del self.abortEvents[threading.get_ident()]
+        self.stats.recordFetch(delay, 0, 0)
+        return FetchResponse(url, 200, {}, baseUrl.encode(), delay)
+
+
+    def abort(self, threadIdent):
+        abortEvent = self.abortEvents.get(threadIdent)
+        if abortEvent:
+            abortEvent.set()
+
+
+    def close(self):
+        pass
+
+
+class HedgedFetcherTestCase(unittest.TestCase):
+    """
+    """
+
+
+    def testHedgeDelayFromP95(self):
+        hedgedFetcher = HedgedFetcher(_FakeFetcher({}), initialDelaySeconds=2, minDelaySeconds=0.05)
+        self.assertEqual(2, hedgedFetcher.hedgeDelaySeconds())  # too few samples
+        for index in range(100):
+            hedgedFetcher.stats.recordFetch(index / 100, 0, 0)
+        self.assertEqual(0.95, hedgedFetcher.hedgeDelaySeconds())
+        hedgedFetcher.stats.recentLatencies.clear()
+        for _ in range(100):
+            hedgedFetcher.stats.recordFetch(0.001, 0, 0)
+        self.assertEqual(0.05, hedgedFetcher.hedgeDelaySeconds())
+
+
+    def testFastPrimaryIsNotHedged(self):
+        fakeFetcher = _FakeFetcher({'http://primary': 0, 'http://mirror': 0})
+        hedgedFetcher = HedgedFetcher(fakeFetcher, 'http://primary', 'http://mirror', initialDelaySeconds=0.5)
+        self.assertEqual(b'http://primary', hedgedFetcher.fetch('http://primary/xml?lat=1').body)
+        self.assertEqual(0, hedgedFetcher.hedgeCount)
+        self.assertEqual([threading.get_ident()], fakeFetcher.fetchThreadIdents)  # on the calling thread
+
+
+    def testSlowPrimaryIsHedgedToMirror(self):
+        fakeFetcher = _FakeFetcher({'http://primary': 1, 'http://mirror': 0})
+        hedgedFetcher = HedgedFetcher(fakeFetcher, 'http://primary', 'http://mirror', initialDelaySeconds=0.05)
+        startTime = time.monotonic()
+        self.assertEqual(b'http://mirror', hedgedFetcher.fetch('http://primary/xml?lat=1').body)
+        self.assertLess(time.monotonic() - startTime, 0.5)
+        self.assertEqual(['http://primary/xml?lat=1', 'http://mirror/xml?lat=1'], fakeFetcher.fetchedUrls)
+        self.assertEqual((1, 1), (hedgedFetcher.hedgeCount, hedgedFetcher.hedgeWinCount))
+        self.assertEqual(threading.get_ident(), fakeFetcher.fetchThreadIdents[0])
+        self.assertEqual([0], list(fakeFetcher.stats.recentLatencies))  # the aborted primary isn't a sample
+
+
+    def testHedgesAreRateLimited(self):
+        fakeFetcher = _FakeFetcher({'http://primary': 0.3, 'http://mirror': 0})
+        rateLimiter = RateLimiter(0.001, burst=1)
+        hedgedFetcher = HedgedFetcher(fakeFetcher, 'http://primary', 'http://mirror', initialDelaySeconds=0.05,
+                                      rateLimiter=rateLimiter)
+        self.assertEqual(b'http://mirror', hedgedFetcher.fetch('http://primary/xml?lat=1').body)  # took the token
+        self.assertEqual(b'http://primary', hedgedFetcher.fetch('http://primary/xml?lat=1').body)  # no token left
+        self.assertEqual((1, 1, 1), (hedgedFetcher.hedgeCount, hedgedFetcher.hedgeWinCount,
+                                     hedgedFetcher.hedgeRateLimitedCount))
+        self.assertEqual(1, rateLimiter.stats()['interactive']['acquired'])
+
+
+    def testOneSchedulerThread(self):
+        fakeFetcher = _FakeFetcher({'http://primary': 0.1, 'http://mirror': 0})
+        hedgedFetcher = HedgedFetcher(fakeFetcher, 'http://primary', 'http://mirror', initialDelaySeconds=0.05)
+        threads = [threading.Thread(target=hedgedFetcher.fetch, args=('http://primary/xml?lat={}'.format(index),))
+                   for index in range(5)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(5, hedgedFetcher.hedgeWinCount)
+        schedulerThread = hedgedFetcher._schedulerThread
+        self.assertTrue(schedulerThread.is_alive())
+        hedgedFetcher.close()
+        schedulerThread.join(1)
+        self.assertFalse(schedulerThread.is_alive())
+
+
+    def testFailedHedgeWaitsForPrimary(self):
+        fakeFetcher = _FakeFetcher({'http://primary': 0.2, 'http://mirror': ConnectionRefusedError()})
+        hedgedFetcher = HedgedFetcher(fakeFetcher, 'http://primary', 'http://mirror', initialDelaySeconds=0.05)
+        self.assertEqual(b'http://primary', hedgedFetcher.fetch('http://primary/xml?lat=1').body)
+        self.assertEqual((1, 0), (hedgedFetcher.hedgeCount, hedgedFetcher.hedgeWinCount))
+
+        fakeFetcher.delaysByBaseUrl['http://primary'] = ConnectionResetError()
+        with self.assertRaises(ConnectionResetError):  # not hedged: it failed rather than being slow
+            hedgedFetcher.fetch('http://primary/xml?lat=1')
+
+
+    def testWeatherSourceIsAbstract(self):
+        with self.assertRaises(TypeError):
+            WeatherSource(Location('01002'))
+        self.assertTrue(issubclass(WeatherGovSource, WeatherSource))
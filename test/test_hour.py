@@ -1,5 +1,7 @@
-import unittest
+import copy
 import datetime
+import pickle
+import unittest
 
 from unittest.mock import patch
 
@@ -193,3 +195,29 @@ class ForecastTestCase(unittest.TestCase):
             self.assertEqual(expHourDes, hour.desirability(Forecast.PARAM_RANGE_STEPS_DEFAULT))
 
 
+    def testImmutable(self):
+        hourDatetime = WeatherGovSource.parseStartValidTime('2015-01-14T07:00:00-05:00')
+        hour = Hour(hourDatetime, 0, 65, 0, 10)
+        self.assertFalse(hasattr(hour, '__dict__'))
+        with self.assertRaises(AttributeError):
+            hour.temp = 70
+        with self.assertRaises(AttributeError):
+            del hour.temp
+        self.assertEqual(65, hour.temp)
+        self.assertEqual(hour, pickle.loads(pickle.dumps(hour)))
+        self.assertEqual(hour, copy.copy(hour))
+
+
+    def testMissingHour(self):
+        hourDatetime = WeatherGovSource.parseStartValidTime('2015-01-14T07:00:00-05:00')
+        missingHour = Hour.missingHour(hourDatetime)
+        self.assertTrue(missingHour.isMissingHour())
+        self.assertIs(missingHour, Hour.missingHour(hourDatetime + datetime.timedelta(0)))  # shared
+        self.assertEqual(Hour(hourDatetime), missingHour)
+
+        # the same instant in another time zone is a different Hour for the calendar
+        utcMissingHour = Hour.missingHour(hourDatetime.astimezone(datetime.timezone.utc))
+        self.assertIsNot(missingHour, utcMissingHour)
+        self.assertEqual(12, utcMissingHour.datetime.hour)
+
+
@@ -0,0 +1,118 @@
+import datetime
+import glob
+import pickle
+import unittest
+import xml.etree.ElementTree as ET
+
+from forecast.Forecast import Forecast
+from forecast.Hour import Hour
+from forecast.HourSeries import HourSeries, numpy
+from forecast.Location import Location
+from forecast.WeatherGovSource import WeatherGovSource
+
+
+class HourSeriesTestCase(unittest.TestCase):
+    """
+    """
+
+
+    def setUp(self):
+        self.startDatetime = datetime.datetime(2015, 1, 13, 19, tzinfo=datetime.timezone(datetime.timedelta(hours=-5)))
+        self.hours = [Hour(self.startDatetime, 0, 10, 3, None),
+                      Hour(self.startDatetime + datetime.timedelta(hours=1), 20, 60, 9, 50),
+                      Hour(self.startDatetime + datetime.timedelta(hours=2), 5, 70, 2, 10),
+                      Hour(self.startDatetime + datetime.timedelta(hours=3), 50, -20, 40, 100)]
+
+
+    def testSequence(self):
+        hourSeries = HourSeries.fromHours(self.hours)
+        self.assertEqual(4, len(hourSeries))
+        self.assertEqual(self.hours, hourSeries)
+        self.assertEqual(self.hours, list(hourSeries))
+        self.assertEqual(self.hours[-1], hourSeries[-1])
+        self.assertIsNone(hourSeries[0].clouds)
+        self.assertIsInstance(hourSeries[1].temp, int)
+        with self.assertRaises(IndexError):
+            hourSeries[4]
+
+        sliceSeries = hourSeries[1:3]
+        self.assertIsInstance(sliceSeries, HourSeries)
+        self.assertEqual(self.hours[1:3], sliceSeries)
+        self.assertEqual(self.hours[1], sliceSeries[0])
+        self.assertEqual(self.hours[::2], hourSeries[::2])
+        self.assertEqual(0, len(hourSeries[10:]))
+
+        self.assertEqual(hourSeries, pickle.loads(pickle.dumps(hourSeries)))
+        self.assertIs(hourSeries, HourSeries.fromHours(hourSeries))
+
+
+    def testBadHours(self):
+        with self.assertRaises(ValueError):  # gap
+            HourSeries.fromHours([self.hours[0], self.hours[2]])
+        with self.assertRaises(ValueError):  # too big for int8
+            HourSeries.fromValues(self.startDatetime, [200], [10], [3], [0])
+        with self.assertRaises(ValueError):
+            HourSeries.fromValues(self.startDatetime, [0, 0], [10], [3], [0])
+
+
+    def testFromHoursWithGaps(self):
+        oneHour = datetime.timedelta(hours=1)
+        utc = datetime.timezone.utc
+        hoursWithGaps = [Hour(self.startDatetime, 0, 10, 3, None),
+                         Hour(self.startDatetime + (oneHour * 3), 20, 60, 9, 50),
+                         Hour(self.startDatetime + (oneHour * 3.5), 1, 1, 1, 1),  # not on the hour: ignored
+                         Hour((self.startDatetime + (oneHour * 5)).astimezone(utc), 5, 70, 2, 10)]  # another tz
+        hourSeries = HourSeries.fromHoursWithGaps(hoursWithGaps)
+        expValues = [(0, 10, 3, None)] * 3 + [(20, 60, 9, 50)] * 2 + [(5, 70, 2, 10)]
+        self.assertEqual([Hour(self.startDatetime + (oneHour * index), *values)
+                          for index, values in enumerate(expValues)], hourSeries)
+        self.assertEqual(self.startDatetime.utcoffset(), hourSeries[-1].datetime.utcoffset())  # normalized
+        self.assertEqual(0, len(HourSeries.fromHoursWithGaps([])))
+
+
+    def testCssClasses(self):
+        # every combination of desirabilities rates the same as Hour does it
+        values = [-10, 0, 9, 10, 11, 29, 30, 35, 58, 59, 88, 89, 99, 100, 120]
+        hours = []
+        for precip in values:
+            for temp in values:
+                for wind in values:
+                    hours.append(Hour(self.startDatetime + datetime.timedelta(hours=len(hours)), precip, temp, wind,
+                                      50))
+        for params in [(None, 10, 3, 0), (0, None, 3, 0), (0, 10, None, 0)]:  # missing hours
+            hours.append(Hour(self.startDatetime + datetime.timedelta(hours=len(hours)), *params))
+        rangeDict = Forecast.PARAM_RANGE_STEPS_DEFAULT
+        expCssClasses = [hour.cssClassForDesirability(rangeDict) for hour in hours]
+        expDesirabilities = [hour.desirability(rangeDict) for hour in hours]
+
+        hourSeries = HourSeries.fromHours(hours, useNumpy=False)
+        self.assertEqual(expCssClasses, hourSeries.cssClasses(rangeDict))
+        self.assertEqual(expDesirabilities, hourSeries.desirabilities(rangeDict))
+        if numpy is not None:
+            hourSeries = HourSeries.fromHours(hours, useNumpy=True)
+            self.assertEqual(expCssClasses, hourSeries.cssClasses(rangeDict))
+            self.assertEqual(expDesirabilities, hourSeries.desirabilities(rangeDict))
+
+
+    @unittest.skipIf(numpy is not None, "numpy is installed")
+    def testNoNumpy(self):
+        with self.assertRaises(ValueError):
+            HourSeries.fromHours(self.hours, useNumpy=True)
+
+
+    def testCssClassesAsCalendarRows(self):
+        for xmlFileName in glob.glob('test/test-*.xml'):
+            if 'error' in xmlFileName:
+                continue
+
+            forecast = Forecast.__new__(Forecast)  # i.e., without fetching
+            forecast.rangeDict = Forecast.PARAM_RANGE_STEPS_DEFAULT
+            forecast.source = WeatherGovSource(Location('01002'), None, elementTree=ET.parse(xmlFileName))
+            self.assertIsInstance(forecast.source.hours, HourSeries)
+            self.assertEqual([[hour.cssClassForDesirability(forecast.rangeDict) for hour in hourRow]
+                              for hourRow in forecast.hoursAsCalendarRows()],
+                             forecast.cssClassesAsCalendarRows(), xmlFileName)
+
+
+if __name__ == '__main__':
+    unittest.main()
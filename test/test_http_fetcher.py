@@ -0,0 +1,106 @@
+import gzip
+import http.server
+import socket
+import threading
+import time
+import unittest
+
+from forecast.HttpFetcher import FetchAbortedError, HttpFetcher
+
+
+class _GzipHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive
+    body = b'<dwml>' + (b'<data/>' * 1000) + b'</dwml>'
+
+
+    def do_GET(self):
+        if 'slow' in self.path:
+            time.sleep(2)
+        isGzip = 'gzip' in self.headers.get('Accept-Encoding', '')
+        body = gzip.compress(self.body) if isGzip else self.body
+        self.send_response(200)
+        if isGzip:
+            self.send_header('Content-Encoding', 'gzip')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+    def log_message(self, format, *args):
+        pass
+
+
+class HttpFetcherTestCase(unittest.TestCase):
+    """
+    """
+
+
+    def setUp(self):
+        self.server = http.server.ThreadingHTTPServer(('127.0.0.1', 0), _GzipHandler)
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        self.url = 'http://127.0.0.1:{}/xml?lat=1&lon=2'.format(self.server.server_address[1])
+
+
+    def tearDown(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+    def testGzipAndKeepAlive(self):
+        fetcher = HttpFetcher()
+        for _ in range(3):
+            fetchResponse = fetcher.fetch(self.url)
+            self.assertEqual(200, fetchResponse.status)
+            self.assertEqual(_GzipHandler.body, fetchResponse.body)
+            self.assertEqual('gzip', fetchResponse.headers['content-encoding'])
+        fetcher.close()
+
+        stats = fetcher.stats.asDict()
+        self.assertEqual(3, stats['fetches'])
+        self.assertEqual(1, stats['newConnections'])
+        self.assertEqual(2, stats['reusedConnections'])
+        self.assertLess(stats['wireBytes'], stats['bodyBytes'])
+        self.assertIsNotNone(fetcher.stats.percentile(95))
+
+
+    def testRetriesClosedKeepAliveConnection(self):
+        fetcher = HttpFetcher()
+        fetcher.fetch(self.url)
+        poolKey = ('http', '127.0.0.1', self.server.server_address[1])
+        fetcher._idleConnections[poolKey][0].sock.shutdown(socket.SHUT_RDWR)  # as if the server timed it out
+        self.assertEqual(_GzipHandler.body, fetcher.fetch(self.url).body)
+
+
+    def testConnectionErrorIsCounted(self):
+        fetcher = HttpFetcher(connectTimeout=1)
+        self.server.shutdown()
+        self.server.server_close()
+        with self.assertRaises(OSError):
+            fetcher.fetch(self.url)
+        self.assertEqual(1, fetcher.stats.errorCount)
+        self.assertEqual(0, len(fetcher.stats.recentLatencies))  # only successes are latency samples
+
+
+    def testAbort(self):
+        fetcher = HttpFetcher()
+        results = []
+
+
+        def fetchSlowly():
+            try:
+                results.append(fetcher.fetch(self.url + '&slow=1'))
+            except FetchAbortedError as ex:
+                results.append(ex)
+
+
+        fetchThread = threading.Thread(target=fetchSlowly)
+        startTime = time.monotonic()
+        fetchThread.start()
+        time.sleep(0.2)
+        fetcher.abort(fetchThread.ident)
+        fetchThread.join()
+        self.assertIsInstance(results[0], FetchAbortedError)
+        self.assertLess(time.monotonic() - startTime, 1)
+        self.assertEqual(_GzipHandler.body, fetcher.fetch(self.url).body)  # the aborted connection wasn't pooled
+        fetcher.abort(threading.get_ident())  # nothing in flight: no-op
+        self.assertEqual(_GzipHandler.body, fetcher.fetch(self.url).body)
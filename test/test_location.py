@@ -29,6 +29,9 @@ class LocationTestCase(unittest.TestCase):
         self.assertEqual(latLonZipName[2], location.zipcode)
         self.assertEqual(latLonZipName[3], location.name)
 
+        with self.assertRaisesRegex(ValueError, "couldn't find zipcode: 00000"):
+            Location('00000')
+
 
     def testZipCodeUtil(self):
         query = 'barro'
@@ -0,0 +1,66 @@
+import unittest
+from unittest.mock import patch, Mock
+
+from forecast.ForecastCache import ForecastCache
+from forecast.HttpFetcher import FetchResponse
+from forecast.Location import Location
+from forecast.NegativeCache import NegativeCache
+from forecast.UpstreamError import UpstreamError
+from forecast.WeatherGovSource import WeatherGovSource
+
+
+class NegativeCacheTestCase(unittest.TestCase):
+    """
+    """
+
+
+    def setUp(self):
+        self.now = 1000.0
+
+
+    def testTtlAndMaxEntries(self):
+        negativeCache = NegativeCache(ttlSeconds=60, maxEntries=2, clock=lambda: self.now)
+        negativeCache.put('k1', 'no data for k1')
+        self.assertEqual('no data for k1', negativeCache.get('k1'))
+        self.now += 60
+        self.assertIsNone(negativeCache.get('k1'))
+        self.assertEqual(0, len(negativeCache))
+
+        for key in ['k1', 'k2', 'k3']:
+            negativeCache.put(key, key)
+        self.assertIsNone(negativeCache.get('k1'))  # oldest forgotten first
+        self.assertEqual('k3', negativeCache.get('k3'))
+        self.assertEqual({'entries': 2, 'hits': 2}, negativeCache.stats())
+
+
+    def testWeatherGovSourceRemembersErrorDocument(self):
+        with open('test/test-forecast-error-response.xml', 'rb') as xmlFile:
+            body = xmlFile.read()
+        mockFetcher = Mock()
+        mockFetcher.fetch.side_effect = lambda url, **kwargs: FetchResponse(url, 200, {}, body, 0.1)
+        negativeCache = NegativeCache(ttlSeconds=60, clock=lambda: self.now)
+        location = Location(['24.859832', '-168.021815'])
+        with patch.object(WeatherGovSource, 'forecastCache', ForecastCache()), \
+                patch.object(WeatherGovSource, 'fetcher', mockFetcher), \
+                patch.object(WeatherGovSource, 'negativeCache', negativeCache):
+            for _ in range(3):
+                with self.assertRaisesRegex(ValueError, "No data were found"):
+                    WeatherGovSource(location, None)
+            self.assertEqual(1, mockFetcher.fetch.call_count)
+
+            self.now += 60  # forgotten, so ask again
+            with self.assertRaisesRegex(ValueError, "No data were found"):
+                WeatherGovSource(location, None)
+            self.assertEqual(2, mockFetcher.fetch.call_count)
+
+
+    def testServerErrorsAreNotRemembered(self):
+        mockFetcher = Mock()
+        mockFetcher.fetch.side_effect = lambda url, **kwargs: FetchResponse(url, 500, {}, b'', 0.1)
+        negativeCache = NegativeCache()
+        with patch.object(WeatherGovSource, 'forecastCache', ForecastCache()), \
+                patch.object(WeatherGovSource, 'fetcher', mockFetcher), \
+                patch.object(WeatherGovSource, 'negativeCache', negativeCache):
+            with self.assertRaisesRegex(UpstreamError, "HTTP status 500"):
+                WeatherGovSource(Location('01002'), None)
+        self.assertEqual(0, len(negativeCache))
@@ -0,0 +1,120 @@
+import datetime
+import unittest
+import urllib.parse
+from unittest.mock import patch, Mock
+
+from forecast.CircuitBreaker import CircuitBreaker
+from forecast.ForecastCache import ForecastCache, CacheEntry
+from forecast.Hour import Hour
+from forecast.HttpFetcher import FetchResponse
+from forecast.Location import Location
+from forecast.NegativeCache import NegativeCache
+from forecast.PeerRouter import PeerRouter
+from forecast.WeatherGovSource import WeatherGovSource
+
+
+class _AppFetcher(object):
+    """
+    Sends peer requests to this process's Flask app, which plays the owner node.
+    """
+
+
+    def __init__(self):
+        from app import app
+
+        self.client = app.test_client()
+        self.urls = []
+
+
+    def fetch(self, url, headers=None, timeout=None):
+        self.urls.append(url)
+        splitUrl = urllib.parse.urlsplit(url)
+        response = self.client.get(urllib.parse.unquote(splitUrl.path), query_string=splitUrl.query)
+        return FetchResponse(url, response.status_code, {}, response.get_data(), 0.01)
+
+
+class PeerRouterTestCase(unittest.TestCase):
+    """
+    """
+
+
+    def setUp(self):
+        self.location = Location('01002')
+        nodeUrls = ['http://10.0.0.1:8000', 'http://10.0.0.2:8000']
+        ownerUrl = PeerRouter(nodeUrls[0], nodeUrls).ownerForLocation(self.location)
+        self.nodeUrl = nodeUrls[1] if ownerUrl == nodeUrls[0] else nodeUrls[0]  # i.e., not the owner
+        self.appFetcher = _AppFetcher()
+        self.peerRouter = PeerRouter(self.nodeUrl, nodeUrls, fetcher=self.appFetcher)
+
+        with open('test/test-forecast-data.xml', 'rb') as xmlFile:
+            body = xmlFile.read()
+        self.upstreamFetcher = Mock()
+        self.upstreamFetcher.fetch.side_effect = lambda url, **kwargs: FetchResponse(url, 200, {}, body, 0.1)
+        self.patchers = [patch.object(WeatherGovSource, 'forecastCache', ForecastCache()),
+                         patch.object(WeatherGovSource, 'negativeCache', NegativeCache()),
+                         patch.object(WeatherGovSource, 'fetcher', self.upstreamFetcher)]
+        for patcher in self.patchers:
+            patcher.start()
+
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+
+
+    def testJsonRoundTrip(self):
+        tz = datetime.timezone(datetime.timedelta(hours=-5))
+        hours = [Hour(datetime.datetime(2015, 1, 13, 19, 0, tzinfo=tz), 0, 10, 3, 50),
+                 Hour(datetime.datetime(2015, 1, 13, 20, 0, tzinfo=tz), 0, 9, 3, None)]
+        cacheEntry = CacheEntry(hours, datetime.datetime(2015, 1, 13, 23, 44, tzinfo=datetime.timezone.utc), 3600,
+                                1000.0, etag='"v1"')
+        cacheEntry2, isStale = PeerRouter.cacheEntryFromJson(PeerRouter.cacheEntryToJson(cacheEntry, True))
+        self.assertEqual(hours, cacheEntry2.hours)
+        self.assertEqual([50, None], [hour.clouds for hour in cacheEntry2.hours])  # Hour.__eq__() ignores clouds
+        self.assertEqual(cacheEntry.creationDate, cacheEntry2.creationDate)
+        self.assertEqual((3600, 1000.0, True), (cacheEntry2.refreshSeconds, cacheEntry2.fetchedAt, isStale))
+
+
+    def testNonOwnerGetsForecastFromOwner(self):
+        self.assertFalse(self.peerRouter.isOwner(self.location))
+        with patch.object(WeatherGovSource, 'peerRouter', self.peerRouter):
+            wgSource = WeatherGovSource(self.location, None, numDays=3)
+        self.assertEqual(1, self.upstreamFetcher.fetch.call_count)  # by the owner
+        self.assertEqual(['{}/peer/cache-entry/{}%7C{}?days=3'.format(
+            self.peerRouter.ownerForLocation(self.location), self.location.latitude, self.location.longitude)],
+            self.appFetcher.urls)
+        self.assertEqual(WeatherGovSource(self.location, None, numDays=3).hours, wgSource.hours)  # owner's cache
+        self.assertEqual(1, self.upstreamFetcher.fetch.call_count)
+        self.assertEqual(1, self.peerRouter.stats()['forwardCount'])
+
+
+    def testOwnerErrorsAreRaised(self):
+        self.upstreamFetcher.fetch.side_effect = lambda url, **kwargs: FetchResponse(
+            url, 200, {}, open('test/test-forecast-error-response.xml', 'rb').read(), 0.1)
+        with patch.object(WeatherGovSource, 'peerRouter', self.peerRouter):
+            with self.assertRaisesRegex(ValueError, "No data were found"):
+                WeatherGovSource(self.location, None)
+
+
+    def testOwnerUpstreamErrorFallsBack(self):
+        # weather.gov fails the owner's request but not ours. the location isn't bad, so we make the forecast ourselves
+        with open('test/test-forecast-data.xml', 'rb') as xmlFile:
+            body = xmlFile.read()
+        fetchResponses = [FetchResponse('', 503, {}, b'', 0.1), FetchResponse('', 200, {}, body, 0.1)]
+        self.upstreamFetcher.fetch.side_effect = lambda url, **kwargs: fetchResponses.pop(0)
+        with patch.object(WeatherGovSource, 'peerRouter', self.peerRouter), \
+                patch.object(WeatherGovSource, 'circuitBreaker', CircuitBreaker()):
+            wgSource = WeatherGovSource(self.location, None)
+        self.assertTrue(wgSource.hours)
+        self.assertEqual(2, self.upstreamFetcher.fetch.call_count)  # by the owner, then by us
+        self.assertEqual(1, self.peerRouter.stats()['fallbackCount'])
+        self.assertIsNone(WeatherGovSource.negativeCache.get(self.location.key()))
+
+
+    def testUnreachableOwnerFallsBack(self):
+        self.appFetcher.fetch = Mock(side_effect=ConnectionRefusedError())
+        with patch.object(WeatherGovSource, 'peerRouter', self.peerRouter):
+            wgSource = WeatherGovSource(self.location, None)
+        self.assertTrue(wgSource.hours)
+        self.assertEqual(1, self.upstreamFetcher.fetch.call_count)  # by us
+        self.assertEqual(1, self.peerRouter.stats()['fallbackCount'])
@@ -0,0 +1,74 @@
+import random
+import unittest
+
+from forecast.PopularityTracker import PopularityTracker
+
+
+class PopularityTrackerTestCase(unittest.TestCase):
+    """
+    """
+
+
+    def setUp(self):
+        self.now = 1000.0
+
+
+    def clock(self):
+        return self.now
+
+
+    def testCountsAndTopK(self):
+        tracker = PopularityTracker(halfLifeSeconds=60, topCapacity=3, clock=self.clock)
+        for key, numRequests in [('a', 10), ('b', 5), ('c', 1), ('d', 7)]:
+            for _ in range(numRequests):
+                tracker.record(key)
+        self.assertAlmostEqual(10, tracker.count('a'))
+        self.assertEqual(0, tracker.count('never seen'))
+        self.assertEqual(['a', 'd', 'b'], tracker.topKeys())  # 'c' was pushed out by 'd'
+        self.assertEqual(['a'], tracker.topKeys(1))
+        self.assertEqual(3, len(tracker))
+
+        # counts halve every half-life
+        self.now += 60
+        key, count, ratePerSecond = tracker.topK(1)[0]
+        self.assertEqual('a', key)
+        self.assertAlmostEqual(5, count)
+        self.assertAlmostEqual(5 * 0.6931471805599453 / 60, ratePerSecond)
+
+        # newer traffic overtakes older traffic
+        self.now += 600
+        for _ in range(2):
+            tracker.record('b')
+        self.assertEqual('b', tracker.topKeys(1)[0])
+
+
+    def testRateEstimate(self):
+        tracker = PopularityTracker(halfLifeSeconds=60, clock=self.clock)
+        for _ in range(3000):  # 2 requests/second for 25 minutes
+            tracker.record('hot')
+            self.now += 0.5
+        self.assertAlmostEqual(2, tracker.topK(1)[0][2], delta=0.05)
+
+
+    def testRescale(self):
+        tracker = PopularityTracker(halfLifeSeconds=1, clock=self.clock)
+        tracker.record('a')
+        self.now += 600  # weight 2 ** 600 is past MAX_WEIGHT
+        tracker.record('b')
+        tracker.record('b')
+        self.assertAlmostEqual(2, tracker.count('b'))
+        self.assertEqual(['b', 'a'], tracker.topKeys())
+
+
+    def testBoundedMemoryAndAccuracy(self):
+        tracker = PopularityTracker(width=512, depth=4, topCapacity=20, clock=self.clock)
+        rand = random.Random(0)
+        hotKeys = [('hot', index) for index in range(5)]
+        for index in range(20000):
+            tracker.record(rand.choice(hotKeys) if index % 4 == 0 else ('cold', index))
+        self.assertEqual(20, len(tracker))
+        self.assertEqual(set(hotKeys), set(tracker.topKeys(5)))
+        for key in hotKeys:
+            self.assertGreaterEqual(tracker.count(key), 900)  # never underestimated, and ~1000 each
+        self.assertEqual({'width': 512, 'depth': 4, 'halfLifeSeconds': 3600, 'recordCount': 20000, 'trackedKeys': 20},
+                         tracker.stats())
@@ -0,0 +1,97 @@
+import datetime
+import os
+import shutil
+import tempfile
+import unittest
+
+from forecast.ForecastCache import ForecastCache, CacheEntry
+from forecast.Location import Location
+from forecast.PopularityTracker import PopularityTracker
+from forecast.PrefetchScheduler import PrefetchScheduler
+from forecast.SharedForecastCache import SharedForecastCache
+
+
+class _FakeSource(object):
+    forecastCache = None
+    peerRouter = None
+    refreshedLocations = []
+
+
+    def __init__(self, location, rangeDict, refresh=False):
+        if location.zipcode == '99723':
+            raise ValueError("no data")
+
+        _FakeSource.refreshedLocations.append((location.key(), refresh))
+
+
+class PrefetchSchedulerTestCase(unittest.TestCase):
+    """
+    """
+
+
+    def setUp(self):
+        _FakeSource.forecastCache = ForecastCache()
+        _FakeSource.refreshedLocations = []
+
+
+    def testRunOnceRefreshesConfiguredAndLearned(self):
+        _FakeSource.forecastCache.put(('1.0', '2.0'), CacheEntry([]))
+        _FakeSource.forecastCache.put(Location('01002').key(), CacheEntry([]))  # configured and learned
+        scheduler = PrefetchScheduler.fromConfigString('01002, 99723', jitterSeconds=0, sourceClass=_FakeSource)
+        self.assertEqual([Location('01002').key(), Location('99723').key(), ('1.0', '2.0')],
+                         [location.key() for location in scheduler.hotLocations()])
+
+        scheduler.runOnce()
+        self.assertEqual({(Location('01002').key(), True), (('1.0', '2.0'), True)},
+                         set(_FakeSource.refreshedLocations))
+        self.assertEqual(2, scheduler.refreshCount)
+        self.assertEqual(1, scheduler.errorCount)
+
+
+    def testLearnsFromPopularityTracker(self):
+        _FakeSource.forecastCache.put(('1.0', '2.0'), CacheEntry([]))  # recently used but not popular
+        popularityTracker = PopularityTracker()
+        for key in [('3.0', '4.0'), ('5.0', '6.0'), ('5.0', '6.0')]:
+            popularityTracker.record(key)
+        scheduler = PrefetchScheduler([Location('01002')], learnedCount=2, popularityTracker=popularityTracker,
+                                      sourceClass=_FakeSource)
+        self.assertEqual([Location('01002').key(), ('5.0', '6.0'), ('3.0', '4.0')],
+                         [location.key() for location in scheduler.hotLocations()])
+
+
+    def testOneLeaderPerSharedCache(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        now = 1000.0
+        sharedCache = SharedForecastCache(os.path.join(directory, 'forecasts.sqlite'), clock=lambda: now)
+        scheduler1, scheduler2 = [PrefetchScheduler(issuanceOffsetSeconds=0, jitterSeconds=0, sharedCache=sharedCache,
+                                                    sourceClass=_FakeSource) for _ in range(2)]
+        self.assertTrue(scheduler1.isLeader())
+        self.assertFalse(scheduler2.isLeader())
+        now += 60 * 60
+        self.assertTrue(scheduler1.isLeader())  # renewed each cycle
+        self.assertFalse(scheduler2.isLeader())
+
+        now += 2 * 60 * 60  # scheduler1 stopped renewing
+        self.assertTrue(scheduler2.isLeader())
+        self.assertFalse(scheduler1.isLeader())
+        self.assertTrue(PrefetchScheduler(sourceClass=_FakeSource).isLeader())  # no sharedCache: every process
+
+
+    def testSecondsUntilNextRun(self):
+        # no cached creation dates -> top of the hour plus the offset
+        now = datetime.datetime(2015, 1, 13, 23, 44, tzinfo=datetime.timezone.utc).timestamp()
+        scheduler = PrefetchScheduler(issuanceOffsetSeconds=5 * 60, jitterSeconds=0, sourceClass=_FakeSource,
+                                      clock=lambda: now)
+        self.assertEqual(21 * 60, scheduler.secondsUntilNextRun())
+
+        # phased to the latest creation date: 23:20 + 1h + 5m = 00:25
+        creationDate = datetime.datetime(2015, 1, 13, 23, 20, tzinfo=datetime.timezone.utc)
+        _FakeSource.forecastCache.put(('1.0', '2.0'), CacheEntry([], creationDate, 60 * 60))
+        scheduler = PrefetchScheduler(issuanceOffsetSeconds=5 * 60, jitterSeconds=0, sourceClass=_FakeSource,
+                                      clock=lambda: now)
+        self.assertEqual(41 * 60, scheduler.secondsUntilNextRun())
+
+        # still within the current issuance's offset: 23:22 -> 23:25
+        scheduler.clock = lambda: creationDate.timestamp() + (2 * 60)
+        self.assertEqual(3 * 60, scheduler.secondsUntilNextRun())
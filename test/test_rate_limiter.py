@@ -0,0 +1,101 @@
+import asyncio
+import threading
+import time
+import unittest
+from unittest.mock import patch
+
+from forecast.CircuitBreaker import CircuitBreaker
+from forecast.RateLimiter import RateLimiter, RateLimitedError
+from forecast.WeatherGovSource import WeatherGovSource
+
+
+class RateLimiterTestCase(unittest.TestCase):
+    """
+    """
+
+
+    def testBurstThenRate(self):
+        rateLimiter = RateLimiter(20, burst=2)
+        startTime = time.monotonic()
+        for _ in range(4):
+            self.assertTrue(rateLimiter.acquire())
+        elapsedSeconds = time.monotonic() - startTime
+        self.assertGreaterEqual(elapsedSeconds, 0.09)  # two from the bucket, then two more at 20/s
+        self.assertLess(elapsedSeconds, 1)
+
+        stats = rateLimiter.stats()
+        self.assertEqual(4, stats['interactive']['acquired'])
+        self.assertEqual(0, stats['interactive']['queueDepth'])
+        self.assertGreater(stats['interactive']['p95WaitSeconds'], 0)
+
+
+    def testInteractiveGoesFirst(self):
+        rateLimiter = RateLimiter(5, burst=1)
+        rateLimiter.acquire()  # empty the bucket
+        order = []
+        backgroundThread = threading.Thread(
+            target=lambda: order.append(rateLimiter.acquire(RateLimiter.BACKGROUND) and 'background'))
+        backgroundThread.start()
+        while rateLimiter.queueDepth() < 1:
+            time.sleep(0.001)
+        interactiveThread = threading.Thread(
+            target=lambda: order.append(rateLimiter.acquire(RateLimiter.INTERACTIVE) and 'interactive'))
+        interactiveThread.start()
+        while rateLimiter.queueDepth() < 2:
+            time.sleep(0.001)
+        self.assertEqual(1, rateLimiter.queueDepth(RateLimiter.BACKGROUND))
+
+        backgroundThread.join()
+        interactiveThread.join()
+        self.assertEqual(['interactive', 'background'], order)  # even though background was queued first
+
+
+    def testAcquireAsync(self):
+        # async waiters queue with threaded ones, by priority, without blocking the event loop
+        rateLimiter = RateLimiter(10, burst=1)
+        rateLimiter.acquire()  # empty the bucket
+        order = []
+        backgroundThread = threading.Thread(
+            target=lambda: order.append(rateLimiter.acquire(RateLimiter.BACKGROUND) and 'background'))
+        backgroundThread.start()
+        while rateLimiter.queueDepth() < 1:
+            time.sleep(0.001)
+
+
+        async def acquireInteractive():
+            ticks = [0]
+
+
+            async def tick():
+                while True:
+                    ticks[0] += 1
+                    await asyncio.sleep(0.005)
+
+
+            ticker = asyncio.ensure_future(tick())
+            order.append(await rateLimiter.acquireAsync(RateLimiter.INTERACTIVE) and 'interactive')
+            timedOut = await rateLimiter.acquireAsync(RateLimiter.INTERACTIVE, timeout=0.01)
+            ticker.cancel()
+            return ticks[0], timedOut
+
+
+        numTicks, timedOut = asyncio.run(acquireInteractive())
+        backgroundThread.join()
+        self.assertEqual(['interactive', 'background'], order)
+        self.assertGreater(numTicks, 1)  # the loop kept running while we waited
+        self.assertFalse(timedOut)
+        self.assertEqual(0, rateLimiter.queueDepth())
+
+
+    def testTimeout(self):
+        rateLimiter = RateLimiter(1, burst=1)
+        rateLimiter.acquire()
+        self.assertFalse(rateLimiter.acquire(timeout=0.05))
+        self.assertEqual(1, rateLimiter.stats()['interactive']['timeouts'])
+        self.assertEqual(0, rateLimiter.queueDepth())
+
+        with patch.object(WeatherGovSource, 'rateLimiter', rateLimiter), \
+                patch.object(WeatherGovSource, 'latencyBudgetSeconds', 0.05), \
+                patch.object(WeatherGovSource, 'circuitBreaker', CircuitBreaker()):
+            with self.assertRaises(RateLimitedError):
+                WeatherGovSource.fetchUrl('http://127.0.0.1:1/never-fetched')
@@ -0,0 +1,101 @@
+import multiprocessing
+import os
+import shutil
+import tempfile
+import unittest
+from unittest.mock import patch, Mock
+
+from forecast.ForecastCache import ForecastCache, CacheEntry
+from forecast.HttpFetcher import FetchResponse
+from forecast.Location import Location
+from forecast.SharedForecastCache import SharedForecastCache
+from forecast.WeatherGovSource import WeatherGovSource
+
+
+def _getInChildProcess(path, key, resultQueue):
+    sharedCache = SharedForecastCache(path)
+    cacheEntry = sharedCache.get(key)
+    with sharedCache.connection() as connection:
+        sharedCache.flush(connection)  # the process exits before it's due
+    resultQueue.put(cacheEntry.etag if cacheEntry else None)
+
+
+class SharedForecastCacheTestCase(unittest.TestCase):
+    """
+    """
+
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.path = os.path.join(self.directory, 'forecasts.sqlite')
+        self.now = 1000.0
+
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+
+    def makeEntry(self, etag, expiresAt):
+        cacheEntry = CacheEntry([], fetchedAt=self.now, etag=etag)
+        cacheEntry.expiresAt = expiresAt
+        return cacheEntry
+
+
+    def testGetPutAndSharedCounters(self):
+        worker1 = SharedForecastCache(self.path, clock=lambda: self.now)
+        worker2 = SharedForecastCache(self.path, clock=lambda: self.now)
+        key = ('42.37', '-72.51')
+        self.assertIsNone(worker1.get(key))
+
+        worker1.put(key, self.makeEntry('"v1"', self.now + 60))
+        cacheEntry = worker2.get(key)
+        self.assertEqual([], cacheEntry.hours)
+        self.assertEqual('"v1"', cacheEntry.etag)
+        self.assertEqual(self.now, cacheEntry.fetchedAt)
+        self.assertEqual(0, worker1.stats()['hits'])  # worker2 hasn't flushed its hit yet
+
+        self.now += 60  # expired, and worker2's flush is due
+        self.assertIsNone(worker2.get(key))
+        self.assertEqual({'hits': 1, 'misses': 2, 'evictions': 0, 'entries': 1, 'pendingFetchRequests': 0}, {
+            name: value for name, value in worker1.stats().items() if name != 'bytes'})
+
+
+    def testLruEviction(self):
+        sharedCache = SharedForecastCache(self.path, maxEntries=2, clock=lambda: self.now)
+        for index in range(3):
+            self.now += 1
+            sharedCache.put(('k', index), self.makeEntry(str(index), self.now + 60))
+            if index == 1:
+                self.now += 1
+                sharedCache.get(('k', 0))  # now 1 is least recently used
+        self.assertIsNotNone(sharedCache.get(('k', 0)))
+        self.assertIsNone(sharedCache.get(('k', 1)))
+        self.assertEqual(1, sharedCache.stats()['evictions'])
+
+
+    def testSharedAcrossProcesses(self):
+        sharedCache = SharedForecastCache(self.path)
+        sharedCache.put(('42.37', '-72.51'), self.makeEntry('"v1"', float('inf')))
+        resultQueue = multiprocessing.Queue()
+        process = multiprocessing.Process(target=_getInChildProcess, args=(self.path, ('42.37', '-72.51'), resultQueue))
+        process.start()
+        process.join(10)
+        self.assertEqual('"v1"', resultQueue.get(timeout=1))
+        self.assertEqual(1, sharedCache.stats()['hits'])
+
+
+    def testWeatherGovSourceUsesSharedCache(self):
+        with open('test/test-forecast-data.xml', 'rb') as xmlFile:
+            body = xmlFile.read()
+        mockFetcher = Mock()
+        mockFetcher.fetch.side_effect = lambda url, **kwargs: FetchResponse(url, 200, {}, body, 0.1)
+        sharedCache = SharedForecastCache(self.path)
+        location = Location('01002')
+        with patch.object(WeatherGovSource, 'fetcher', mockFetcher), \
+                patch.object(WeatherGovSource, 'sharedCache', sharedCache):
+            with patch.object(WeatherGovSource, 'forecastCache', ForecastCache(clock=lambda: 0)):  # worker 1
+                fetchedHours = WeatherGovSource(location, None).hours
+            with patch.object(WeatherGovSource, 'forecastCache', ForecastCache(clock=lambda: 0)):  # worker 2
+                sharedHours = WeatherGovSource(location, None).hours
+        self.assertEqual(1, mockFetcher.fetch.call_count)
+        self.assertEqual([hour.datetime for hour in fetchedHours], [hour.datetime for hour in sharedHours])
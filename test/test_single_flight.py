@@ -0,0 +1,79 @@
+import threading
+import unittest
+
+from forecast.SingleFlight import SingleFlight
+
+
+class SingleFlightTestCase(unittest.TestCase):
+    """
+    """
+
+
+    def testConcurrentCallsShareOneResult(self):
+        singleFlight = SingleFlight()
+        releaseEvent = threading.Event()
+        callCount = []
+
+
+        def slowFunction():
+            callCount.append(1)
+            releaseEvent.wait(5)
+            return 'result'
+
+
+        results = []
+        threads = [threading.Thread(target=lambda: results.append(singleFlight.do('k', slowFunction)))
+                   for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        while singleFlight.coalescedCount < 4:  # wait for the followers to queue up behind the leader
+            threading.Event().wait(0.01)
+        releaseEvent.set()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual(1, len(callCount))
+        self.assertEqual(['result'] * 5, results)
+        self.assertFalse(singleFlight.isInFlight('k'))
+
+
+    def testExceptionIsShared(self):
+        singleFlight = SingleFlight()
+        releaseEvent = threading.Event()
+        callCount = []
+
+
+        def failingFunction():
+            callCount.append(1)
+            releaseEvent.wait(5)
+            raise ValueError("bad location")
+
+
+        def callAndKeepException():
+            try:
+                singleFlight.do('k', failingFunction)
+            except ValueError as ex:
+                exceptions.append(ex)
+
+
+        exceptions = []
+        leaderThread = threading.Thread(target=callAndKeepException)
+        leaderThread.start()
+        while not callCount:  # wait for the leader to be in the function
+            threading.Event().wait(0.01)
+        followerThread = threading.Thread(target=callAndKeepException)
+        followerThread.start()
+        while singleFlight.coalescedCount < 1:  # wait for the follower to queue up behind the leader
+            threading.Event().wait(0.01)
+        releaseEvent.set()
+        leaderThread.join()
+        followerThread.join()
+
+        self.assertEqual(1, len(callCount))
+        self.assertEqual(2, len(exceptions))
+        self.assertIs(exceptions[0], exceptions[1])
+        self.assertEqual("bad location", exceptions[0].args[0])
+
+        # nothing is remembered after the call finishes
+        self.assertEqual('ok', singleFlight.do('k', lambda: 'ok'))
+        self.assertEqual(2, singleFlight.leaderCount)
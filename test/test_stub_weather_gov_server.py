@@ -0,0 +1,80 @@
+import unittest
+import xml.etree.ElementTree as ET
+from unittest.mock import patch
+
+from forecast.BatchFetcher import BatchFetcher
+from forecast.CircuitBreaker import CircuitBreaker
+from forecast.ForecastCache import ForecastCache
+from forecast.HttpFetcher import HttpFetcher
+from forecast.Location import Location
+from forecast.NegativeCache import NegativeCache
+from forecast.StubWeatherGovServer import StubWeatherGovServer
+from forecast.UpstreamError import UpstreamError
+from forecast.WeatherGovSource import WeatherGovSource
+
+
+class StubWeatherGovServerTestCase(unittest.TestCase):
+    """
+    """
+
+
+    def setUp(self):
+        self.stub = StubWeatherGovServer(seed=0)
+        self.stub.start()
+        self.patchers = [patch.object(WeatherGovSource, 'baseUrl', self.stub.url()),
+                         patch.object(WeatherGovSource, 'fetcher', HttpFetcher()),
+                         patch.object(WeatherGovSource, 'forecastCache', ForecastCache()),
+                         patch.object(WeatherGovSource, 'circuitBreaker', CircuitBreaker()),
+                         patch.object(WeatherGovSource, 'negativeCache', NegativeCache())]
+        for patcher in self.patchers:
+            patcher.start()
+
+
+    def tearDown(self):
+        for patcher in self.patchers:
+            patcher.stop()
+        self.stub.stop()
+
+
+    def testReplaysNearestFixture(self):
+        fixtureHours = WeatherGovSource(Location(('42.38', '-72.52')), None,
+                                        elementTree=ET.ElementTree(self.stub.fixtureNearest(42.38, -72.52))).hours
+        source = WeatherGovSource(Location(('42.375370', '-72.519249')), None)
+        self.assertEqual(1, self.stub.requestCount)
+        self.assertEqual([(hour.datetime, hour.temp) for hour in fixtureHours],
+                         [(hour.datetime, hour.temp) for hour in source.hours])
+        self.assertIn('gzip', WeatherGovSource.fetcher.fetch(source.weatherDotGovUrl()).headers['content-encoding'])
+
+
+    def testConditionalGet(self):
+        url = WeatherGovSource.weatherDotGovUrlForLocation(Location(('42.38', '-72.52')))
+        etag = WeatherGovSource.fetcher.fetch(url).headers['etag']
+        self.assertEqual(304, WeatherGovSource.fetcher.fetch(url, headers={'If-None-Match': etag}).status)
+
+
+    def testMultiPoint(self):
+        locations = [Location(('42.38', '-72.52')), Location(('38.70', '-121.27'))]
+        cacheEntries = BatchFetcher(windowSeconds=0.01).cacheEntries(locations)
+        self.assertEqual(1, self.stub.requestCount)
+        for location in locations:
+            fixtureElement = self.stub.fixtureNearest(*map(float, location.key()))
+            fixtureHours = WeatherGovSource(location, None, elementTree=ET.ElementTree(fixtureElement)).hours
+            self.assertEqual([hour.datetime for hour in fixtureHours],
+                             [hour.datetime for hour in cacheEntries[location.key()].hours])
+
+
+    def testInjectedErrors(self):
+        self.stub.errorDocumentRate = 1
+        with self.assertRaisesRegex(ValueError, "No data were found"):
+            WeatherGovSource(Location(('42.38', '-72.52')), None)
+
+        self.stub.errorDocumentRate = 0
+        self.stub.errorRate = 1
+        WeatherGovSource.negativeCache.clear()  # otherwise the <error> document is remembered
+        with self.assertRaisesRegex(UpstreamError, "HTTP status 503"):
+            WeatherGovSource(Location(('42.38', '-72.52')), None)
+
+        self.stub.errorRate = 0
+        self.stub.maxDistanceDegrees = 1
+        with self.assertRaisesRegex(ValueError, "No data were found"):
+            WeatherGovSource(Location(('24.86', '-168.02')), None)
@@ -5,16 +5,28 @@ import operator
 from unittest.mock import patch
 import functools
 
+from forecast.DwmlDocument import DwmlDocument
 from forecast.WeatherGovSource import WeatherGovSource
 from forecast.Forecast import Forecast
 from forecast.Location import Location
 from forecast.Hour import Hour
+from forecast.XmlParserBackend import XmlParserBackend, LxmlParserBackend
 
 
 class WeatherGovSourceTestCase(unittest.TestCase):
     """
+    Runs with the stdlib XML parser. LxmlWeatherGovSourceTestCase runs the same tests with lxml.
     """
 
+    parserBackendName = 'stdlib'
+
+
+    def setUp(self):
+        parserBackendPatch = patch.object(DwmlDocument, 'parserBackend',
+                                          XmlParserBackend.forName(self.parserBackendName))
+        parserBackendPatch.start()
+        self.addCleanup(parserBackendPatch.stop)
+
 
     def testErrorResponseFromAPI(self):
         elementTree = ET.parse('test/test-forecast-error-response.xml')
@@ -280,6 +292,96 @@ class WeatherGovSourceTestCase(unittest.TestCase):
                 self.assertEqual(hour.datetime.tzinfo, hour0Tz)
 
 
+    @patch('forecast.Forecast.WeatherGovSource')
+    def testNumDaysWindow(self, MockWeatherGovSource):
+        location = Location('01002')
+        wholeSource = WeatherGovSource(location, Forecast.PARAM_RANGE_STEPS_DEFAULT,
+                                       elementTree=ET.parse('test/test-forecast-data.xml'))
+        windowSource = WeatherGovSource(location, Forecast.PARAM_RANGE_STEPS_DEFAULT,
+                                        elementTree=ET.parse('test/test-forecast-data.xml'), numDays=3)
+        self.assertEqual(wholeSource.hours[:len(windowSource.hours)], windowSource.hours)
+        self.assertEqual(datetime.datetime(2015, 1, 15, 23, 0, tzinfo=datetime.timezone(datetime.timedelta(-1, 68400))),
+                         windowSource.hours[-1].datetime)
+
+        # the calendar handles the truncated range
+        MockWeatherGovSource.return_value = windowSource
+        forecast = Forecast(location, numDays=3)
+        self.assertEqual(['T', 'W', 'T'], forecast.calendarHeaderRow())
+        actCalendarRows = forecast.hoursAsCalendarRows()
+        self.assertEqual(24, len(actCalendarRows))
+        for hourOfDayRow in actCalendarRows:
+            self.assertEqual(3, len(hourOfDayRow))
+
+        for badNumDays in [0, 8, '3']:
+            with self.assertRaisesRegex(ValueError, "numDays was not an int"):
+                Forecast(location, numDays=badNumDays)
+
+
+    def testNumDaysUrlAndCacheKey(self):
+        location = Location('01002')
+        now = datetime.datetime(2015, 1, 13, 19, 42, tzinfo=datetime.timezone(datetime.timedelta(hours=-5)))
+        self.assertEqual('&begin=2015-01-13T12:00:00&end=2015-01-17T00:00:00', WeatherGovSource.timeWindowQuery(3, now))
+        self.assertNotIn('&begin=', WeatherGovSource.weatherDotGovUrlForLocation(location))
+        self.assertIn('&begin=', WeatherGovSource.weatherDotGovUrlForLocation(location, 3))
+        self.assertEqual(location.key(), WeatherGovSource.cacheKey(location))
+        self.assertEqual(location.key() + (3,), WeatherGovSource.cacheKey(location, 3))
+
+
+    def testFindHourForDatetime(self):
+        location = Location('01002')
+        wgSource = WeatherGovSource(location, None, elementTree=ET.parse('test/test-forecast-data.xml'))
+        firstDatetime = wgSource.hours[0].datetime
+        for index in [0, 1, len(wgSource.hours) - 1]:
+            self.assertEqual(wgSource.hours[index], wgSource.findHourForDatetime(
+                firstDatetime + datetime.timedelta(hours=index)))
+        self.assertEqual(wgSource.hours[3], wgSource.findHourForDatetime(  # same instant, another time zone
+            (firstDatetime + datetime.timedelta(hours=3)).astimezone(datetime.timezone.utc)))
+        for missingDatetime in [firstDatetime - datetime.timedelta(hours=1),
+                                firstDatetime + datetime.timedelta(hours=len(wgSource.hours)),
+                                firstDatetime + datetime.timedelta(minutes=30)]:
+            self.assertIsNone(wgSource.findHourForDatetime(missingDatetime))
+
+
+    def testLongHourlyHorizon(self):
+        # a month of hourly temperatures and 12-hourly precipitation. assembled in linear time, this is quick
+        numHours = 24 * 31
+        firstDatetime = datetime.datetime(2015, 1, 13, 19, tzinfo=datetime.timezone(datetime.timedelta(hours=-5)))
+        hourlyTexts = [(firstDatetime + datetime.timedelta(hours=index)).isoformat() for index in range(numHours)]
+        dwmlDocument = DwmlDocument()
+        dwmlDocument.timeLayoutDict = {'k-hourly': hourlyTexts, 'k-12h': hourlyTexts[::12]}
+        dwmlDocument.pointParameterDicts = {'point1': {
+            'temperature': ('k-hourly', [index % 100 for index in range(numHours)]),
+            'wind-speed': ('k-12h', [3] * len(hourlyTexts[::12])),
+            'probability-of-precipitation': ('k-12h', [index % 10 for index in range(len(hourlyTexts[::12]))])}}
+        hours = WeatherGovSource.hoursWithNoGapsFromDocument(dwmlDocument, None)
+        self.assertEqual(numHours, len(hours))
+        self.assertEqual([index % 100 for index in range(numHours)], [hour.temp for hour in hours])
+        self.assertEqual([(index // 12) % 10 for index in range(numHours)], [hour.precip for hour in hours])
+
+
+    def testParseStartValidTime(self):
+        # same datetimes as strptime(), with one shared tzinfo per offset
+        for xmlFileName in ['test/test-forecast-data.xml', 'test/test-forecast-data-sky-cover.xml']:
+            for startValidTimeTexts in DwmlDocument.fromFile(xmlFileName).timeLayoutDict.values():
+                for startValidTimeText in startValidTimeTexts:
+                    expDatetime = datetime.datetime.strptime(startValidTimeText, '%Y-%m-%dT%H:%M:%S%z')
+                    actDatetime = WeatherGovSource.parseStartValidTime(startValidTimeText)
+                    self.assertEqual((expDatetime, expDatetime.utcoffset()), (actDatetime, actDatetime.utcoffset()))
+
+        dt1 = WeatherGovSource.parseStartValidTime('2015-01-13T07:00:00-05:00')
+        dt2 = WeatherGovSource.parseStartValidTime('2015-03-01T19:00:00-05:00')
+        self.assertIs(dt1.tzinfo, dt2.tzinfo)
+        self.assertIs(dt1, WeatherGovSource.parseStartValidTime('2015-01-13T07:00:00-05:00'))  # memoized
+        self.assertEqual(datetime.timedelta(hours=5, minutes=30),
+                         WeatherGovSource.parseStartValidTime('2015-01-13T07:00:00+05:30').utcoffset())
+
+        utcDatetime = WeatherGovSource.parseStartValidTime('2015-01-13T12:00:00Z')  # not DWML's format, but allowed
+        self.assertEqual(dt1, utcDatetime)
+        self.assertIs(WeatherGovSource.tzinfoForOffsetText('+00:00'), utcDatetime.tzinfo)
+        with self.assertRaisesRegex(ValueError, "no UTC offset"):
+            WeatherGovSource.parseStartValidTime('2015-01-13T12:00:00')
+
+
     # ==== support methods and long test data ====
 
     def copyOfHourPlusOne(self, hour):
@@ -604,3 +706,12 @@ class WeatherGovSourceTestCase(unittest.TestCase):
                 (63, datetime.datetime(2015, 2, 2, 19, 0, tzinfo=datetime.timezone(datetime.timedelta(-1, 68400))))]
         }
         return expDict
+
+
+@unittest.skipUnless(LxmlParserBackend.isInstalled(), "lxml isn't installed")
+class LxmlWeatherGovSourceTestCase(WeatherGovSourceTestCase):
+    """
+    Runs all of WeatherGovSourceTestCase's tests again with DWML parsed by LxmlParserBackend instead of the stdlib.
+    """
+
+    parserBackendName = 'lxml'